@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark compressed archival of closed history partitions
+
+Generates a synthetic single-file history, then for each codec splits it into
+partitions, lets the storage layer archive the closed ones and reads the whole
+history back. Reports the compression ratio and how many rows per second the
+(cold) full read decodes, to help pick SPEEDTEST_ARCHIVE_COMPRESSION.
+
+Usage:
+    python bench_archive.py [--rows 50000] [--scheme monthly]
+"""
+
+import sys
+import csv
+import time
+import random
+import argparse
+import datetime
+import tempfile
+from pathlib import Path
+
+# Add src directory to Python path for the shared storage code
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+from config import CSV_FIELDNAMES, HISTORY_DIR
+from storage import ARCHIVE_CODECS, PARTITION_FORMATS, CSVStorage
+
+
+def write_synthetic_history(csv_path, rows):
+    """Write a legacy single-file history of 15-minute results ending a year ago"""
+    end = datetime.datetime.now() - datetime.timedelta(days=365)
+    start = end - datetime.timedelta(minutes=15 * rows)
+    rng = random.Random(42)
+
+    with open(csv_path, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDNAMES)
+        writer.writeheader()
+        for i in range(rows):
+            timestamp = (start + datetime.timedelta(minutes=15 * i)).isoformat()
+            if rng.random() < 0.02:
+                writer.writerow({
+                    'timestamp': timestamp,
+                    'status': 'FAILED',
+                    'error_type': 'ConfigRetrievalError',
+                    'error_details': 'Config retrieval failed: HTTP Error 403: Forbidden'
+                })
+            else:
+                writer.writerow({
+                    'timestamp': timestamp,
+                    'download_mbps': round(rng.uniform(40, 95), 2),
+                    'upload_mbps': round(rng.uniform(8, 20), 2),
+                    'ping_ms': round(rng.uniform(8, 40), 2),
+                    'server_name': 'London',
+                    'server_country': 'United Kingdom',
+                    'server_sponsor': 'Example ISP',
+                    'status': 'SUCCESS'
+                })
+
+
+def run_codec(source_csv, work_dir, compression, scheme):
+    """Split, archive and read back a copy of the history with one codec"""
+    legacy_csv = work_dir / source_csv.name
+    legacy_csv.parent.mkdir(parents=True)
+    legacy_csv.write_bytes(source_csv.read_bytes())
+
+    history = CSVStorage(work_dir / HISTORY_DIR.name, legacy_csv=legacy_csv,
+                         scheme=scheme, compression=compression)
+    # The first append splits the legacy file and archives every closed partition
+    history.append({'timestamp': datetime.datetime.now().isoformat(), 'status': 'SUCCESS'})
+
+    manifest = history._load_manifest()
+    raw_size = sum(entry['size'] for entry in manifest['partitions'])
+    stored_size = sum(entry.get('archive_size', entry['size']) for entry in manifest['partitions'])
+
+    started = time.perf_counter()
+    rows = len(history.read())
+    elapsed = time.perf_counter() - started
+
+    return {
+        'compression': compression,
+        'partitions': len(manifest['partitions']),
+        'raw_size': raw_size,
+        'stored_size': stored_size,
+        'ratio': raw_size / stored_size if stored_size else 0,
+        'rows': rows,
+        'rows_per_sec': rows / elapsed if elapsed else 0
+    }
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Benchmark archived history partitions")
+    parser.add_argument('--rows', type=int, default=50000,
+                        help="Number of synthetic results to generate (default: 50000)")
+    parser.add_argument('--scheme', choices=sorted(PARTITION_FORMATS), default='monthly',
+                        help="Partition scheme (default: monthly)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        source_csv = tmp_dir / "speed_history.csv"
+
+        print(f"🔄 Generating {args.rows} synthetic results...")
+        write_synthetic_history(source_csv, args.rows)
+
+        print(f"\n{'Codec':<8} {'Parts':>6} {'Raw bytes':>12} {'Stored':>12} {'Ratio':>7} {'Rows/sec':>12}")
+        print("-" * 62)
+        for compression in ['none'] + sorted(ARCHIVE_CODECS):
+            result = run_codec(source_csv, tmp_dir / compression, compression, args.scheme)
+            print(f"{result['compression']:<8} {result['partitions']:>6} {result['raw_size']:>12,} "
+                  f"{result['stored_size']:>12,} {result['ratio']:>6.1f}x {result['rows_per_sec']:>12,.0f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Rebuild the hourly/daily rollups from the raw speed test history
+
+Rollups are kept up to date on every save and rebuilt automatically when a
+partition is rewritten, so this is only needed after editing history by hand
+or restoring rollup files from an older backup.
+
+Usage:
+    python rebuild_rollups.py [HISTORY_DIR]
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# Add src directory to Python path for the shared storage code
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+from storage import CSVStorage, get_storage
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Rebuild hourly/daily rollups from raw history")
+    parser.add_argument('history_dir', nargs='?', type=Path,
+                        help="Partitioned CSV history to rebuild (default: the configured storage)")
+    args = parser.parse_args()
+
+    storage = CSVStorage(args.history_dir) if args.history_dir else get_storage()
+    if not storage.path.exists():
+        print(f"❌ History not found: {storage.path}")
+        return 1
+
+    print(f"🔄 Rebuilding rollups for {storage.path}")
+    storage.rebuild_rollups()
+
+    stats = storage.summary()
+    print(f"✅ Rollups cover {stats.get('total_tests', 0)} tests")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,9 +4,12 @@ Raspberry Pi Internet Speed Monitor (SMB Version)
 Runs speed tests and saves data to local SMB share
 
 This is the main entry point that uses the modular architecture in the src/ folder.
+Run without arguments for a single test (cron), or with --daemon to keep one
+process alive and schedule tests internally.
 """
 
 import sys
+import argparse
 from pathlib import Path
 
 # Add src directory to Python path for imports
@@ -18,6 +21,15 @@ from main import main
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run internet speed tests")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Keep running and schedule tests in-process (stop with SIGTERM)")
+    parser.add_argument('--interval', type=float,
+                        help="Daemon seconds between tests (default: SPEEDTEST_INTERVAL or 900)")
+    parser.add_argument('--jitter', type=float,
+                        help="Daemon maximum random delay per test (default: SPEEDTEST_JITTER or 60)")
+    args = parser.parse_args()
+    
     # Execute the main function and exit with the appropriate code
-    exit_code = main()
+    exit_code = main(daemon=args.daemon, interval=args.interval, jitter=args.jitter)
     sys.exit(exit_code)
\ No newline at end of file
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Split an existing single-file speed_history.csv into time partitions
+
+The monitor does this automatically the first time it saves a result, but
+this script can be run by hand, e.g. for a copy on the SMB share or to pick a
+different partition scheme before the first save.
+
+Usage:
+    python split_history.py [--scheme monthly] [CSV_FILE [HISTORY_DIR]]
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# Add src directory to Python path for the shared storage code
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+from config import CSV_FILE, HISTORY_DIR, HISTORY_PARTITION
+from storage import PARTITION_FORMATS, split_history
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Split speed_history.csv into time partitions")
+    parser.add_argument('csv_file', nargs='?', type=Path, default=CSV_FILE,
+                        help=f"Single-file history to split (default: {CSV_FILE})")
+    parser.add_argument('history_dir', nargs='?', type=Path,
+                        help="Directory for partitions and manifest (default: history/ next to the CSV)")
+    parser.add_argument('--scheme', choices=sorted(PARTITION_FORMATS), default=HISTORY_PARTITION,
+                        help=f"Period covered by each partition (default: {HISTORY_PARTITION})")
+    args = parser.parse_args()
+    
+    if not args.csv_file.exists():
+        print(f"❌ CSV file not found: {args.csv_file}")
+        return 1
+    
+    history_dir = args.history_dir or args.csv_file.parent / HISTORY_DIR.name
+    print(f"🔄 Splitting {args.csv_file} into {args.scheme} partitions in {history_dir}")
+    
+    count = split_history(args.csv_file, history_dir, args.scheme)
+    
+    print(f"✅ Split {count} rows")
+    print(f"💡 The original file was kept as {args.csv_file.name}.pre-split")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,7 +9,20 @@ Modules:
 - logging_config: Logging setup and configuration
 - speedtest_runner: Speed test execution logic
 - csv_handler: CSV data persistence
+- records: SpeedRecord result type
+- storage: Pluggable history storage backends (CSV, SQLite)
+- rollups: Hourly/daily aggregates for long-range statistics
 - smb_sync: SMB share synchronization
+- smb_health: Cached SMB health probe
+- dir_status: Bounded scandir-based directory counts and sizes
+- shards: Per-host history shards on the share and their merge reader
+- sync_outbox: Background SMB sync queue and worker
+- sync_throttle: Sync rate limiting and deferral during speed tests
+- server_cache: Cached speedtest.net config and server list
+- geodistance: Vectorized nearest-server ranking
+- latency_probe: Parallel server latency probing
+- server_selection: Sticky best-server selection
+- scheduler: In-process test scheduling for daemon mode
 - main: Main application orchestration
 """
 
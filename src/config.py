@@ -4,18 +4,119 @@ Configuration settings for the Speedtest Monitor application
 
 from pathlib import Path
 import os
+import re
+import socket
 
 # Base project paths
 PROJECT_ROOT = Path(__file__).parent.parent
 DATA_DIR = PROJECT_ROOT / "speedtest_data"
 CSV_FILE = DATA_DIR / "speed_history.csv"
 LOG_FILE = DATA_DIR / "speedtest.log"
+LOG_SEGMENT_DIR = DATA_DIR / "logs"
+DB_FILE = DATA_DIR / "speed_history.db"
+HISTORY_DIR = DATA_DIR / "history"
+
+# Storage backend for the history: 'csv' (partitioned CSV files in HISTORY_DIR)
+# or 'sqlite' (speed_history.db, with CSV_FILE kept as an export for SMB backups).
+# CSV_FILE is also the pre-partitioning single-file history, which the csv
+# backend splits into partitions on first use.
+STORAGE_BACKEND = os.environ.get('SPEEDTEST_STORAGE', 'csv').lower()
+
+# Period covered by each CSV history partition: 'daily', 'monthly' or 'yearly'
+HISTORY_PARTITION = os.environ.get('SPEEDTEST_PARTITION', 'monthly').lower()
+
+# Compression for closed-out partitions: 'gzip', 'xz' or 'none'
+ARCHIVE_COMPRESSION = os.environ.get('SPEEDTEST_ARCHIVE_COMPRESSION', 'gzip').lower()
+
+# Name of this monitor's shard on the share: each host syncs into
+# hosts/<SITE_ID>/ under every replication target, so several monitors can
+# share one directory. Defaults to the hostname.
+SITE_ID = re.sub(r'[^A-Za-z0-9._-]', '_', os.environ.get('SPEEDTEST_SITE_ID') or socket.gethostname() or 'default')
+HOST_SHARD_DIR = Path("hosts") / SITE_ID
 
 # SMB Share settings
 SMB_MOUNT_PATH = Path("/media/test")
 SMB_SPEEDTEST_DIR = SMB_MOUNT_PATH / "speedtest"
-SMB_BACKUP_CSV = SMB_SPEEDTEST_DIR / "speed_history.csv"
-SMB_BACKUP_LOG = SMB_SPEEDTEST_DIR / "speedtest.log"
+SMB_HOSTS_DIR = SMB_SPEEDTEST_DIR / HOST_SHARD_DIR.parent
+SMB_SITE_DIR = SMB_SPEEDTEST_DIR / HOST_SHARD_DIR
+SMB_BACKUP_CSV = SMB_SITE_DIR / "speed_history.csv"
+SMB_BACKUP_LOG = SMB_SITE_DIR / "speedtest.log"
+SMB_HISTORY_DIR = SMB_SITE_DIR / HISTORY_DIR.name
+
+# Directories the history and log are replicated to (mounted shares, a USB disk,
+# a second local directory), separated by ':'; defaults to the SMB share. Targets
+# sync concurrently and any still running after the timeout are reported failed.
+REPLICATION_TARGETS = [
+    Path(target) for target in os.environ.get('SPEEDTEST_REPLICATION_TARGETS', '').split(os.pathsep) if target
+] or [SMB_SPEEDTEST_DIR]
+REPLICATION_TIMEOUT_SECONDS = float(os.environ.get('SPEEDTEST_REPLICATION_TIMEOUT', '300'))
+REPLICATION_STATUS_FILE = DATA_DIR / "replication_status.json"
+
+# Seconds to wait for the single non-interactive sudo call that performs the
+# writes a share refused
+PRIVILEGED_SYNC_TIMEOUT_SECONDS = float(os.environ.get('SPEEDTEST_SUDO_TIMEOUT', '120'))
+
+# Sync traffic is limited to SYNC_RATE_LIMIT_KBPS KiB/s (0 for no limit) and
+# waits while a speed test holds MEASUREMENT_LOCK_FILE, so backups don't skew
+# measurements; a sync waits at most SYNC_MAX_DEFER_SECONDS before starting
+SYNC_RATE_LIMIT_KBPS = float(os.environ.get('SPEEDTEST_SYNC_RATE_LIMIT', '1024'))
+MEASUREMENT_LOCK_FILE = DATA_DIR / "measurement.lock"
+SYNC_MAX_DEFER_SECONDS = float(os.environ.get('SPEEDTEST_SYNC_MAX_DEFER', '600'))
+
+# Per-file offsets and prefix checksums of what has been synced to the share,
+# used to append only new bytes on the next sync
+SMB_SYNC_STATE_FILE = DATA_DIR / "smb_sync_state.json"
+
+# Cached result of the last SMB health probe (mount, write test, free space),
+# reused until it is older than the TTL; failures are kept for a shorter time
+SMB_HEALTH_CACHE_FILE = DATA_DIR / "smb_health.json"
+SMB_HEALTH_TTL_SECONDS = float(os.environ.get('SPEEDTEST_SMB_HEALTH_TTL', '300'))
+SMB_HEALTH_FAILURE_TTL_SECONDS = float(os.environ.get('SPEEDTEST_SMB_HEALTH_FAILURE_TTL', '60'))
+
+# Maximum directory entries examined when collecting share status (file
+# counts and sizes), so status checks stay fast on large directories
+STATUS_MAX_ENTRIES = int(os.environ.get('SPEEDTEST_STATUS_MAX_ENTRIES', '500'))
+
+# Background SMB sync: pending sync requests are queued as files in the outbox
+# and drained by a detached worker holding SYNC_WORKER_LOCK, retrying failed
+# syncs with exponential backoff (base doubling up to the max delay)
+SYNC_OUTBOX_DIR = DATA_DIR / "sync_outbox"
+SYNC_WORKER_LOCK = DATA_DIR / "sync_worker.lock"
+SYNC_RETRY_BASE_SECONDS = float(os.environ.get('SPEEDTEST_SYNC_RETRY_BASE', '30'))
+SYNC_RETRY_MAX_SECONDS = float(os.environ.get('SPEEDTEST_SYNC_RETRY_MAX', '900'))
+SYNC_MAX_ATTEMPTS = int(os.environ.get('SPEEDTEST_SYNC_MAX_ATTEMPTS', '8'))
+
+# speedtest.net client config and server list, cached between runs. Entries
+# older than their TTL are refreshed in the background after a test; entries
+# older than SERVER_CACHE_MAX_AGE_SECONDS are not used at all. A change of
+# client IP or ISP invalidates the cached server list
+SERVER_CACHE_FILE = DATA_DIR / "server_cache.json"
+SERVER_CACHE_CONFIG_TTL_SECONDS = float(os.environ.get('SPEEDTEST_CONFIG_CACHE_TTL', '3600'))
+SERVER_CACHE_SERVERS_TTL_SECONDS = float(os.environ.get('SPEEDTEST_SERVER_CACHE_TTL', '86400'))
+SERVER_CACHE_MAX_AGE_SECONDS = float(os.environ.get('SPEEDTEST_SERVER_CACHE_MAX_AGE', '604800'))
+
+# Sticky best server: the selected server is reused for STICKY_SERVER_RUNS
+# runs, re-probing only its latency, unless that latency exceeds the latency
+# at selection by STICKY_SERVER_LATENCY_RATIO (and STICKY_SERVER_LATENCY_SLACK_MS)
+BEST_SERVER_FILE = DATA_DIR / "best_server.json"
+STICKY_SERVER_RUNS = int(os.environ.get('SPEEDTEST_STICKY_RUNS', '24'))
+STICKY_SERVER_LATENCY_RATIO = float(os.environ.get('SPEEDTEST_STICKY_LATENCY_RATIO', '1.5'))
+STICKY_SERVER_LATENCY_SLACK_MS = float(os.environ.get('SPEEDTEST_STICKY_LATENCY_SLACK', '10'))
+
+# Full server selection probes the closest LATENCY_PROBE_CANDIDATES servers
+# in parallel, LATENCY_PROBE_SAMPLES requests each (median taken), every
+# request limited to LATENCY_PROBE_TIMEOUT_SECONDS
+LATENCY_PROBE_CANDIDATES = int(os.environ.get('SPEEDTEST_PROBE_CANDIDATES', '10'))
+LATENCY_PROBE_SAMPLES = int(os.environ.get('SPEEDTEST_PROBE_SAMPLES', '3'))
+LATENCY_PROBE_TIMEOUT_SECONDS = float(os.environ.get('SPEEDTEST_PROBE_TIMEOUT', '2'))
+
+# Daemon mode (speedtest_monitor.py --daemon): a test every
+# DAEMON_INTERVAL_SECONDS, delayed by up to DAEMON_JITTER_SECONDS; the last
+# scheduled slot is kept in SCHEDULER_STATE_FILE so runs missed while the
+# daemon was down are caught up on restart
+DAEMON_INTERVAL_SECONDS = float(os.environ.get('SPEEDTEST_INTERVAL', '900'))
+DAEMON_JITTER_SECONDS = float(os.environ.get('SPEEDTEST_JITTER', '60'))
+SCHEDULER_STATE_FILE = DATA_DIR / "scheduler.json"
 
 # CSV fieldnames for data consistency
 CSV_FIELDNAMES = [
@@ -27,6 +128,11 @@ CSV_FIELDNAMES = [
 # Logging configuration
 DEBUG_MODE = os.environ.get('DEBUG', '').lower() in ('1', 'true', 'yes')
 
+# speedtest.log is sealed into a gzipped, timestamped segment in LOG_SEGMENT_DIR
+# once it reaches LOG_MAX_BYTES; the newest LOG_SEGMENTS_KEEP segments are kept
+LOG_MAX_BYTES = int(os.environ.get('SPEEDTEST_LOG_MAX_BYTES', str(1024 * 1024)))
+LOG_SEGMENTS_KEEP = int(os.environ.get('SPEEDTEST_LOG_SEGMENTS_KEEP', '20'))
+
 # Error details truncation length
 MAX_ERROR_DETAILS_LENGTH = 500
 
@@ -2,37 +2,30 @@
 CSV data handling for the Speedtest Monitor application
 """
 
-import csv
 import datetime
-from config import CSV_FILE, CSV_FIELDNAMES, MAX_ERROR_DETAILS_LENGTH
+from config import MAX_ERROR_DETAILS_LENGTH
 from logging_config import get_logger
+from records import SpeedRecord
+from storage import get_storage
 
 logger = get_logger(__name__)
 
 
 def save_to_csv(data):
     """
-    Save speed test data to CSV file
+    Save speed test data to the configured storage backend
     
     Args:
-        data (dict): Speed test data dictionary
+        data (SpeedRecord or dict): Speed test result
         
     Returns:
         bool: True if successful, False otherwise
     """
     try:
-        file_exists = CSV_FILE.exists()
+        storage = get_storage()
+        storage.append(data)
         
-        with open(CSV_FILE, 'a', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDNAMES)
-            
-            # Write header if file is new
-            if not file_exists:
-                writer.writeheader()
-            
-            writer.writerow(data)
-        
-        logger.info(f"Data saved to {CSV_FILE}")
+        logger.info(f"Data saved to {storage.path}")
         return True
         
     except Exception as e:
@@ -53,18 +46,20 @@ def save_failure_to_csv(error_type, error_details, stage="unknown"):
         bool: True if successful, False otherwise
     """
     try:
-        failure_data = {
-            'timestamp': datetime.datetime.now().isoformat(),
-            'download_mbps': 0,  # Set to 0 instead of None for failed tests
-            'upload_mbps': 0,    # Set to 0 instead of None for failed tests
-            'ping_ms': 0,        # Set to 0 instead of None for failed tests
-            'server_name': None,
-            'server_country': None,
-            'server_sponsor': None,
-            'status': 'FAILED',
-            'error_type': error_type,
-            'error_details': f"{stage}: {error_details}"[:MAX_ERROR_DETAILS_LENGTH]
-        }
+        now = datetime.datetime.now()
+        failure_data = SpeedRecord(
+            timestamp=now.isoformat(),
+            epoch=now.timestamp(),
+            download_mbps=0,  # Set to 0 instead of None for failed tests
+            upload_mbps=0,    # Set to 0 instead of None for failed tests
+            ping_ms=0,        # Set to 0 instead of None for failed tests
+            server_name=None,
+            server_country=None,
+            server_sponsor=None,
+            status='FAILED',
+            error_type=error_type,
+            error_details=f"{stage}: {error_details}"[:MAX_ERROR_DETAILS_LENGTH]
+        )
         
         save_to_csv(failure_data)
         logger.info(f"Failure logged to CSV: {error_type} during {stage}")
@@ -77,7 +72,10 @@ def save_failure_to_csv(error_type, error_details, stage="unknown"):
 
 def get_csv_stats():
     """
-    Get basic statistics about the CSV file
+    Get basic statistics about the stored history
+    
+    Counts come from the storage backend (persistent counters for CSV, indexed
+    queries for SQLite), so this does not scan the history.
     
     Returns:
         dict: Statistics including file size, record count, etc.
@@ -87,24 +85,18 @@ def get_csv_stats():
         'file_size': 0,
         'record_count': 0,
         'success_count': 0,
-        'failure_count': 0
+        'failure_count': 0,
+        'error_types': {},
+        'first_timestamp': None,
+        'last_timestamp': None
     }
     
     try:
-        if CSV_FILE.exists():
-            stats['file_exists'] = True
-            stats['file_size'] = CSV_FILE.stat().st_size
-            
-            with open(CSV_FILE, 'r') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    stats['record_count'] += 1
-                    if row.get('status') == 'SUCCESS':
-                        stats['success_count'] += 1
-                    else:
-                        stats['failure_count'] += 1
+        storage = get_storage()
+        stats.update(storage.stats())
+        stats['file_exists'] = stats['record_count'] > 0 or storage.path.exists()
                         
     except Exception as e:
         logger.error(f"Failed to get CSV stats: {str(e)}")
     
-    return stats
\ No newline at end of file
+    return stats
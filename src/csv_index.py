@@ -0,0 +1,350 @@
+"""
+Byte-offset timestamp index for the Speedtest Monitor CSV history
+
+The index is a sidecar file next to the CSV (``speed_history.csv.idx``) made of
+fixed-width binary entries, one per data row: the row's timestamp as epoch
+seconds and the byte offset where the row starts. Rows are normally appended
+in time order, so the index is sorted and a time-range query can binary search
+it and seek straight to the first row in the window instead of parsing the
+whole file.
+
+A late row (e.g. a result recorded with an earlier timestamp and appended to
+a partition that is still open) breaks that order. Building or updating the
+index checks it and leaves an ``.idx.unsorted`` marker when it doesn't hold;
+find_offset() then returns None and readers fall back to a scan.
+"""
+
+import datetime
+import struct
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Entry layout: little-endian float64 epoch seconds + uint64 byte offset
+INDEX_ENTRY = struct.Struct('<dQ')
+
+# Tolerance when checking an index entry against the row it points at
+EPOCH_TOLERANCE = 1e-3
+
+# Block size for reading a CSV backwards from EOF
+REVERSE_CHUNK_SIZE = 8192
+
+
+def index_path_for(csv_path):
+    """Get the sidecar index path for a CSV file"""
+    return csv_path.with_name(csv_path.name + '.idx')
+
+
+def unsorted_marker_for(csv_path):
+    """Get the marker path recording that a CSV's rows are out of time order"""
+    return csv_path.with_name(csv_path.name + '.idx.unsorted')
+
+
+def index_is_sorted(csv_path):
+    """
+    Check whether a CSV's rows were in time order when last indexed
+
+    Args:
+        csv_path (Path): CSV file
+
+    Returns:
+        bool: False if an out-of-order row was seen
+    """
+    return not unsorted_marker_for(csv_path).exists()
+
+
+def _mark_sorted(csv_path, in_order):
+    marker = unsorted_marker_for(csv_path)
+    if in_order:
+        if marker.exists():
+            marker.unlink()
+    elif not marker.exists():
+        logger.info(f"Rows in {csv_path.name} are out of time order - time-range reads will scan it")
+        marker.touch()
+
+
+def parse_timestamp(value):
+    """
+    Convert an ISO timestamp string to epoch seconds
+
+    Args:
+        value (str): ISO 8601 timestamp as written by the monitor
+
+    Returns:
+        float or None: Epoch seconds, or None if the value can't be parsed
+    """
+    try:
+        return datetime.datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+def iter_records(csv_file, start=0):
+    """
+    Iterate over complete CSV records in a binary file with their byte offsets
+
+    Records may span several lines when a quoted field (e.g. error_details)
+    contains newlines; a record is complete once its quote count is even.
+    A trailing partially-written record is not yielded.
+
+    Args:
+        csv_file: File object opened in binary mode
+        start (int): Byte offset of the first record to read
+
+    Yields:
+        tuple: (offset: int, raw_record: bytes)
+    """
+    csv_file.seek(start)
+    offset = start
+    record_start = start
+    pending = []
+    quotes = 0
+
+    for line in csv_file:
+        if not pending:
+            record_start = offset
+        pending.append(line)
+        quotes += line.count(b'"')
+        offset += len(line)
+
+        if quotes % 2 == 0 and line.endswith(b'\n'):
+            yield record_start, b''.join(pending)
+            pending = []
+            quotes = 0
+
+
+def iter_records_reverse(csv_file, start=0, end=None, chunk_size=REVERSE_CHUNK_SIZE):
+    """
+    Iterate over complete CSV records in a binary file, newest (last) first
+
+    The file is read in blocks backwards from the end, so the cost of reading
+    the last N records does not depend on the file size. A newline ends a
+    record only if an even number of quotes follows it within the record,
+    which skips newlines inside quoted fields such as error_details.
+
+    Without an end offset, anything after the last newline is treated as a
+    partially-written record and skipped; pass the end of the last complete
+    record (see find_end) when a partial record could itself contain a quoted
+    newline.
+
+    Args:
+        csv_file: File object opened in binary mode
+        start (int): Byte offset of the first record to read (e.g. after the header)
+        end (int): Byte offset just past the last complete record, or None for EOF
+        chunk_size (int): Number of bytes read per block
+
+    Yields:
+        tuple: (offset: int, raw_record: bytes)
+    """
+    if end is None:
+        csv_file.seek(0, 2)
+        end = csv_file.tell()
+        scan = None     # Buffer index above which every newline has been examined
+    else:
+        scan = -1       # Skip the final newline of the last record
+    pos = end
+    buffer = b''        # Bytes from pos up to the end of the current record
+    quotes = 0          # Quotes between scan and the end of the current record
+
+    while True:
+        if pos > start:
+            size = min(chunk_size, pos - start)
+            pos -= size
+            csv_file.seek(pos)
+            buffer = csv_file.read(size) + buffer
+            if scan is not None:
+                scan += size
+
+        if scan is None:
+            # Find where the last complete record ends
+            last_newline = buffer.rfind(b'\n')
+            if last_newline == -1:
+                if pos <= start:
+                    return
+                continue
+            buffer = buffer[:last_newline + 1]
+            scan = last_newline
+
+        while True:
+            newline = buffer.rfind(b'\n', 0, scan)
+            if newline == -1:
+                quotes += buffer.count(b'"', 0, scan)
+                scan = 0
+                break
+            quotes += buffer.count(b'"', newline + 1, scan)
+            scan = newline
+            if quotes % 2 == 0:
+                yield pos + newline + 1, buffer[newline + 1:]
+                buffer = buffer[:newline + 1]
+                quotes = 0
+
+        if pos <= start:
+            if buffer:
+                yield pos, buffer
+            return
+
+
+def record_epoch(raw_record):
+    """Get the epoch timestamp of a raw CSV record (first column)"""
+    try:
+        return parse_timestamp(raw_record.split(b',', 1)[0].decode('utf-8').strip('"'))
+    except UnicodeDecodeError:
+        return None
+
+
+def rebuild_index(csv_path):
+    """
+    Rebuild the sidecar index from scratch by scanning the CSV
+
+    Args:
+        csv_path (Path): CSV file to index
+
+    Returns:
+        int: Number of indexed rows
+    """
+    idx_path = index_path_for(csv_path)
+    tmp_path = idx_path.with_name(idx_path.name + '.tmp')
+    count = 0
+    previous = float('-inf')
+    in_order = True
+
+    with open(csv_path, 'rb') as csv_file, open(tmp_path, 'wb') as idx_file:
+        records = iter_records(csv_file)
+        next(records, None)  # Skip header
+        for offset, raw in records:
+            epoch = record_epoch(raw)
+            if epoch is not None:
+                idx_file.write(INDEX_ENTRY.pack(epoch, offset))
+                count += 1
+                in_order = in_order and epoch >= previous
+                previous = epoch
+
+    tmp_path.replace(idx_path)
+    _mark_sorted(csv_path, in_order)
+    logger.debug(f"Rebuilt index {idx_path} ({count} rows)")
+    return count
+
+
+def _read_entry(idx_file, position):
+    """Read the index entry at a given position"""
+    idx_file.seek(position * INDEX_ENTRY.size)
+    return INDEX_ENTRY.unpack(idx_file.read(INDEX_ENTRY.size))
+
+
+def ensure_index(csv_path):
+    """
+    Bring the sidecar index up to date with the CSV
+
+    Rows appended since the last indexed row are added to the index; the index
+    is rebuilt from scratch when missing or when its last entry no longer points
+    at a matching row (the CSV was rewritten or replaced). In the common case of
+    one appended row this reads only the last two records of the CSV.
+
+    Args:
+        csv_path (Path): CSV file to index
+
+    Returns:
+        bool: True if the index is usable, False otherwise
+    """
+    idx_path = index_path_for(csv_path)
+
+    try:
+        csv_size = csv_path.stat().st_size
+        idx_size = idx_path.stat().st_size if idx_path.exists() else None
+
+        if not idx_size or idx_size % INDEX_ENTRY.size:
+            rebuild_index(csv_path)
+            return True
+
+        with open(idx_path, 'rb') as idx_file:
+            last_epoch, last_offset = _read_entry(idx_file, idx_size // INDEX_ENTRY.size - 1)
+
+        if last_offset >= csv_size:
+            rebuild_index(csv_path)
+            return True
+
+        new_entries = []
+        with open(csv_path, 'rb') as csv_file:
+            records = iter_records(csv_file, last_offset)
+            first = next(records, None)
+            if first is None or abs((record_epoch(first[1]) or 0) - last_epoch) > EPOCH_TOLERANCE:
+                rebuild_index(csv_path)
+                return True
+
+            previous = last_epoch
+            for offset, raw in records:
+                epoch = record_epoch(raw)
+                if epoch is not None:
+                    new_entries.append(INDEX_ENTRY.pack(epoch, offset))
+                    if epoch < previous:
+                        _mark_sorted(csv_path, False)
+                    previous = epoch
+
+        if new_entries:
+            with open(idx_path, 'ab') as idx_file:
+                idx_file.write(b''.join(new_entries))
+
+        return True
+
+    except Exception as e:
+        logger.warning(f"Failed to update index for {csv_path}: {str(e)}")
+        return False
+
+
+def find_offset(csv_path, epoch):
+    """
+    Find the byte offset of the first row at or after a timestamp
+
+    Args:
+        csv_path (Path): Indexed CSV file
+        epoch (float): Cutoff as epoch seconds
+
+    Returns:
+        int or None: Byte offset to seek to (the file size if no row qualifies),
+        or None if the index is unavailable or the rows are out of time order
+    """
+    if not ensure_index(csv_path) or not index_is_sorted(csv_path):
+        return None
+
+    idx_path = index_path_for(csv_path)
+    with open(idx_path, 'rb') as idx_file:
+        lo, hi = 0, idx_path.stat().st_size // INDEX_ENTRY.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _read_entry(idx_file, mid)[0] < epoch:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo == idx_path.stat().st_size // INDEX_ENTRY.size:
+            return csv_path.stat().st_size
+        return _read_entry(idx_file, lo)[1]
+
+
+def find_end(csv_path):
+    """
+    Find the byte offset just past the last complete row
+
+    Args:
+        csv_path (Path): Indexed CSV file
+
+    Returns:
+        int or None: Offset after the last complete row, or None if the index
+        is unavailable or has no rows
+    """
+    if not ensure_index(csv_path):
+        return None
+
+    idx_path = index_path_for(csv_path)
+    count = idx_path.stat().st_size // INDEX_ENTRY.size
+    if not count:
+        return None
+
+    with open(idx_path, 'rb') as idx_file:
+        end = _read_entry(idx_file, count - 1)[1]
+
+    # Rows are indexed as they are appended, so this reads one or two records
+    with open(csv_path, 'rb') as csv_file:
+        for offset, raw in iter_records(csv_file, end):
+            end = offset + len(raw)
+    return end
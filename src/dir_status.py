@@ -0,0 +1,89 @@
+"""
+Bounded directory status collection for the Speedtest Monitor application
+
+Counting and sizing the files on the share with Path.iterdir() and
+Path.stat() costs one round trip per file, and the share only grows (archived
+partitions, log segments, host shards). scan_directory() walks it with
+os.scandir, whose DirEntry already knows each entry's type and caches its
+stat result, examines at most a fixed number of entries and returns
+aggregate counts and sizes, so it is cheap enough for a web request.
+"""
+
+import os
+from config import STATUS_MAX_ENTRIES
+
+
+def scan_directory(path, max_entries=STATUS_MAX_ENTRIES, max_depth=0, sample_size=0):
+    """
+    Collect file counts and sizes for a directory
+
+    Args:
+        path (Path): Directory to scan
+        max_entries (int): Stop after examining this many entries
+        max_depth (int): Subdirectory levels to descend into (0 for none)
+        sample_size (int): Number of entries to return by name
+
+    Returns:
+        dict: 'exists', 'files', 'dirs', 'total_bytes' (of the files seen),
+        'newest_mtime', 'examined', 'truncated' (True if the entry cap was
+        reached, making the counts lower bounds), 'errors' and 'sample' - up
+        to sample_size dicts with the entry's relative 'name', 'size' and
+        'is_dir'
+    """
+    status = {
+        'exists': True,
+        'files': 0,
+        'dirs': 0,
+        'total_bytes': 0,
+        'newest_mtime': None,
+        'examined': 0,
+        'truncated': False,
+        'errors': 0,
+        'sample': []
+    }
+    root = os.fspath(path)
+    pending = [(root, 0)]
+
+    while pending:
+        directory, depth = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if status['examined'] >= max_entries:
+                        status['truncated'] = True
+                        return status
+                    status['examined'] += 1
+
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        size = 0
+                        if is_dir:
+                            status['dirs'] += 1
+                            if depth < max_depth:
+                                pending.append((entry.path, depth + 1))
+                        else:
+                            entry_stat = entry.stat(follow_symlinks=False)
+                            size = entry_stat.st_size
+                            status['files'] += 1
+                            status['total_bytes'] += size
+                            if status['newest_mtime'] is None or entry_stat.st_mtime > status['newest_mtime']:
+                                status['newest_mtime'] = entry_stat.st_mtime
+                    except OSError:
+                        status['errors'] += 1
+                        continue
+
+                    if len(status['sample']) < sample_size:
+                        status['sample'].append({
+                            'name': os.path.relpath(entry.path, root),
+                            'size': size,
+                            'is_dir': is_dir
+                        })
+        except FileNotFoundError:
+            if directory == root:
+                status['exists'] = False
+            else:
+                status['errors'] += 1
+        except OSError:
+            status['errors'] += 1
+
+    return status
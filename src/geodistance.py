@@ -0,0 +1,93 @@
+"""
+Great-circle distance ranking of speedtest servers
+
+The server list can hold thousands of servers. build_coordinates() turns
+their lat/lon into radian arrays (plus the cosine of each latitude) once,
+when the server list is cached; nearest() then ranks every server by
+haversine distance from the client in one vectorized NumPy pass and picks
+the top K with argpartition. Without NumPy the same ranking runs in pure
+Python with heapq.
+"""
+
+import heapq
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def build_coordinates(servers):
+    """
+    Precompute the coordinates used for ranking
+
+    Args:
+        servers (list): Server dicts with 'lat' and 'lon' in degrees
+
+    Returns:
+        dict: 'lat', 'lon' (radians) and 'cos_lat' lists, aligned with servers
+    """
+    lat = [math.radians(float(server['lat'])) for server in servers]
+    lon = [math.radians(float(server['lon'])) for server in servers]
+    return {'lat': lat, 'lon': lon, 'cos_lat': [math.cos(value) for value in lat]}
+
+
+def as_arrays(coordinates):
+    """
+    Convert build_coordinates() lists to NumPy arrays, if NumPy is available
+
+    Args:
+        coordinates (dict): As returned by build_coordinates (e.g. from JSON)
+
+    Returns:
+        dict: The same keys as float arrays, or the lists unchanged
+    """
+    if np is None:
+        return coordinates
+    return {key: np.asarray(values, dtype=float) for key, values in coordinates.items()}
+
+
+def nearest(coordinates, lat, lon, k):
+    """
+    Find the k servers closest to a point
+
+    Args:
+        coordinates (dict): As returned by build_coordinates or as_arrays
+        lat (float): Latitude of the point in degrees
+        lon (float): Longitude of the point in degrees
+        k (int): Number of servers to return
+
+    Returns:
+        list: (index, distance_km) tuples of the k nearest servers, nearest
+        first; indexes refer to the list passed to build_coordinates
+    """
+    count = len(coordinates['lat'])
+    k = min(k, count)
+    if k <= 0:
+        return []
+
+    lat0, lon0 = math.radians(lat), math.radians(lon)
+    cos_lat0 = math.cos(lat0)
+
+    if np is not None:
+        lats = np.asarray(coordinates['lat'], dtype=float)
+        lons = np.asarray(coordinates['lon'], dtype=float)
+        cos_lats = np.asarray(coordinates['cos_lat'], dtype=float)
+        a = (np.sin((lats - lat0) / 2) ** 2
+             + cos_lat0 * cos_lats * np.sin((lons - lon0) / 2) ** 2)
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        indexes = np.argpartition(distances, k - 1)[:k] if k < count else np.arange(count)
+        indexes = indexes[np.argsort(distances[indexes], kind='stable')]
+        return [(int(index), float(distances[index])) for index in indexes]
+
+    distances = []
+    for server_lat, server_lon, cos_lat in zip(coordinates['lat'], coordinates['lon'],
+                                               coordinates['cos_lat']):
+        a = (math.sin((server_lat - lat0) / 2) ** 2
+             + cos_lat0 * cos_lat * math.sin((server_lon - lon0) / 2) ** 2)
+        distances.append(2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0))))
+    indexes = heapq.nsmallest(k, range(count), key=distances.__getitem__)
+    return [(index, distances[index]) for index in indexes]
@@ -0,0 +1,145 @@
+"""
+Concurrent server latency probing for the Speedtest Monitor application
+
+st.get_best_server() probes candidate servers one after another, so a full
+selection takes the sum of every probe and one slow server holds up the rest.
+probe_servers() fetches each candidate's latency.txt from a thread pool, one
+worker per server, with a timeout on every request, and takes the median of
+several samples per server. Selection then takes about as long as the slowest
+single probe.
+"""
+
+import os
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from config import LATENCY_PROBE_CANDIDATES, LATENCY_PROBE_SAMPLES, LATENCY_PROBE_TIMEOUT_SECONDS
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Body every speedtest.net server returns for latency.txt
+LATENCY_RESPONSE = b'test=test'
+
+USER_AGENT = "Mozilla/5.0 (speedtest-monitor)"
+
+
+def latency_url(server):
+    """
+    URL of a server's latency file
+
+    Args:
+        server (dict): Server from the speedtest server list
+
+    Returns:
+        str: latency.txt next to the server's upload URL
+    """
+    return f"{os.path.dirname(server['url'])}/latency.txt"
+
+
+def probe_latency(url, samples=LATENCY_PROBE_SAMPLES, timeout=LATENCY_PROBE_TIMEOUT_SECONDS):
+    """
+    Measure the request latency of a URL
+
+    Args:
+        url (str): URL to fetch
+        samples (int): Number of requests
+        timeout (float): Seconds allowed per request
+
+    Each request opens a new connection and so takes two round trips; as in
+    speedtest-cli, half the request time is counted, keeping recorded pings
+    comparable with get_best_server().
+
+    Returns:
+        float or None: Median latency in ms of the successful requests, None
+        if none succeeded
+    """
+    latencies = []
+    for sample in range(samples):
+        request = urllib.request.Request(
+            f"{url}?x={time.time_ns()}.{sample}",
+            headers={'User-Agent': USER_AGENT, 'Cache-Control': 'no-cache'}
+        )
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                body = response.read(len(LATENCY_RESPONSE))
+        except Exception as e:
+            logger.debug(f"Latency probe of {url} failed: {str(e)}")
+            continue
+        if body == LATENCY_RESPONSE:
+            latencies.append((time.perf_counter() - started) * 1000 / 2)
+
+    return round(statistics.median(latencies), 3) if latencies else None
+
+
+def probe_servers(servers, samples=LATENCY_PROBE_SAMPLES, timeout=LATENCY_PROBE_TIMEOUT_SECONDS):
+    """
+    Probe servers in parallel
+
+    Args:
+        servers (list): Servers from the speedtest server list
+        samples (int): Requests per server
+        timeout (float): Seconds allowed per request
+
+    Returns:
+        list: (latency_ms, server) tuples of the servers that responded,
+        fastest first
+    """
+    if not servers:
+        return []
+
+    with ThreadPoolExecutor(max_workers=len(servers), thread_name_prefix="latency-probe") as pool:
+        latencies = list(pool.map(lambda server: probe_latency(latency_url(server), samples, timeout),
+                                  servers))
+
+    results = [(latency, server) for latency, server in zip(latencies, servers) if latency is not None]
+    results.sort(key=lambda result: result[0])
+    return results
+
+
+def select_best(st, candidates=LATENCY_PROBE_CANDIDATES):
+    """
+    Select the lowest-latency server among the closest candidates and apply it to st
+
+    Args:
+        st (speedtest.Speedtest): Client with its server list loaded
+        candidates (int): Number of closest servers to probe
+
+    Returns:
+        dict or None: Selected server with its 'latency', None if no
+        candidate responded
+    """
+    closest = st.get_closest_servers(limit=candidates)
+    started = time.monotonic()
+    results = probe_servers(closest)
+    logger.info(f"Probed {len(closest)} servers in {time.monotonic() - started:.2f}s "
+                f"({len(results)} responded)")
+    if not results:
+        return None
+
+    latency, server = results[0]
+    return apply_best(st, server, latency)
+
+
+def apply_best(st, server, latency):
+    """
+    Make a probed server the one st tests against
+
+    Leaves the same state get_best_server() does, so download(), upload()
+    and st.results use it.
+
+    Args:
+        st (speedtest.Speedtest): Client
+        server (dict): Selected server
+        latency (float): Its latency in ms
+
+    Returns:
+        dict: The server with its 'latency'
+    """
+    best = dict(server, latency=latency)
+    st.results.ping = latency
+    st.results.server = best
+    st._best.update(best)
+    return best
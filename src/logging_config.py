@@ -2,10 +2,137 @@
 Logging configuration for the Speedtest Monitor application
 """
 
+import datetime
+import gzip
 import logging
+import re
+import shutil
 import sys
 import os
-from config import DATA_DIR, LOG_FILE, DEBUG_MODE
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from config import DATA_DIR, LOG_FILE, LOG_SEGMENT_DIR, LOG_MAX_BYTES, LOG_SEGMENTS_KEEP, DEBUG_MODE
+
+# Segment name suffix: seal time, then a sequence number if several logs were
+# sealed in the same second (speedtest.log.20261017-120000-1.gz)
+SEGMENT_SUFFIX = re.compile(r'\.(\d{8}-\d{6})(?:-(\d+))?\.gz$')
+
+
+class SegmentedLogHandler(RotatingFileHandler):
+    """
+    Log file handler that seals a full log into a gzipped, timestamped segment
+
+    Sealed segments never change, so a sync only has to send the active log
+    (at most max_bytes) and segments it has not sent before. Several processes
+    (the monitor, the sync worker) write the same log; a process that finds
+    the file was sealed by another one reopens it instead of writing to the
+    sealed copy.
+    """
+
+    def __init__(self, filename, max_bytes=LOG_MAX_BYTES, segment_dir=LOG_SEGMENT_DIR,
+                 keep=LOG_SEGMENTS_KEEP):
+        super().__init__(filename, maxBytes=max_bytes)
+        self.segment_dir = Path(segment_dir)
+        self.keep = keep
+
+    def emit(self, record):
+        if self.stream is not None:
+            try:
+                current = os.stat(self.baseFilename)
+                opened = os.fstat(self.stream.fileno())
+                if (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino):
+                    self.stream.close()
+                    self.stream = None
+            except FileNotFoundError:
+                self.stream.close()
+                self.stream = None
+            except (OSError, ValueError):
+                pass
+        super().emit(record)
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        seal_log_segment(Path(self.baseFilename), self.segment_dir, self.keep)
+        if not self.delay:
+            self.stream = self._open()
+
+
+def seal_log_segment(log_file, segment_dir=LOG_SEGMENT_DIR, keep=LOG_SEGMENTS_KEEP):
+    """
+    Move a log into a gzipped, timestamped segment and prune old segments
+
+    Args:
+        log_file (Path): Active log file
+        segment_dir (Path): Directory holding the segments
+        keep (int): Number of newest segments to keep
+
+    Returns:
+        Path or None: The new segment, or None if another process sealed the
+        log first
+    """
+    segment_dir.mkdir(parents=True, exist_ok=True)
+    sealing = segment_dir / f".{log_file.name}.{os.getpid()}.sealing"
+    try:
+        # Renaming first means only one process seals a given log
+        os.rename(log_file, sealing)
+    except FileNotFoundError:
+        return None
+
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    segment = segment_dir / f"{log_file.name}.{stamp}.gz"
+    suffix = 1
+    while segment.exists():
+        segment = segment_dir / f"{log_file.name}.{stamp}-{suffix}.gz"
+        suffix += 1
+
+    tmp_segment = segment.with_name(f".{segment.name}.tmp")
+    with open(sealing, 'rb') as src, gzip.open(tmp_segment, 'wb') as dest:
+        shutil.copyfileobj(src, dest)
+    os.replace(tmp_segment, segment)
+    sealing.unlink()
+
+    for old_segment in log_segments(log_file, segment_dir)[:-keep or None]:
+        old_segment.unlink()
+    return segment
+
+
+def _segment_order(segment):
+    """Sort key of a segment: seal time, then sequence number (unparsed names first)"""
+    match = SEGMENT_SUFFIX.search(segment.name)
+    if match is None:
+        return ('', 0, segment.name)
+    return (match.group(1), int(match.group(2) or 0), segment.name)
+
+
+def log_segments(log_file=LOG_FILE, segment_dir=LOG_SEGMENT_DIR):
+    """
+    Get the sealed segments of a log, oldest first
+
+    Segments sealed in the same second are ordered by their sequence number,
+    which a plain name sort gets wrong ("-1.gz" sorts before ".gz").
+
+    Returns:
+        list: Segment paths
+    """
+    if not segment_dir.exists():
+        return []
+    return sorted(segment_dir.glob(f"{log_file.name}.*.gz"), key=_segment_order)
+
+
+def log_backup_files(log_file=LOG_FILE, segment_dir=LOG_SEGMENT_DIR):
+    """
+    Get the log files to back up
+
+    Returns:
+        list: (local_path, relative_remote_name) tuples - sealed segments
+        under the segment directory's name, then the active log
+    """
+    files = [(segment, f"{segment_dir.name}/{segment.name}") for segment in log_segments(log_file, segment_dir)]
+    if log_file.exists():
+        files.append((log_file, log_file.name))
+    return files
 
 
 def setup_logging():
@@ -21,7 +148,7 @@ def setup_logging():
         level=log_level,
         format='%(asctime)s - %(levelname)s - %(message)s',
         handlers=[
-            logging.FileHandler(LOG_FILE),
+            SegmentedLogHandler(LOG_FILE),
             logging.StreamHandler(sys.stdout)
         ]
     )
@@ -6,17 +6,105 @@ import sys
 from config import EXIT_SUCCESS, EXIT_FAILURE, EXIT_INTERRUPT
 from logging_config import setup_logging, get_logger
 from speedtest_runner import run_speed_test
-from csv_handler import save_to_csv, save_failure_to_csv
-from smb_sync import sync_to_smb, get_smb_status
+from csv_handler import save_to_csv, save_failure_to_csv, get_csv_stats
+from smb_sync import get_smb_status
+from sync_outbox import enqueue_sync
+from sync_throttle import measurement_lock
+from scheduler import run_daemon
 
 # Initialize logger (will be configured after setup_logging is called)
 logger = None
 
 
-def main():
+def log_diagnostics():
+    """Log SMB status and history counters at startup"""
+    # Log SMB status for diagnostics
+    try:
+        smb_status = get_smb_status()
+        logger.info(f"SMB Status: {smb_status}")
+    except Exception as e:
+        logger.warning(f"Failed to get SMB status: {str(e)}")
+    
+    # Log history counters for diagnostics (read from the counters sidecar)
+    csv_stats = get_csv_stats()
+    logger.info(f"CSV Stats: {csv_stats['record_count']} records "
+               f"({csv_stats['success_count']} successful, {csv_stats['failure_count']} failed)")
+
+
+def run_test_cycle():
+    """
+    Run one speed test, save the result locally and queue the SMB sync
+    
+    Returns:
+        int: EXIT_SUCCESS or EXIT_FAILURE
+    """
+    # Run the speed test
+    logger.info("Executing speed test...")
+    # Background syncs pause while the measurement lock is held
+    with measurement_lock():
+        speed_data = run_speed_test()
+    
+    if not speed_data:
+        logger.error("Speed test failed - check previous error messages for details")
+        save_failure_to_csv("SpeedTestFailed", "Complete speedtest execution failed", "main_execution")
+        return EXIT_FAILURE
+    
+    # Save results to local CSV
+    logger.info("Saving results to local CSV...")
+    try:
+        if not save_to_csv(speed_data):
+            logger.error("Failed to save data locally")
+            save_failure_to_csv("CSVSaveError", "Failed to save results to local CSV file", "local_save")
+            return EXIT_FAILURE
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"Exception during CSV save: {error_msg}")
+        save_failure_to_csv("CSVSaveException", error_msg, "local_save")
+        return EXIT_FAILURE
+    
+    # Queue the SMB sync; a background worker performs it (with retries)
+    # so a slow or unavailable share doesn't hold up the run
+    logger.info("Queueing sync to SMB share...")
+    try:
+        if not enqueue_sync():
+            logger.warning("Failed to queue SMB sync - data saved locally only")
+            save_failure_to_csv("SMBSyncFailed", "Failed to queue SMB synchronization", "smb_sync")
+    except Exception as e:
+        error_msg = str(e)
+        logger.warning(f"SMB sync exception: {error_msg}")
+        save_failure_to_csv("SMBSyncException", error_msg, "smb_sync")
+    
+    return EXIT_SUCCESS
+
+
+def scheduled_test_cycle():
+    """
+    Run one test cycle for the daemon, recording unexpected errors as failures
+    
+    Returns:
+        int: EXIT_SUCCESS or EXIT_FAILURE
+    """
+    try:
+        return run_test_cycle()
+    except Exception as e:
+        import traceback
+        error_msg = str(e)
+        logger.error(f"Unexpected error in scheduled test: {error_msg}")
+        logger.error(f"Full traceback: {traceback.format_exc()}")
+        save_failure_to_csv("MainExecutionError", error_msg, "main_execution")
+        return EXIT_FAILURE
+
+
+def main(daemon=False, interval=None, jitter=None):
     """
     Main execution function that orchestrates the speedtest monitoring process
     
+    Args:
+        daemon (bool): Keep running and schedule tests in-process instead of
+            running a single test
+        interval (float): Daemon seconds between tests (default: DAEMON_INTERVAL_SECONDS)
+        jitter (float): Daemon maximum random delay per test (default: DAEMON_JITTER_SECONDS)
+    
     Returns:
         int: Exit code (EXIT_SUCCESS, EXIT_FAILURE, or EXIT_INTERRUPT)
     """
@@ -27,47 +115,20 @@ def main():
         logger = setup_logging()
         logger.info("=== Speed Test Monitor Started (SMB Version) ===")
         
-        # Log SMB status for diagnostics
-        try:
-            smb_status = get_smb_status()
-            logger.info(f"SMB Status: {smb_status}")
-        except Exception as e:
-            logger.warning(f"Failed to get SMB status: {str(e)}")
+        log_diagnostics()
         
-        # Run the speed test
-        logger.info("Executing speed test...")
-        speed_data = run_speed_test()
-        
-        if not speed_data:
-            logger.error("Speed test failed - check previous error messages for details")
-            save_failure_to_csv("SpeedTestFailed", "Complete speedtest execution failed", "main_execution")
-            return EXIT_FAILURE
-        
-        # Save results to local CSV
-        logger.info("Saving results to local CSV...")
-        try:
-            if not save_to_csv(speed_data):
-                logger.error("Failed to save data locally")
-                save_failure_to_csv("CSVSaveError", "Failed to save results to local CSV file", "local_save")
-                return EXIT_FAILURE
-        except Exception as e:
-            error_msg = str(e)
-            logger.error(f"Exception during CSV save: {error_msg}")
-            save_failure_to_csv("CSVSaveException", error_msg, "local_save")
-            return EXIT_FAILURE
+        if daemon:
+            # Logging, imports and the SMB probe above are paid once; each
+            # scheduled cycle is just the measurement, save and sync queueing
+            schedule = {key: value for key, value in (('interval', interval), ('jitter', jitter))
+                        if value is not None}
+            run_daemon(scheduled_test_cycle, **schedule)
+            logger.info("=== Speed Test Monitor Daemon Stopped ===")
+            return EXIT_SUCCESS
         
-        # Sync to SMB share
-        logger.info("Syncing to SMB share...")
-        try:
-            if sync_to_smb():
-                logger.info("SMB sync successful")
-            else:
-                logger.warning("SMB sync failed - data saved locally only")
-                save_failure_to_csv("SMBSyncFailed", "SMB synchronization failed", "smb_sync")
-        except Exception as e:
-            error_msg = str(e)
-            logger.warning(f"SMB sync exception: {error_msg}")
-            save_failure_to_csv("SMBSyncException", error_msg, "smb_sync")
+        exit_code = run_test_cycle()
+        if exit_code != EXIT_SUCCESS:
+            return exit_code
         
         logger.info("=== Speed Test Monitor Completed Successfully ===")
         return EXIT_SUCCESS
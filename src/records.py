@@ -0,0 +1,154 @@
+"""
+Speed test result record for the Speedtest Monitor application
+
+Results are passed around as ``SpeedRecord`` named tuples rather than dicts:
+numbers are parsed once when a row is read (or measured), the timestamp is
+also kept as epoch seconds for range filtering, and a tuple takes a fraction
+of the memory of a per-row dict when whole histories are cached.
+"""
+
+import datetime
+from typing import NamedTuple, Optional
+from config import CSV_FIELDNAMES
+from csv_index import parse_timestamp
+
+
+def _parse_float(value):
+    """Convert a CSV/dict value to a float, or None if it is empty or invalid"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class SpeedRecord(NamedTuple):
+    """One speed test result (successful or failed) with parsed values"""
+
+    timestamp: str
+    epoch: Optional[float]
+    download_mbps: Optional[float]
+    upload_mbps: Optional[float]
+    ping_ms: Optional[float]
+    server_name: Optional[str]
+    server_country: Optional[str]
+    server_sponsor: Optional[str]
+    status: Optional[str]
+    error_type: Optional[str]
+    error_details: Optional[str]
+
+    @classmethod
+    def from_csv_row(cls, values, positions=None):
+        """
+        Build a record from one parsed CSV row
+
+        Args:
+            values (list): Field strings as produced by csv.reader
+            positions (tuple): Column index of each CSV_FIELDNAMES field, from
+                column_positions(), when the file's header differs from
+                CSV_FIELDNAMES
+
+        Returns:
+            SpeedRecord: The parsed record
+        """
+        if positions is not None:
+            values = [values[i] if i is not None and i < len(values) else '' for i in positions]
+        elif len(values) < len(CSV_FIELDNAMES):
+            values = list(values) + [''] * (len(CSV_FIELDNAMES) - len(values))
+
+        timestamp = values[0]
+        return cls(
+            timestamp,
+            parse_timestamp(timestamp),
+            _parse_float(values[1]),
+            _parse_float(values[2]),
+            _parse_float(values[3]),
+            values[4] or None,
+            values[5] or None,
+            values[6] or None,
+            values[7] or None,
+            values[8] or None,
+            values[9] or None
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a record from a result dictionary (or a DictReader row)
+
+        A missing timestamp is set to the current time.
+
+        Args:
+            data (dict): Mapping with CSV_FIELDNAMES keys
+
+        Returns:
+            SpeedRecord: The parsed record
+        """
+        timestamp = str(data.get('timestamp') or datetime.datetime.now().isoformat())
+        return cls(
+            timestamp,
+            parse_timestamp(timestamp),
+            _parse_float(data.get('download_mbps')),
+            _parse_float(data.get('upload_mbps')),
+            _parse_float(data.get('ping_ms')),
+            data.get('server_name') or None,
+            data.get('server_country') or None,
+            data.get('server_sponsor') or None,
+            data.get('status') or None,
+            data.get('error_type') or None,
+            data.get('error_details') or None
+        )
+
+    def to_csv_row(self):
+        """
+        Convert to CSV field values in CSV_FIELDNAMES order
+
+        Returns:
+            list: Values for csv.writer (None written as an empty field)
+        """
+        return [
+            self.timestamp,
+            '' if self.download_mbps is None else self.download_mbps,
+            '' if self.upload_mbps is None else self.upload_mbps,
+            '' if self.ping_ms is None else self.ping_ms,
+            self.server_name or '',
+            self.server_country or '',
+            self.server_sponsor or '',
+            self.status or '',
+            self.error_type or '',
+            self.error_details or ''
+        ]
+
+    def to_dict(self):
+        """Convert to a dictionary, e.g. for JSON responses"""
+        return self._asdict()
+
+    @property
+    def failed(self):
+        """Whether the record is a failed test"""
+        # Check status first, then fallback to data validation for older entries
+        return bool(
+            self.status == 'FAILED' or
+            self.error_type or
+            (self.download_mbps is None and self.upload_mbps is None)
+        )
+
+
+def column_positions(header):
+    """
+    Map a CSV header onto CSV_FIELDNAMES for SpeedRecord.from_csv_row
+
+    Returns:
+        tuple or None: Column index (or None if missing) of each field, or
+        None when the header already is CSV_FIELDNAMES
+    """
+    header = list(header)
+    if header[:len(CSV_FIELDNAMES)] == CSV_FIELDNAMES:
+        return None
+    return tuple(header.index(field) if field in header else None for field in CSV_FIELDNAMES)
+
+
+def as_record(data):
+    """Get a SpeedRecord for a record or a result dictionary"""
+    return data if isinstance(data, SpeedRecord) else SpeedRecord.from_dict(data)
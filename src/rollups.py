@@ -0,0 +1,219 @@
+"""
+Hourly and daily rollups of the Speedtest Monitor history
+
+A rollup bucket holds the test count, success count and, per metric
+(download, upload, ping), the number/sum/min/max of values from successful
+tests. Buckets are keyed by the timestamp prefix of the rows they cover
+('2026-10-17T13' for hours, '2026-10-17' for days), are updated in O(1) per
+saved result, and merge exactly, so long-range statistics can be computed from
+a few hundred buckets instead of every raw row.
+
+A window starting at an arbitrary time is covered by daily buckets for the
+whole days in it, hourly buckets for the whole hours before the first whole
+day, and raw rows for the part of an hour before the first whole hour (see
+window_boundaries).
+"""
+
+import datetime
+
+# Rollup metric name -> SpeedRecord field
+METRICS = (
+    ('download', 'download_mbps'),
+    ('upload', 'upload_mbps'),
+    ('ping', 'ping_ms')
+)
+
+# Bucket key lengths within an ISO timestamp
+HOUR_KEY_LENGTH = 13
+DAY_KEY_LENGTH = 10
+
+
+def bucket_keys(timestamp):
+    """
+    Get the hourly and daily bucket keys for an ISO timestamp
+
+    Returns:
+        tuple or None: (hour_key, day_key), or None for an unusable timestamp
+    """
+    timestamp = str(timestamp or '')
+    if len(timestamp) < HOUR_KEY_LENGTH or timestamp[DAY_KEY_LENGTH] not in 'T ':
+        return None
+    return timestamp[:HOUR_KEY_LENGTH].replace(' ', 'T'), timestamp[:DAY_KEY_LENGTH]
+
+
+def empty_bucket():
+    """Create an empty rollup bucket"""
+    return {'count': 0, 'success_count': 0}
+
+
+def add_row(bucket, record):
+    """
+    Add one result to a bucket
+
+    Args:
+        bucket (dict): Bucket to update in place
+        record (SpeedRecord): Result to add
+    """
+    bucket['count'] += 1
+    if record.failed:
+        return
+
+    bucket['success_count'] += 1
+    for metric, column in METRICS:
+        value = getattr(record, column)
+        if value is None:
+            continue
+        values = bucket.get(metric)
+        if values is None:
+            bucket[metric] = [1, value, value, value]
+        else:
+            values[0] += 1
+            values[1] += value
+            values[2] = min(values[2], value)
+            values[3] = max(values[3], value)
+
+
+def merge_bucket(total, bucket):
+    """
+    Merge one bucket into another
+
+    Args:
+        total (dict): Bucket to update in place
+        bucket (dict): Bucket to add
+    """
+    total['count'] += bucket['count']
+    total['success_count'] += bucket['success_count']
+    for metric, _ in METRICS:
+        values = bucket.get(metric)
+        if not values:
+            continue
+        if metric not in total:
+            total[metric] = list(values)
+        else:
+            merged = total[metric]
+            merged[0] += values[0]
+            merged[1] += values[1]
+            merged[2] = min(merged[2], values[2])
+            merged[3] = max(merged[3], values[3])
+
+
+def add_to_rollups(rollups, record):
+    """
+    Add one result to the hourly and daily buckets it falls into
+
+    Args:
+        rollups (dict): {'hourly': {...}, 'daily': {...}} updated in place
+        record (SpeedRecord): Result to add
+    """
+    keys = bucket_keys(record.timestamp)
+    if keys is None:
+        return
+    add_row(rollups['hourly'].setdefault(keys[0], empty_bucket()), record)
+    add_row(rollups['daily'].setdefault(keys[1], empty_bucket()), record)
+
+
+def window_boundaries(since):
+    """
+    Split a window into raw, hourly and daily parts
+
+    Args:
+        since (datetime): Window start
+
+    Returns:
+        tuple: (hour_start, day_start) - rows in [since, hour_start) are read
+        raw, hours in [hour_start, day_start) come from hourly buckets and
+        days from day_start onwards from daily buckets
+    """
+    hour_start = since.replace(minute=0, second=0, microsecond=0)
+    if hour_start < since:
+        hour_start += datetime.timedelta(hours=1)
+
+    day_start = hour_start.replace(hour=0)
+    if day_start < hour_start:
+        day_start += datetime.timedelta(days=1)
+
+    return hour_start, day_start
+
+
+def merge_window(total, rollups, since=None):
+    """
+    Merge the buckets of one rollups dict that fall inside a window
+
+    Rows before the window's first whole hour are not included; the caller
+    adds them from raw data.
+
+    Args:
+        total (dict): Bucket to update in place
+        rollups (dict): {'hourly': {...}, 'daily': {...}}
+        since (datetime): Window start, or None for everything
+    """
+    if since is None:
+        for bucket in rollups['daily'].values():
+            merge_bucket(total, bucket)
+        return
+
+    hour_start, day_start = window_boundaries(since)
+    first_hour = hour_start.strftime('%Y-%m-%dT%H')
+    first_day = day_start.strftime('%Y-%m-%d')
+    end_hour = day_start.strftime('%Y-%m-%dT%H')
+
+    for key, bucket in rollups['daily'].items():
+        if key >= first_day:
+            merge_bucket(total, bucket)
+    for key, bucket in rollups['hourly'].items():
+        if first_hour <= key < end_hour:
+            merge_bucket(total, bucket)
+
+
+def bucket_statistics(bucket):
+    """
+    Convert a bucket to the summary statistics returned by calculate_statistics
+
+    Returns:
+        dict: total/successful/failed counts, success rate and avg/min/max per
+        metric, or an empty dict for an empty bucket
+    """
+    if not bucket['count']:
+        return {}
+
+    stats = {
+        'total_tests': bucket['count'],
+        'successful_tests': bucket['success_count'],
+        'failed_tests': bucket['count'] - bucket['success_count'],
+        'success_rate': round((bucket['success_count'] / bucket['count']) * 100, 1)
+    }
+    for metric, _ in METRICS:
+        values = bucket.get(metric)
+        if values:
+            stats[metric] = {
+                'avg': round(values[1] / values[0], 2),
+                'min': round(values[2], 2),
+                'max': round(values[3], 2)
+            }
+    return stats
+
+
+def bucket_series(rollups, resolution='hourly', since=None):
+    """
+    Get chart points from rollup buckets in time order
+
+    Args:
+        rollups (dict): {'hourly': {...}, 'daily': {...}}
+        resolution (str): 'hourly' or 'daily'
+        since (datetime): Only include buckets starting at or after this time
+
+    Returns:
+        list: Dictionaries with the bucket start timestamp, counts and the
+        avg/min/max statistics of each metric
+    """
+    key_format = '%Y-%m-%dT%H' if resolution == 'hourly' else '%Y-%m-%d'
+    first_key = since.strftime(key_format) if since else ''
+
+    series = []
+    for key in sorted(rollups[resolution]):
+        if key < first_key:
+            continue
+        point = bucket_statistics(rollups[resolution][key])
+        point['timestamp'] = datetime.datetime.strptime(key, key_format).isoformat()
+        series.append(point)
+    return series
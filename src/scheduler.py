@@ -0,0 +1,146 @@
+"""
+In-process test scheduler for the Speedtest Monitor daemon mode
+
+Run from cron, every test pays for interpreter startup, imports, logging
+setup and an SMB probe. run_daemon() instead keeps one process alive and
+calls the test function on a fixed grid of slots DAEMON_INTERVAL_SECONDS
+apart, each delayed by a random jitter of up to DAEMON_JITTER_SECONDS so
+monitors sharing a link don't test at the same moment. The last slot run is
+saved in SCHEDULER_STATE_FILE; slots missed while the daemon was stopped (or
+the host was suspended) are caught up with a single immediate run rather
+than a burst of back-to-back tests. SIGTERM and SIGINT let a running test
+finish and then stop the loop.
+"""
+
+import json
+import os
+import random
+import signal
+import threading
+import time
+from config import DAEMON_INTERVAL_SECONDS, DAEMON_JITTER_SECONDS, SCHEDULER_STATE_FILE
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Longest single sleep, so wall clock jumps (suspend, NTP) are noticed
+MAX_SLEEP_SECONDS = 60
+
+
+def load_last_slot():
+    """
+    Read the last slot run from the scheduler state
+
+    Returns:
+        float or None: Epoch seconds of the last slot, None if never run
+    """
+    try:
+        with open(SCHEDULER_STATE_FILE, 'r') as f:
+            return float(json.load(f)['last_slot'])
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.debug(f"Ignoring unreadable scheduler state: {str(e)}")
+        return None
+
+
+def save_last_slot(slot, finished=None):
+    """
+    Record a slot as run
+
+    Args:
+        slot (float): Epoch seconds of the slot
+        finished (float): When its run finished (default: now)
+    """
+    try:
+        SCHEDULER_STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = SCHEDULER_STATE_FILE.with_name(f".{SCHEDULER_STATE_FILE.name}.tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump({'last_slot': slot, 'finished': finished or time.time()}, f)
+        os.replace(tmp_file, SCHEDULER_STATE_FILE)
+    except Exception as e:
+        logger.warning(f"Failed to save scheduler state: {str(e)}")
+
+
+def plan_next(last_slot, now, interval, jitter, rng=random):
+    """
+    Work out the next slot and when to run it
+
+    Args:
+        last_slot (float): Last slot run, or None
+        now (float): Current epoch seconds
+        interval (float): Seconds between slots
+        jitter (float): Maximum random delay added to a slot
+        rng: Random source (for tests)
+
+    Returns:
+        tuple: (slot, run_at, missed) - missed is the number of earlier
+        overdue slots folded into this run, which is due immediately
+    """
+    if last_slot is None:
+        return now, now, 0
+
+    slot = last_slot + interval
+    if slot > now:
+        return slot, slot + rng.uniform(0, jitter), 0
+
+    # Overdue: run the most recent slot now and skip the older ones
+    missed = int((now - slot) // interval)
+    slot += missed * interval
+    return slot, now, missed
+
+
+def run_daemon(run_once, interval=DAEMON_INTERVAL_SECONDS, jitter=DAEMON_JITTER_SECONDS,
+               stop_event=None, install_signals=True):
+    """
+    Call run_once on schedule until stopped
+
+    Args:
+        run_once (callable): One test cycle; its return value is logged
+        interval (float): Seconds between slots
+        jitter (float): Maximum random delay added to a slot
+        stop_event (threading.Event): Set to stop the loop (default: a new one)
+        install_signals (bool): Stop on SIGTERM/SIGINT
+
+    Returns:
+        int: Number of cycles run
+    """
+    stop = stop_event or threading.Event()
+    if install_signals:
+        def _request_stop(signum, frame):
+            if stop.is_set():
+                # Second signal: don't wait for the running test
+                raise SystemExit(128 + signum)
+            logger.info(f"Received {signal.Signals(signum).name} - stopping after the current test")
+            stop.set()
+
+        signal.signal(signal.SIGTERM, _request_stop)
+        signal.signal(signal.SIGINT, _request_stop)
+
+    logger.info(f"Daemon scheduling a test every {interval:.0f}s (jitter up to {jitter:.0f}s)")
+    cycles = 0
+    while not stop.is_set():
+        slot, run_at, missed = plan_next(load_last_slot(), time.time(), interval, jitter)
+        if missed:
+            logger.info(f"Catching up: {missed} missed run(s) folded into one test")
+
+        # Sleep in bounded steps, re-reading the clock each time
+        while not stop.is_set():
+            remaining = run_at - time.time()
+            if remaining <= 0:
+                break
+            stop.wait(min(remaining, MAX_SLEEP_SECONDS))
+        if stop.is_set():
+            break
+
+        started = time.monotonic()
+        try:
+            result = run_once()
+            logger.info(f"Scheduled test finished in {time.monotonic() - started:.1f}s (result {result})")
+        except Exception as e:
+            logger.error(f"Scheduled test raised {type(e).__name__}: {str(e)}")
+        save_last_slot(slot)
+        cycles += 1
+
+    logger.info(f"Daemon stopped after {cycles} test(s)")
+    return cycles
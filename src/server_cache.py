@@ -0,0 +1,287 @@
+"""
+Cached speedtest.net config and server list for the Speedtest Monitor application
+
+speedtest.Speedtest() downloads the client config on construction, and
+get_servers() downloads and parses the server list XML - all before anything
+is measured. CachedSpeedtest serves
+both from SERVER_CACHE_FILE, a compact JSON file written whenever they are
+fetched, and records how long the fetch it replaced took so every run can log
+the time saved.
+
+Entries older than their TTL are still used, but refresh_in_background()
+fetches new ones after the test so the next run is current. When the fresh
+config shows a different client IP or ISP the cached server list (whose
+distances depend on the client location) is dropped and fetched again.
+
+With the server list the cache stores its coordinates, precomputed for
+geodistance.nearest(), so get_closest_servers() ranks the whole list in one
+vectorized pass from the current client location.
+"""
+
+import copy
+import json
+import os
+import threading
+import time
+import speedtest
+from config import (
+    SERVER_CACHE_FILE, SERVER_CACHE_CONFIG_TTL_SECONDS,
+    SERVER_CACHE_SERVERS_TTL_SECONDS, SERVER_CACHE_MAX_AGE_SECONDS
+)
+from geodistance import build_coordinates, as_arrays, nearest
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_refresh_lock = threading.Lock()
+
+
+def load_cache():
+    """
+    Read the cache file
+
+    Returns:
+        dict: Cached entries, empty if missing or unreadable
+    """
+    try:
+        with open(SERVER_CACHE_FILE, 'r') as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.debug(f"Ignoring unreadable server cache: {str(e)}")
+        return {}
+
+
+def save_cache(cache):
+    """Write the cache file atomically"""
+    try:
+        SERVER_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = SERVER_CACHE_FILE.with_name(f".{SERVER_CACHE_FILE.name}.{os.getpid()}.tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump(cache, f, separators=(',', ':'), default=str)
+        os.replace(tmp_file, SERVER_CACHE_FILE)
+    except Exception as e:
+        logger.warning(f"Failed to save server cache: {str(e)}")
+
+
+def invalidate_cache():
+    """Drop the cache, e.g. after the cached servers stopped working"""
+    try:
+        SERVER_CACHE_FILE.unlink()
+        logger.info("Speedtest server cache invalidated")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Failed to invalidate server cache: {str(e)}")
+
+
+def client_key(config):
+    """
+    Identify the client a config was fetched for
+
+    Args:
+        config (dict): speedtest config, or None
+
+    Returns:
+        tuple: (ip, isp), or None without a config
+    """
+    if not config:
+        return None
+    client = config.get('client', {})
+    return (client.get('ip'), client.get('isp'))
+
+
+def entry_age(cache, name, now=None):
+    """
+    Age of a cache entry ('config' or 'servers') in seconds, None if absent
+    """
+    fetched = cache.get(f"{name}_fetched")
+    if cache.get(name) is None or fetched is None:
+        return None
+    return (time.time() if now is None else now) - fetched
+
+
+def is_stale(cache, now=None):
+    """
+    Check whether the cache should be refreshed
+
+    Returns:
+        bool: True if an entry is missing or older than its TTL
+    """
+    config_age = entry_age(cache, 'config', now)
+    servers_age = entry_age(cache, 'servers', now)
+    return (config_age is None or config_age >= SERVER_CACHE_CONFIG_TTL_SECONDS
+            or servers_age is None or servers_age >= SERVER_CACHE_SERVERS_TTL_SECONDS)
+
+
+def _usable(cache, name):
+    age = entry_age(cache, name)
+    return age is not None and 0 <= age < SERVER_CACHE_MAX_AGE_SECONDS
+
+
+def _flatten_servers(servers):
+    """Turn speedtest's {distance: [server, ...]} mapping into a list"""
+    return [server for distance in sorted(servers) for server in servers[distance]]
+
+
+def _coordinates_for(servers):
+    """build_coordinates(), or None if a server has no usable position"""
+    try:
+        return build_coordinates(servers)
+    except (KeyError, TypeError, ValueError) as e:
+        logger.debug(f"Server list has unusable coordinates: {str(e)}")
+        return None
+
+
+class CachedSpeedtest(speedtest.Speedtest):
+    """
+    speedtest.Speedtest serving get_config() and get_servers() from the cache
+
+    Fetches that do happen are written back to the cache. saved_seconds
+    accumulates the fetch time each cache hit avoided. get_closest_servers()
+    ranks by the cached coordinates.
+    """
+
+    def __init__(self, cache=None, **kwargs):
+        self._cache = load_cache() if cache is None else cache
+        self._server_list = None
+        self._coordinates = None
+        self.saved_seconds = 0.0
+        self.cache_hits = []
+        super().__init__(**kwargs)
+
+    def get_config(self):
+        if _usable(self._cache, 'config'):
+            self.config.update(copy.deepcopy(self._cache['config']))
+            client = self.config['client']
+            self.lat_lon = (float(client['lat']), float(client['lon']))
+            self.saved_seconds += self._cache.get('config_seconds', 0.0)
+            self.cache_hits.append('config')
+            return self.config
+
+        started = time.monotonic()
+        config = super().get_config()
+        previous = client_key(self._cache.get('config'))
+        self._cache.update({
+            'config': copy.deepcopy(config),
+            'config_fetched': time.time(),
+            'config_seconds': round(time.monotonic() - started, 3)
+        })
+        if previous is not None and previous != client_key(config):
+            logger.info("Client IP/ISP changed - dropping cached server list")
+            self._cache.pop('servers', None)
+            self._cache.pop('coordinates', None)
+        save_cache(self._cache)
+        return config
+
+    def get_servers(self, servers=None, exclude=None):
+        # Filtered lists are not cached
+        if servers or exclude:
+            self._server_list = self._coordinates = None
+            return super().get_servers(servers, exclude)
+
+        if _usable(self._cache, 'servers'):
+            self.servers = {}
+            for server in self._cache['servers']:
+                self.servers.setdefault(server['d'], []).append(dict(server))
+            self._server_list = self._cache['servers']
+            coordinates = self._cache.get('coordinates') or _coordinates_for(self._server_list)
+            self._coordinates = as_arrays(coordinates) if coordinates else None
+            self.saved_seconds += self._cache.get('servers_seconds', 0.0)
+            self.cache_hits.append('servers')
+            return self.servers
+
+        started = time.monotonic()
+        result = super().get_servers()
+        self._server_list = _flatten_servers(result)
+        coordinates = _coordinates_for(self._server_list)
+        self._coordinates = as_arrays(coordinates) if coordinates else None
+        self._cache.update({
+            'servers': self._server_list,
+            'servers_fetched': time.time(),
+            'servers_seconds': round(time.monotonic() - started, 3),
+            'coordinates': coordinates
+        })
+        save_cache(self._cache)
+        return result
+
+    def get_closest_servers(self, limit=5):
+        if self._coordinates is None:
+            return super().get_closest_servers(limit)
+
+        lat, lon = self.lat_lon
+        self.closest = [dict(self._server_list[index], d=distance)
+                        for index, distance in nearest(self._coordinates, lat, lon, limit)]
+        return self.closest
+
+
+def refresh_cache():
+    """
+    Fetch the config, and the server list if it is stale or the client changed
+
+    Returns:
+        bool: True if the cache was refreshed, False otherwise
+    """
+    cache = load_cache()
+    try:
+        started = time.monotonic()
+        st = speedtest.Speedtest()
+        refreshed = {
+            'config': copy.deepcopy(st.config),
+            'config_fetched': time.time(),
+            'config_seconds': round(time.monotonic() - started, 3)
+        }
+
+        client_changed = client_key(cache.get('config')) not in (None, client_key(st.config))
+        servers_age = entry_age(cache, 'servers')
+        if client_changed or servers_age is None or servers_age >= SERVER_CACHE_SERVERS_TTL_SECONDS:
+            if client_changed:
+                logger.info("Client IP/ISP changed - refreshing cached server list")
+            started = time.monotonic()
+            servers = _flatten_servers(st.get_servers())
+            refreshed.update({
+                'servers': servers,
+                'servers_fetched': time.time(),
+                'servers_seconds': round(time.monotonic() - started, 3),
+                'coordinates': _coordinates_for(servers)
+            })
+        else:
+            for key in ('servers', 'servers_fetched', 'servers_seconds', 'coordinates'):
+                refreshed[key] = cache.get(key)
+
+        save_cache(refreshed)
+        logger.info(f"Speedtest server cache refreshed ({len(refreshed['servers'])} servers)")
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to refresh speedtest server cache: {str(e)}")
+        return False
+
+
+def _refresh_worker():
+    try:
+        refresh_cache()
+    finally:
+        _refresh_lock.release()
+
+
+def refresh_in_background():
+    """
+    Refresh a stale cache in a background thread
+
+    Call after the measurement so the downloads don't overlap it. The thread
+    is not a daemon thread, so a one-shot run waits for it before exiting.
+
+    Returns:
+        threading.Thread or None: The refresh thread, None if the cache is
+        fresh or a refresh is already running
+    """
+    if not is_stale(load_cache()):
+        return None
+    if not _refresh_lock.acquire(blocking=False):
+        return None
+
+    thread = threading.Thread(target=_refresh_worker, name="server-cache-refresh")
+    thread.start()
+    return thread
@@ -0,0 +1,156 @@
+"""
+Sticky best-server selection for the Speedtest Monitor application
+
+st.get_best_server() latency-probes every candidate server on each run, and
+may pick a different server each time, making results harder to compare.
+select_server() remembers the selected server and its latency in
+BEST_SERVER_FILE and, for the next STICKY_SERVER_RUNS runs, only re-probes
+that one server (with the same probe as a full selection, so latencies are
+comparable). A full selection happens when the runs are used up, when
+the server's latency has degraded past the threshold, when it no longer
+responds, or when it is missing from the current server list (e.g. after the
+client IP changed).
+"""
+
+import json
+import os
+import time
+from config import (
+    BEST_SERVER_FILE, STICKY_SERVER_RUNS, STICKY_SERVER_LATENCY_RATIO,
+    STICKY_SERVER_LATENCY_SLACK_MS
+)
+from latency_probe import select_best, probe_latency, latency_url, apply_best
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def load_sticky():
+    """
+    Read the remembered server
+
+    Returns:
+        dict or None: 'server', 'latency' (ms at selection), 'selected_at',
+        'runs' and 'last_latency', None if there is none
+    """
+    try:
+        with open(BEST_SERVER_FILE, 'r') as f:
+            sticky = json.load(f)
+        return sticky if isinstance(sticky, dict) and sticky.get('server') else None
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.debug(f"Ignoring unreadable best server file: {str(e)}")
+        return None
+
+
+def save_sticky(sticky):
+    """Write the remembered server atomically"""
+    try:
+        BEST_SERVER_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = BEST_SERVER_FILE.with_name(f".{BEST_SERVER_FILE.name}.{os.getpid()}.tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump(sticky, f, indent=2, default=str)
+        os.replace(tmp_file, BEST_SERVER_FILE)
+    except Exception as e:
+        logger.warning(f"Failed to save best server: {str(e)}")
+
+
+def clear_sticky():
+    """Forget the remembered server so the next run does a full selection"""
+    try:
+        BEST_SERVER_FILE.unlink()
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Failed to clear best server: {str(e)}")
+
+
+def latency_degraded(baseline, latency):
+    """
+    Check whether a re-probed latency is too far above the selection latency
+
+    Args:
+        baseline (float): Latency (ms) when the server was selected
+        latency (float): Latency (ms) now
+
+    Returns:
+        bool: True if latency exceeds both baseline * STICKY_SERVER_LATENCY_RATIO
+        and baseline + STICKY_SERVER_LATENCY_SLACK_MS
+    """
+    return (latency > baseline * STICKY_SERVER_LATENCY_RATIO
+            and latency > baseline + STICKY_SERVER_LATENCY_SLACK_MS)
+
+
+def _in_server_list(st, server_id):
+    return any(str(server.get('id')) == str(server_id)
+               for servers in st.servers.values() for server in servers)
+
+
+def _reuse_sticky(st, sticky):
+    """
+    Re-probe the remembered server
+
+    Returns:
+        dict or None: The server with its 'latency', applied to st, if it
+        can be reused; None if a full selection is needed
+    """
+    server = sticky['server']
+    if sticky.get('runs', 0) >= STICKY_SERVER_RUNS:
+        logger.info(f"Sticky server used for {sticky['runs']} runs - re-evaluating")
+        return None
+    if not _in_server_list(st, server.get('id')):
+        logger.info(f"Sticky server {server.get('id')} is not in the server list - re-evaluating")
+        return None
+
+    latency = probe_latency(latency_url(server))
+    if latency is None:
+        logger.info(f"Sticky server {server.get('id')} did not respond - re-evaluating")
+        return None
+
+    if latency_degraded(sticky['latency'], latency):
+        logger.info(f"Sticky server latency degraded from {sticky['latency']:.1f} ms "
+                    f"to {latency:.1f} ms - re-evaluating")
+        return None
+    return apply_best(st, server, latency)
+
+
+def select_server(st):
+    """
+    Select the server to test against, reusing the remembered one if possible
+
+    Args:
+        st (speedtest.Speedtest): Client with its server list loaded
+
+    Returns:
+        dict: Selected server, with its measured 'latency'
+    """
+    sticky = load_sticky()
+    if sticky is not None:
+        best = _reuse_sticky(st, sticky)
+        if best is not None:
+            sticky['runs'] = sticky.get('runs', 0) + 1
+            sticky['last_latency'] = best['latency']
+            save_sticky(sticky)
+            logger.info(f"Reusing sticky server {best.get('id')} (run {sticky['runs']} of "
+                        f"{STICKY_SERVER_RUNS}, {best['latency']:.1f} ms)")
+            return best
+
+    # Full selection: probe the closest candidates in parallel, falling back
+    # to speedtest's own (sequential) selection if none of them responds
+    started = time.monotonic()
+    best = select_best(st)
+    if best is None:
+        # Its latency isn't comparable with our probes, so it isn't remembered
+        logger.warning("No candidate server responded to latency probes - using get_best_server()")
+        clear_sticky()
+        return st.get_best_server()
+    logger.info(f"Full server selection took {time.monotonic() - started:.2f}s")
+    save_sticky({
+        'server': best,
+        'latency': best['latency'],
+        'selected_at': time.time(),
+        'runs': 1,
+        'last_latency': best['latency']
+    })
+    return best
@@ -0,0 +1,130 @@
+"""
+Per-host history shards on the share for the Speedtest Monitor application
+
+Every monitor syncs its history into hosts/<SITE_ID>/ on the share, so
+several Pis can point at the same directory without overwriting each other.
+This module lists those shards and merges them into one time-ordered stream
+with a heap-based k-way merge: each shard is read lazily, a partition at a
+time, so a fleet-wide view never loads every shard whole.
+"""
+
+import heapq
+from config import SMB_HOSTS_DIR, HISTORY_DIR, CSV_FILE
+from logging_config import get_logger
+from storage import CSVStorage
+
+logger = get_logger(__name__)
+
+
+def _sort_key(item):
+    """Merge key for (host, record) pairs: the record's epoch, undated rows first"""
+    epoch = item[1].epoch
+    return float('-inf') if epoch is None else epoch
+
+
+def _tagged(host, records):
+    """Pair each record of a shard with its host"""
+    for record in records:
+        yield host, record
+
+
+def list_hosts(hosts_dir=SMB_HOSTS_DIR):
+    """
+    Get the hosts that have synced history to the share
+
+    Args:
+        hosts_dir (Path): Directory holding one shard directory per host
+
+    Returns:
+        list: Host names, sorted
+    """
+    try:
+        return sorted(
+            shard.name for shard in hosts_dir.iterdir()
+            if (shard / HISTORY_DIR.name / "manifest.json").exists() or (shard / CSV_FILE.name).exists()
+        )
+    except OSError:
+        return []
+
+
+def shard_storage(host, hosts_dir=SMB_HOSTS_DIR):
+    """
+    Get a read-only view of one host's shard
+
+    Shards written by the SQLite backend only hold a speed_history.csv
+    export, which CSVStorage reads as a single partition.
+
+    Args:
+        host (str): Host name, as returned by list_hosts
+        hosts_dir (Path): Directory holding the shards
+
+    Returns:
+        CSVStorage: The shard's history
+    """
+    return CSVStorage(hosts_dir / host / HISTORY_DIR.name, read_only=True)
+
+
+def merge_records(hosts=None, since=None, hosts_dir=SMB_HOSTS_DIR):
+    """
+    Merge the shards' records in time order
+
+    Args:
+        hosts (list): Hosts to include (default: all)
+        since (datetime): Only include records at or after this time
+        hosts_dir (Path): Directory holding the shards
+
+    Yields:
+        tuple: (host, SpeedRecord), oldest first
+    """
+    hosts = list_hosts(hosts_dir) if hosts is None else hosts
+    streams = [_tagged(host, shard_storage(host, hosts_dir).iter_rows(since)) for host in hosts]
+    yield from heapq.merge(*streams, key=_sort_key)
+
+
+def latest_records(limit, hosts=None, since=None, hosts_dir=SMB_HOSTS_DIR):
+    """
+    Get the latest records across the shards
+
+    Each shard is read backwards from its end, so only about limit records
+    per shard are parsed.
+
+    Args:
+        limit (int): Maximum number of records to return
+        hosts (list): Hosts to include (default: all)
+        since (datetime): Stop at records before this time
+        hosts_dir (Path): Directory holding the shards
+
+    Returns:
+        list: Up to limit (host, SpeedRecord) pairs, oldest first
+    """
+    hosts = list_hosts(hosts_dir) if hosts is None else hosts
+    streams = [_tagged(host, shard_storage(host, hosts_dir).iter_rows_reverse(since)) for host in hosts]
+    latest = []
+    for item in heapq.merge(*streams, key=_sort_key, reverse=True):
+        latest.append(item)
+        if len(latest) >= limit:
+            break
+    return latest[::-1]
+
+
+def host_summaries(hosts_dir=SMB_HOSTS_DIR):
+    """
+    Get record counts and last test time per host, from the shard manifests
+
+    Returns:
+        list: Dicts with host, record_count, failure_count and last_timestamp
+    """
+    summaries = []
+    for host in list_hosts(hosts_dir):
+        try:
+            stats = shard_storage(host, hosts_dir).stats()
+        except Exception as e:
+            logger.warning(f"Failed to read shard stats for {host}: {str(e)}")
+            continue
+        summaries.append({
+            'host': host,
+            'record_count': stats['record_count'],
+            'failure_count': stats['failure_count'],
+            'last_timestamp': stats['last_timestamp']
+        })
+    return summaries
@@ -0,0 +1,224 @@
+"""
+Cached SMB health probe for the Speedtest Monitor application
+
+Probing the share (mount check, write test, free space, synced history file)
+costs several round trips over SMB, and a hung mount can stall each of them.
+The last probe result is kept in SMB_HEALTH_CACHE_FILE with the time it was
+taken and reused by check_smb_mount(), get_smb_status() and the web UI until
+it is older than SMB_HEALTH_TTL_SECONDS. Failed probes (and failed syncs) are
+cached for the shorter SMB_HEALTH_FAILURE_TTL_SECONDS, so an outage is not
+re-probed on every call but recovery is noticed quickly.
+"""
+
+import json
+import os
+import time
+from config import (
+    SMB_MOUNT_PATH, SMB_SPEEDTEST_DIR, SMB_BACKUP_CSV, SMB_HISTORY_DIR,
+    SMB_HEALTH_CACHE_FILE, SMB_HEALTH_TTL_SECONDS, SMB_HEALTH_FAILURE_TTL_SECONDS
+)
+from dir_status import scan_directory
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Directory levels scanned below the speedtest directory when counting files
+# (hosts/<SITE_ID>/history)
+SHARE_SCAN_DEPTH = 3
+
+
+def _load_cache():
+    """Read the cached probe result, or None if missing or unreadable"""
+    try:
+        with open(SMB_HEALTH_CACHE_FILE, 'r') as f:
+            health = json.load(f)
+        return health if isinstance(health, dict) and 'checked_at' in health else None
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.debug(f"Ignoring unreadable SMB health cache: {str(e)}")
+        return None
+
+
+def _save_cache(health):
+    """Write a probe result to the cache atomically"""
+    try:
+        SMB_HEALTH_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = SMB_HEALTH_CACHE_FILE.with_name(f".{SMB_HEALTH_CACHE_FILE.name}.{os.getpid()}.tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump(health, f, indent=2)
+        os.replace(tmp_file, SMB_HEALTH_CACHE_FILE)
+    except Exception as e:
+        logger.debug(f"Failed to save SMB health cache: {str(e)}")
+
+
+def is_fresh(health, now=None):
+    """
+    Check whether a cached probe result can still be used
+
+    Args:
+        health (dict): Probe result
+        now (float): Current epoch seconds (default: time.time())
+
+    Returns:
+        bool: True if younger than the success or failure TTL
+    """
+    ttl = SMB_HEALTH_TTL_SECONDS if health.get('ok') else SMB_HEALTH_FAILURE_TTL_SECONDS
+    age = (time.time() if now is None else now) - health.get('checked_at', 0)
+    return 0 <= age < ttl
+
+
+def _partition_bytes(manifest):
+    """
+    Sum the sizes of the partition files a history manifest lists
+
+    Only reads the manifest and stats the files, so the probe never writes
+    to the share (opening the history as a CSVStorage would refresh its
+    manifest and sidecars).
+
+    Args:
+        manifest (Path): manifest.json of a partitioned history
+
+    Returns:
+        int: Total bytes of the partition files that exist
+    """
+    try:
+        partitions = json.loads(manifest.read_text()).get('partitions', [])
+    except (OSError, ValueError):
+        return 0
+
+    total = 0
+    for entry in partitions:
+        try:
+            total += (manifest.parent / entry['file']).stat().st_size
+        except (OSError, KeyError, TypeError):
+            continue
+    return total
+
+
+def probe_smb():
+    """
+    Probe the SMB share
+
+    Returns:
+        dict: 'ok' and 'access_type' (as returned by check_smb_mount), the
+        get_smb_status() fields, the synced history file's path, size and
+        mtime, and 'checked_at'
+    """
+    health = {
+        'ok': False,
+        'access_type': 'path_not_exists',
+        'mount_exists': False,
+        'is_mounted': False,
+        'is_writable': False,
+        'speedtest_dir_exists': False,
+        'free_space': None,
+        'files_count': None,
+        'total_size': None,
+        'files_truncated': False,
+        'history_file': None,
+        'history_size': 0,
+        'history_modified': None,
+        'checked_at': time.time()
+    }
+
+    try:
+        health['mount_exists'] = SMB_MOUNT_PATH.exists()
+        if not health['mount_exists']:
+            logger.error(f"SMB mount path does not exist: {SMB_MOUNT_PATH}")
+            return health
+
+        health['is_mounted'] = SMB_MOUNT_PATH.is_mount()
+        if not health['is_mounted']:
+            logger.warning(f"Path exists but may not be mounted: {SMB_MOUNT_PATH}")
+
+        try:
+            SMB_SPEEDTEST_DIR.mkdir(parents=True, exist_ok=True)
+            health['speedtest_dir_exists'] = True
+        except PermissionError:
+            health['speedtest_dir_exists'] = SMB_SPEEDTEST_DIR.exists()
+        except Exception as e:
+            logger.error(f"Failed to create speedtest directory: {str(e)}")
+        if not health['speedtest_dir_exists']:
+            health['access_type'] = 'dir_creation_failed'
+            return health
+
+        # Test write access in the speedtest directory
+        test_file = SMB_SPEEDTEST_DIR / ".speedtest_write_test"
+        try:
+            test_file.write_text("test")
+            test_file.unlink()
+            health['is_writable'] = True
+            health['ok'], health['access_type'] = True, 'direct_access'
+        except PermissionError:
+            logger.info("Direct write failed due to permissions, will try sudo approach")
+            health['ok'], health['access_type'] = True, 'sudo_required'
+        except Exception as e:
+            logger.error(f"SMB speedtest directory access failed: {str(e)}")
+            health['access_type'] = f"error: {str(e)}"
+
+        try:
+            statvfs = os.statvfs(SMB_MOUNT_PATH)
+            health['free_space'] = statvfs.f_frsize * statvfs.f_bavail
+        except Exception:
+            pass
+
+        # Bounded scan of the speedtest directory and the host shards in it
+        files = scan_directory(SMB_SPEEDTEST_DIR, max_depth=SHARE_SCAN_DEPTH)
+        health['files_count'] = files['files']
+        health['total_size'] = files['total_bytes']
+        health['files_truncated'] = files['truncated']
+
+        # The synced history, as shown by the web UI
+        manifest = SMB_HISTORY_DIR / "manifest.json"
+        for history_file in (manifest, SMB_BACKUP_CSV):
+            try:
+                file_stat = history_file.stat()
+            except OSError:
+                continue
+            health['history_file'] = str(history_file)
+            health['history_modified'] = file_stat.st_mtime
+            if history_file == manifest:
+                health['history_size'] = _partition_bytes(manifest)
+            else:
+                health['history_size'] = file_stat.st_size
+            break
+
+    except Exception as e:
+        logger.error(f"Failed to check SMB mount: {str(e)}")
+        health['ok'], health['access_type'] = False, f"check_failed: {str(e)}"
+
+    return health
+
+
+def get_smb_health(force=False):
+    """
+    Get the SMB health, probing the share only if the cached result is stale
+
+    Args:
+        force (bool): Probe even if the cached result is fresh
+
+    Returns:
+        dict: Probe result (see probe_smb)
+    """
+    health = None if force else _load_cache()
+    if health is not None and is_fresh(health):
+        return health
+
+    health = probe_smb()
+    _save_cache(health)
+    return health
+
+
+def record_smb_failure(reason):
+    """
+    Cache a failure seen outside a probe (e.g. a failed copy during sync)
+
+    The share is then treated as unavailable until the failure TTL expires.
+
+    Args:
+        reason (str): Failure description, stored as the access type
+    """
+    health = _load_cache() or probe_smb()
+    health.update({'ok': False, 'access_type': f"error: {reason}", 'checked_at': time.time()})
+    _save_cache(health)
@@ -1,20 +1,57 @@
 """
 SMB share mounting and file synchronization for the Speedtest Monitor application
+
+The history and log are replicated to every directory in REPLICATION_TARGETS
+(the SMB share by default), concurrently and with a per-target timeout.
 """
 
+import hashlib
+import json
 import os
-import shutil
 import subprocess
+import threading
+import time
 from pathlib import Path
 from config import (
-    SMB_MOUNT_PATH, SMB_SPEEDTEST_DIR, SMB_BACKUP_CSV, SMB_BACKUP_LOG,
-    CSV_FILE, LOG_FILE
+    SMB_SPEEDTEST_DIR, HOST_SHARD_DIR, LOG_FILE, LOG_SEGMENT_DIR, SMB_SYNC_STATE_FILE,
+    REPLICATION_TARGETS, REPLICATION_TIMEOUT_SECONDS, REPLICATION_STATUS_FILE,
+    PRIVILEGED_SYNC_TIMEOUT_SECONDS
 )
-from logging_config import get_logger
+from logging_config import get_logger, log_backup_files
 from csv_handler import save_failure_to_csv
+from smb_health import get_smb_health, record_smb_failure
+from storage import get_storage, is_archive
+from sync_throttle import pace, reset_stats, get_stats, wait_for_measurement
 
 logger = get_logger(__name__)
 
+# Writes the share refused, done in one sudo call by run_privileged_batch.
+# Arguments: owner, target dir, then (mode, src, dest, offset, size, sha256)
+# per file. Prints "ok <dest>" per file written and "owner-fixed" if the
+# target could be chowned back to the monitor's user.
+PRIVILEGED_SYNC_SCRIPT = r'''
+owner="$1"; target="$2"; shift 2
+while [ "$#" -ge 6 ]; do
+    mode="$1"; src="$2"; dest="$3"; offset="$4"; size="$5"; sha="$6"; shift 6
+    mkdir -p "$(dirname "$dest")" || continue
+    if [ "$mode" = append ]; then
+        tail -c +"$((offset + 1))" "$src" | head -c "$((size - offset))" >> "$dest" && echo "ok $dest"
+    else
+        tmp="$(dirname "$dest")/.$(basename "$dest").sudo.$$.tmp"
+        if head -c "$size" "$src" > "$tmp" && [ "$(sha256sum < "$tmp" | cut -d ' ' -f 1)" = "$sha" ] && mv -f "$tmp" "$dest"; then
+            echo "ok $dest"
+        else
+            rm -f "$tmp"
+        fi
+    fi
+done
+chown -R "$owner" "$target" && echo owner-fixed
+'''
+
+# Replication threads by target, including ones abandoned after a timeout
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
 
 def create_smb_speedtest_dir():
     """
@@ -39,171 +76,695 @@ def check_smb_mount():
     """
     Check if SMB share is mounted and accessible
     
+    Uses the cached health probe (see smb_health), so the share is only
+    write-tested when the cached result has expired.
+    
     Returns:
         tuple: (success: bool, access_type: str)
     """
-    try:
-        if not SMB_MOUNT_PATH.exists():
-            logger.error(f"SMB mount path does not exist: {SMB_MOUNT_PATH}")
-            return False, "path_not_exists"
-        
-        if not SMB_MOUNT_PATH.is_mount():
-            logger.warning(f"Path exists but may not be mounted: {SMB_MOUNT_PATH}")
-        
-        # Create speedtest directory if needed
-        if not create_smb_speedtest_dir():
-            return False, "dir_creation_failed"
-        
-        # Test write access in the speedtest directory
-        test_file = SMB_SPEEDTEST_DIR / ".speedtest_write_test"
-        try:
-            test_file.write_text("test")
-            test_file.unlink()
-            logger.info(f"SMB speedtest directory is accessible and writable: {SMB_SPEEDTEST_DIR}")
-            return True, "direct_access"
-        except PermissionError:
-            logger.info("Direct write failed due to permissions, will try sudo approach")
-            return True, "sudo_required"
-        except Exception as e:
-            logger.error(f"SMB speedtest directory access failed: {str(e)}")
-            return False, f"error: {str(e)}"
-            
-    except Exception as e:
-        logger.error(f"Failed to check SMB mount: {str(e)}")
-        return False, f"check_failed: {str(e)}"
+    health = get_smb_health()
+    if health['ok']:
+        logger.info(f"SMB speedtest directory is accessible: {SMB_SPEEDTEST_DIR} ({health['access_type']})")
+    return health['ok'], health['access_type']
 
 
-def copy_file_with_sudo(src_file, dest_file):
+def ensure_remote_dir(remote_dir):
     """
-    Copy file using sudo if needed
+    Create a directory on the SMB share, using sudo if needed
     
     Args:
-        src_file (Path): Source file path
-        dest_file (Path): Destination file path
+        remote_dir (Path): Directory to create
         
     Returns:
-        bool: True if successful, False otherwise
+        bool: True if the directory exists, False otherwise
     """
     try:
-        # Try direct copy first
-        shutil.copy2(src_file, dest_file)
-        logger.info(f"Direct copy successful: {dest_file}")
+        remote_dir.mkdir(parents=True, exist_ok=True)
         return True
     except PermissionError:
-        try:
-            # Use sudo to copy
-            cmd = ['sudo', 'cp', str(src_file), str(dest_file)]
-            result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-            logger.info(f"Sudo copy successful: {dest_file}")
-            
-            # Try to fix permissions so we can overwrite next time
-            try:
-                subprocess.run(['sudo', 'chown', f'{os.getuid()}:{os.getgid()}', str(dest_file)], 
-                             check=False, capture_output=True)
-            except:
-                pass  # Don't fail if we can't change ownership
-            
-            return True
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Sudo copy failed: {e.stderr}")
-            return False
-        except Exception as e:
-            logger.error(f"Sudo copy error: {str(e)}")
-            return False
+        result = subprocess.run(['sudo', 'mkdir', '-p', str(remote_dir)], capture_output=True, text=True)
+        if result.returncode != 0:
+            logger.error(f"Sudo mkdir failed: {result.stderr}")
+        return result.returncode == 0
     except Exception as e:
-        logger.error(f"Copy failed: {str(e)}")
+        logger.error(f"Failed to create {remote_dir}: {str(e)}")
         return False
 
 
-def sync_to_smb():
+def remove_remote_file(remote_file):
+    """
+    Remove a file from the SMB share if present, using sudo if needed
+    
+    Args:
+        remote_file (Path): File to remove
+    """
+    try:
+        if remote_file.exists():
+            remote_file.unlink()
+            logger.info(f"Removed superseded SMB file: {remote_file}")
+    except PermissionError:
+        subprocess.run(['sudo', 'rm', '-f', str(remote_file)], capture_output=True)
+    except Exception as e:
+        logger.warning(f"Failed to remove {remote_file}: {str(e)}")
+
+
+def load_sync_state():
+    """
+    Load the per-file sync state (synced byte offset and prefix checksum)
+    
+    Returns:
+        dict: Remote path -> {'offset': int, 'sha256': str, 'mtime_ns': int,
+        'local': str}, empty if missing
+    """
+    try:
+        with open(SMB_SYNC_STATE_FILE, 'r') as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable sync state {SMB_SYNC_STATE_FILE}: {str(e)}")
+        return {}
+
+
+def save_sync_state(state):
+    """
+    Save the per-file sync state atomically
+    
+    Entries whose local file no longer exists (archived partitions, pruned
+    log segments) are dropped, so the state doesn't grow without bound.
+    
+    Args:
+        state (dict): State as returned by load_sync_state
+    """
+    state = {key: entry for key, entry in state.items()
+             if 'local' not in entry or os.path.exists(entry['local'])}
+    try:
+        SMB_SYNC_STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = SMB_SYNC_STATE_FILE.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, SMB_SYNC_STATE_FILE)
+    except Exception as e:
+        logger.warning(f"Failed to save sync state: {str(e)}")
+
+
+def _hash_prefix(path, length, chunk_size=1024 * 1024, paced=False):
+    """Get a SHA-256 hash object over the first bytes of a file (paced for remote files)"""
+    digest = hashlib.sha256()
+    remaining = length
+    with open(path, 'rb') as f:
+        while remaining > 0:
+            if paced:
+                pace(min(chunk_size, remaining))
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest
+
+
+def prefix_digest(path, length, paced=False):
+    """
+    Get the SHA-256 of the first bytes of a file
+    
+    Args:
+        path (Path): File to hash
+        length (int): Number of leading bytes to hash
+        paced (bool): Rate-limit the reads (for files on the share)
+    
+    Returns:
+        str: Hex digest
+    """
+    return _hash_prefix(path, length, paced=paced).hexdigest()
+
+
+def local_digest(local_file, file_stat, entry=None):
+    """
+    Get the SHA-256 of a local file, reusing the hash from the sync state
+    
+    A file with the size and mtime recorded at the last sync is not re-read.
+    
+    Args:
+        local_file (Path): Local file
+        file_stat (os.stat_result): Its current stat
+        entry (dict): Sync state entry for the file, if any
+    
+    Returns:
+        str: Hex digest of the first file_stat.st_size bytes
+    """
+    if entry and entry.get('offset') == file_stat.st_size and entry.get('mtime_ns') == file_stat.st_mtime_ns:
+        return entry['sha256']
+    return prefix_digest(local_file, file_stat.st_size)
+
+
+def _remote_size(remote_file):
+    """Get the size of a remote file, or None if it doesn't exist"""
+    try:
+        return remote_file.stat().st_size
+    except OSError:
+        return None
+
+
+def append_remote_file(dest_file, data):
     """
-    Sync data files to SMB share
+    Append bytes to a remote file
+    
+    Args:
+        dest_file (Path): Remote file
+        data (bytes): Bytes to append
     
     Returns:
         bool: True if successful, False otherwise
+    
+    Raises:
+        PermissionError: If the share refuses the write (see run_privileged_batch)
     """
     try:
-        # Check if SMB is accessible
-        smb_ok, access_type = check_smb_mount()
-        if not smb_ok:
-            logger.warning(f"SMB share not accessible ({access_type}) - skipping sync")
-            return False
-        
-        logger.info(f"SMB access type: {access_type}")
-        
-        # Copy CSV file
-        if CSV_FILE.exists():
-            if copy_file_with_sudo(CSV_FILE, SMB_BACKUP_CSV):
-                logger.info(f"Successfully synced CSV to SMB: {SMB_BACKUP_CSV}")
-            else:
-                logger.error("Failed to sync CSV to SMB")
-                return False
-        else:
-            logger.warning("Local CSV file does not exist - nothing to sync")
-        
-        # Copy log file (optional, don't fail if this doesn't work)
-        if LOG_FILE.exists():
-            if copy_file_with_sudo(LOG_FILE, SMB_BACKUP_LOG):
-                logger.info(f"Successfully synced log to SMB: {SMB_BACKUP_LOG}")
-            else:
-                logger.warning("Failed to sync log to SMB (continuing anyway)")
-        
-        logger.info("SMB sync completed successfully")
+        with open(dest_file, 'ab') as f:
+            view = memoryview(data)
+            for start in range(0, len(view), 1024 * 1024):
+                chunk = view[start:start + 1024 * 1024]
+                pace(len(chunk))
+                f.write(chunk)
         return True
-        
+    except PermissionError:
+        raise
     except Exception as e:
-        logger.error(f"SMB sync failed: {str(e)}")
+        logger.error(f"Append to {dest_file} failed: {str(e)}")
         return False
 
 
-def get_smb_status():
+def write_remote_atomic(src_file, dest_file, size):
     """
-    Get detailed status of SMB mount
+    Copy a file to the share via a temporary name, verify it and rename it into place
+    
+    Readers of dest_file (e.g. the web UI) see either the old or the new
+    content, never a partial copy left by a dropped mount.
+    
+    Args:
+        src_file (Path): Local file
+        dest_file (Path): Remote file to replace
+        size (int): Number of leading bytes of src_file to copy
     
     Returns:
-        dict: Status information about the SMB mount
+        str or None: SHA-256 of the copied bytes, or None if the copy failed
+    
+    Raises:
+        PermissionError: If the share refuses the write (see run_privileged_batch)
     """
-    status = {
-        'mount_exists': SMB_MOUNT_PATH.exists(),
-        'is_mounted': False,
-        'is_writable': False,
-        'speedtest_dir_exists': SMB_SPEEDTEST_DIR.exists() if SMB_MOUNT_PATH.exists() else False,
-        'free_space': None,
-        'files_count': None
-    }
+    # Unique per process and thread, so concurrent copies never share a temporary file
+    tmp_file = dest_file.with_name(f".{dest_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    digest = hashlib.sha256()
     
     try:
-        if status['mount_exists']:
-            status['is_mounted'] = SMB_MOUNT_PATH.is_mount()
-            
-            # Test write access in speedtest directory
-            if status['speedtest_dir_exists'] or create_smb_speedtest_dir():
-                status['speedtest_dir_exists'] = True
-                test_file = SMB_SPEEDTEST_DIR / ".speedtest_write_test"
-                try:
-                    test_file.write_text("test")
-                    test_file.unlink()
-                    status['is_writable'] = True
-                except:
-                    status['is_writable'] = False
-            
-            # Get free space
-            try:
-                statvfs = os.statvfs(SMB_MOUNT_PATH)
-                status['free_space'] = statvfs.f_frsize * statvfs.f_bavail
-            except:
-                pass
-            
-            # Count files in speedtest directory
-            try:
-                if status['speedtest_dir_exists']:
-                    status['files_count'] = len(list(SMB_SPEEDTEST_DIR.iterdir()))
+        with open(src_file, 'rb') as src, open(tmp_file, 'wb') as dest:
+            remaining = size
+            while remaining > 0:
+                chunk = src.read(min(1024 * 1024, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                pace(len(chunk))
+                dest.write(chunk)
+                remaining -= len(chunk)
+            dest.flush()
+            os.fsync(dest.fileno())
+    
+        # Read the copy back and only rename it into place if it is intact
+        if _remote_size(tmp_file) != size or prefix_digest(tmp_file, size, paced=True) != digest.hexdigest():
+            logger.error(f"Checksum mismatch after copying to {tmp_file}")
+            remove_remote_file(tmp_file)
+            return None
+    
+        os.replace(tmp_file, dest_file)
+        logger.info(f"Copied and verified: {dest_file}")
+        return digest.hexdigest()
+    
+    except PermissionError:
+        remove_remote_file(tmp_file)
+        raise
+    except Exception as e:
+        logger.error(f"Copy to {dest_file} failed: {str(e)}")
+        remove_remote_file(tmp_file)
+        return None
+
+
+def run_privileged_batch(target_dir, jobs, timeout=PRIVILEGED_SYNC_TIMEOUT_SECONDS):
+    """
+    Perform all writes the share refused in a single non-interactive sudo call
+    
+    Each job is a copy (to a temporary name, checked with sha256sum, then
+    moved into place) or an append of the bytes between two offsets. The
+    target directory is then chowned to the current user once, so the next
+    run can usually write directly again. ``sudo -n`` fails instead of
+    prompting, and the call is abandoned after the timeout.
+    
+    Args:
+        target_dir (Path): Target directory, chowned after the writes
+        jobs (list): Dicts with 'mode' ('copy' or 'append'), 'local' and
+            'remote' paths, 'offset', 'size' and, for copies, 'sha256'
+        timeout (float): Seconds to wait for sudo
+    
+    Returns:
+        tuple: (set of remote paths written, ownership_fixed: bool)
+    """
+    args = []
+    for job in jobs:
+        args += [job['mode'], str(job['local']), str(job['remote']),
+                 str(job['offset']), str(job['size']), job.get('sha256') or '-']
+    
+    cmd = ['sudo', '-n', 'sh', '-c', PRIVILEGED_SYNC_SCRIPT, 'speedtest-sync',
+           f'{os.getuid()}:{os.getgid()}', str(target_dir)] + args
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        logger.error(f"Privileged sync to {target_dir} timed out after {timeout}s")
+        return set(), False
+    except Exception as e:
+        logger.error(f"Privileged sync to {target_dir} failed: {str(e)}")
+        return set(), False
+    
+    if result.stderr:
+        logger.warning(f"Privileged sync to {target_dir}: {result.stderr.strip()}")
+    
+    written = set()
+    ownership_fixed = False
+    for line in result.stdout.splitlines():
+        if line.startswith('ok '):
+            written.add(line[3:])
+        elif line == 'owner-fixed':
+            ownership_fixed = True
+    
+    logger.info(f"Privileged sync wrote {len(written)} of {len(jobs)} file(s) to {target_dir} "
+                f"in one sudo call (ownership {'fixed' if ownership_fixed else 'unchanged'})")
+    return written, ownership_fixed
+
+
+def sync_file(local_file, remote_file, state, privileged=None):
+    """
+    Bring a remote copy up to date, sending only what changed
+    
+    The state records how many bytes of the local file were last synced, their
+    SHA-256 (verified on the share when written) and the local mtime. The sync
+    is skipped when the local content hash still matches and the remote copy
+    is still that size; if the local file only grew, the new tail is appended.
+    Otherwise (rewritten, truncated or rotated file, or a changed remote copy)
+    the whole file is copied atomically. Without a state entry, a remote copy
+    of the same size is hashed once to avoid recopying identical content.
+    
+    Args:
+        local_file (Path): Local file
+        remote_file (Path): Remote copy
+        state (dict): Sync state from load_sync_state, updated in place
+        privileged (list): If given, a write the share refuses is added to
+            this list as a run_privileged_batch job (and 0 is returned)
+            instead of failing
+    
+    Returns:
+        int or None: Bytes transferred, or None if the sync failed
+    """
+    key = str(remote_file)
+    local_stat = local_file.stat()
+    size = local_stat.st_size
+    entry = state.get(key)
+    remote_size = _remote_size(remote_file)
+    
+    try:
+        if entry and remote_size == entry['offset'] and size >= entry['offset']:
+            if size == entry['offset']:
+                if local_digest(local_file, local_stat, entry) == entry['sha256']:
+                    entry['mtime_ns'] = local_stat.st_mtime_ns
+                    entry['local'] = str(local_file)
+                    logger.debug(f"Already up to date on SMB: {remote_file}")
+                    return 0
+                logger.info(f"Content changed, copying whole file: {remote_file}")
+            else:
+                prefix = _hash_prefix(local_file, entry['offset'])
+                if prefix.hexdigest() == entry['sha256']:
+                    with open(local_file, 'rb') as f:
+                        f.seek(entry['offset'])
+                        data = f.read(size - entry['offset'])
+                    prefix.update(data)
+                    job = {'mode': 'append', 'local': local_file, 'remote': remote_file,
+                           'offset': entry['offset'], 'size': size, 'key': key,
+                           'state': {'offset': size, 'sha256': prefix.hexdigest(),
+                                     'mtime_ns': local_stat.st_mtime_ns, 'local': str(local_file)}}
+                    try:
+                        appended = append_remote_file(remote_file, data)
+                    except PermissionError:
+                        if privileged is None:
+                            raise
+                        privileged.append(job)
+                        return 0
+                    if appended and _remote_size(remote_file) == size:
+                        state[key] = job['state']
+                        logger.info(f"Appended {len(data)} bytes to SMB copy: {remote_file}")
+                        return len(data)
+                    logger.warning(f"Append failed, copying whole file: {remote_file}")
                 else:
-                    status['files_count'] = 0
-            except:
-                status['files_count'] = 0
+                    logger.info(f"Synced prefix changed, copying whole file: {remote_file}")
+        elif entry is None and remote_size == size:
+            digest = local_digest(local_file, local_stat)
+            if prefix_digest(remote_file, size, paced=True) == digest:
+                state[key] = {'offset': size, 'sha256': digest, 'mtime_ns': local_stat.st_mtime_ns,
+                              'local': str(local_file)}
+                logger.debug(f"Identical copy already on SMB: {remote_file}")
+                return 0
+    
+        state.pop(key, None)
+        try:
+            digest = write_remote_atomic(local_file, remote_file, size)
+        except PermissionError:
+            if privileged is None:
+                raise
+            digest = prefix_digest(local_file, size)
+            privileged.append({'mode': 'copy', 'local': local_file, 'remote': remote_file,
+                               'offset': 0, 'size': size, 'sha256': digest, 'key': key,
+                               'state': {'offset': size, 'sha256': digest,
+                                         'mtime_ns': local_stat.st_mtime_ns, 'local': str(local_file)}})
+            return 0
+        if digest is None:
+            return None
+    
+        state[key] = {'offset': size, 'sha256': digest, 'mtime_ns': local_stat.st_mtime_ns,
+                      'local': str(local_file)}
+        return size
+    
+    except PermissionError as e:
+        logger.error(f"Permission denied writing {remote_file}: {str(e)}")
+        return None
+
+
+def check_target(target_dir):
+    """
+    Check that a replication target can be written to
+    
+    The SMB share uses the cached health probe; other targets (a second
+    share, a USB disk) must have an existing parent directory, so an
+    unmounted mount point is not silently filled on the root filesystem.
+    
+    Args:
+        target_dir (Path): Target directory
+    
+    Returns:
+        tuple: (success: bool, access_type: str)
+    """
+    if target_dir == SMB_SPEEDTEST_DIR:
+        return check_smb_mount()
+    if not target_dir.parent.exists():
+        logger.error(f"Replication target parent does not exist: {target_dir.parent}")
+        return False, "path_not_exists"
+    if not ensure_remote_dir(target_dir):
+        return False, "dir_creation_failed"
+    return True, "direct_access" if os.access(target_dir, os.W_OK) else "sudo_required"
+
+
+def sync_target(target_dir, history_files, state):
+    """
+    Sync the history files and log to this host's shard on one replication target
+    
+    Files go under hosts/<SITE_ID>/ in the target, so monitors sharing a
+    target don't overwrite each other. They are written directly where
+    possible; whatever the share refuses is written afterwards by a single
+    run_privileged_batch call.
+    
+    Args:
+        target_dir (Path): Target directory
+        history_files (list): (local_path, remote_name) tuples from backup_files()
+        state (dict): Sync state entries for this target, updated in place
+    
+    Returns:
+        dict: 'ok', 'access_type', 'bytes' transferred, 'files' synced,
+        'error', 'ownership_fixed' (whether a privileged sync chowned the
+        target) and 'duration' in seconds
+    """
+    started = time.monotonic()
+    result = {'ok': False, 'access_type': None, 'bytes': 0, 'files': 0, 'error': None,
+              'ownership_fixed': False}
+    privileged = []
+    
+    try:
+        ok, result['access_type'] = check_target(target_dir)
+        if not ok:
+            logger.warning(f"Replication target not accessible ({result['access_type']}): {target_dir}")
+            result['error'] = f"not accessible: {result['access_type']}"
+            return result
+    
+        shard_dir = target_dir / HOST_SHARD_DIR
+        synced_archives = []
+        for local_file, remote_name in history_files:
+            remote_file = shard_dir / remote_name
+    
+            transferred = sync_file(local_file, remote_file, state, privileged) if ensure_remote_dir(remote_file.parent) else None
+            if transferred is None:
+                result['error'] = f"failed to sync {local_file.name}"
+                break
+    
+            result['bytes'] += transferred
+            if transferred:
+                result['files'] += 1
+                logger.info(f"Successfully synced history to {remote_file}")
+                if is_archive(local_file):
+                    synced_archives.append(remote_file)
+    
+        # Copy the log: sealed segments the target doesn't have yet, then the
+        # active log (optional, don't fail if this doesn't work)
+        log_files = log_backup_files(LOG_FILE, LOG_SEGMENT_DIR) if result['error'] is None else []
+        for local_log, remote_name in log_files:
+            remote_log = shard_dir / remote_name
+            queued = len(privileged)
+            try:
+                transferred = sync_file(local_log, remote_log, state, privileged) if ensure_remote_dir(remote_log.parent) else None
+            except FileNotFoundError:
+                # Sealed or pruned by another process since it was listed
+                continue
+            for job in privileged[queued:]:
+                job['optional'] = True
+            if transferred is None:
+                logger.warning(f"Failed to sync log to {remote_log} (continuing anyway)")
+            elif transferred:
+                result['bytes'] += transferred
+                result['files'] += 1
+                logger.info(f"Successfully synced log to {remote_log}")
+    
+        if privileged:
+            written, result['ownership_fixed'] = run_privileged_batch(shard_dir, privileged)
+            for job in privileged:
+                if str(job['remote']) in written and _remote_size(job['remote']) == job['size']:
+                    state[job['key']] = job['state']
+                    result['bytes'] += job['size'] - job['offset']
+                    result['files'] += 1
+                    if is_archive(job['local']):
+                        synced_archives.append(job['remote'])
+                elif job.get('optional'):
+                    logger.warning(f"Failed to sync log to {job['remote']} (continuing anyway)")
+                elif result['error'] is None:
+                    result['error'] = f"failed to sync {job['local'].name} with sudo"
+    
+            # Direct writes should work again after the chown, so don't keep
+            # reporting the share as needing sudo until the cache expires
+            if result['ownership_fixed'] and target_dir == SMB_SPEEDTEST_DIR:
+                get_smb_health(force=True)
+    
+        for remote_file in synced_archives:
+            remove_remote_file(remote_file.with_suffix(''))
+    
+        if result['error'] is not None:
+            logger.error(f"Sync to {target_dir} failed: {result['error']}")
+            if target_dir == SMB_SPEEDTEST_DIR:
+                record_smb_failure(result['error'])
+        else:
+            result['ok'] = True
     
     except Exception as e:
-        logger.debug(f"Error getting SMB status: {str(e)}")
+        logger.error(f"Sync to {target_dir} failed: {str(e)}")
+        result['error'] = str(e)
+    
+    finally:
+        result['duration'] = round(time.monotonic() - started, 3)
+    
+    return result
+
+
+def _run_target(target, history_files, target_state, finished):
+    """Thread body for one replication target; frees the target when done"""
+    try:
+        finished[target] = sync_target(target, history_files, target_state)
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(target, None)
+
+
+def replicate(targets=None, timeout=REPLICATION_TIMEOUT_SECONDS):
+    """
+    Sync to all replication targets concurrently
+    
+    Each target runs in its own daemon thread; targets still running after
+    the timeout are reported as timed out and abandoned (they don't keep the
+    process alive at exit), so one slow or hung mount does not hold up the
+    others. Until an abandoned sync finishes its target is skipped, rather
+    than piling another thread onto the hung mount. The sync first
+    waits for a running speed test to finish, and all transfers share the
+    sync rate limit (see sync_throttle); the time spent waiting on either is
+    added to every target's result as 'deferred_seconds' and
+    'throttled_seconds'.
     
-    return status
\ No newline at end of file
+    Args:
+        targets (list): Target directories (default: REPLICATION_TARGETS)
+        timeout (float): Seconds to wait for the targets
+    
+    Returns:
+        dict: Target path -> result dict (see sync_target)
+    """
+    targets = [Path(target) for target in (targets or REPLICATION_TARGETS)]
+    reset_stats()
+    wait_for_measurement()
+    history_files = get_storage().backup_files()
+    if not history_files:
+        logger.warning("No local history files exist - nothing to sync")
+    
+    # Each target gets its own slice of the sync state, so a thread that is
+    # still running after the timeout can't change what gets saved
+    state = load_sync_state()
+    target_states = {}
+    for target in targets:
+        prefix = f"{target}{os.sep}"
+        target_states[target] = {key: entry for key, entry in state.items() if key.startswith(prefix)}
+    
+    threads = {}
+    finished = {}
+    with _in_flight_lock:
+        for target in targets:
+            if target in _in_flight:
+                continue
+            thread = threading.Thread(target=_run_target, name=f"replicate-{len(threads)}", daemon=True,
+                                      args=(target, history_files, target_states[target], finished))
+            _in_flight[target] = thread
+            threads[target] = thread
+            thread.start()
+    
+    deadline = time.monotonic() + timeout
+    for thread in threads.values():
+        thread.join(max(0, deadline - time.monotonic()))
+    
+    results = {}
+    for target in targets:
+        thread = threads.get(target)
+        if thread is None:
+            logger.warning(f"Skipping {target}: a previous sync to it is still running")
+            results[str(target)] = {
+                'ok': False, 'access_type': None, 'bytes': 0, 'files': 0,
+                'error': "previous sync still running", 'duration': 0
+            }
+        elif target in finished:
+            results[str(target)] = finished[target]
+            prefix = f"{target}{os.sep}"
+            for key in [key for key in state if key.startswith(prefix)]:
+                del state[key]
+            state.update(target_states[target])
+        else:
+            logger.error(f"Sync to {target} timed out after {timeout}s")
+            results[str(target)] = {
+                'ok': False, 'access_type': None, 'bytes': 0, 'files': 0,
+                'error': f"timed out after {timeout}s", 'duration': timeout
+            }
+    
+    pacing = get_stats()
+    for result in results.values():
+        result.update(pacing)
+    
+    save_sync_state(state)
+    save_replication_status(results)
+    
+    for target, result in results.items():
+        outcome = 'ok' if result['ok'] else f"failed ({result['error']})"
+        logger.info(f"Replication to {target}: {outcome}, {result['bytes']} bytes in {result['duration']}s")
+    if pacing['deferred_seconds'] or pacing['throttled_seconds']:
+        logger.info(f"Sync deferred {pacing['deferred_seconds']}s for speed tests, "
+                    f"throttled {pacing['throttled_seconds']}s by the rate limit")
+    
+    return results
+
+
+def save_replication_status(results):
+    """
+    Record the latest result of each replication target
+    
+    Args:
+        results (dict): Target path -> result dict, as returned by replicate
+    """
+    try:
+        status = get_replication_status()
+        now = time.time()
+        for target, result in results.items():
+            previous = status.get(target, {})
+            status[target] = dict(result, checked_at=now)
+            last_success = now if result['ok'] else previous.get('last_success')
+            if last_success:
+                status[target]['last_success'] = last_success
+    
+        REPLICATION_STATUS_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = REPLICATION_STATUS_FILE.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(status, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, REPLICATION_STATUS_FILE)
+    except Exception as e:
+        logger.warning(f"Failed to save replication status: {str(e)}")
+
+
+def get_replication_status():
+    """
+    Get the latest result of each replication target
+    
+    Returns:
+        dict: Target path -> result dict with 'checked_at' (and 'last_success'
+        once the target has synced), empty if nothing has been synced yet
+    """
+    try:
+        with open(REPLICATION_STATUS_FILE, 'r') as f:
+            status = json.load(f)
+        return status if isinstance(status, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.debug(f"Ignoring unreadable replication status: {str(e)}")
+        return {}
+
+
+def sync_to_smb():
+    """
+    Sync data files to the SMB share and any other replication targets
+    
+    Returns:
+        bool: True if every target synced successfully, False otherwise
+    """
+    try:
+        results = replicate()
+        if all(result['ok'] for result in results.values()):
+            logger.info(f"Sync completed successfully ({sum(r['bytes'] for r in results.values())} bytes transferred)")
+            return True
+    
+        failed = [target for target, result in results.items() if not result['ok']]
+        logger.warning(f"Sync failed for {len(failed)} of {len(results)} target(s): {', '.join(failed)}")
+        return False
+    
+    except Exception as e:
+        logger.error(f"SMB sync failed: {str(e)}")
+        return False
+
+
+def get_smb_status():
+    """
+    Get detailed status of SMB mount
+    
+    Returns:
+        dict: Status information about the SMB mount, from the cached health
+        probe (probed again only when stale)
+    """
+    health = get_smb_health()
+    return {key: health[key] for key in (
+        'mount_exists', 'is_mounted', 'is_writable', 'speedtest_dir_exists',
+        'free_space', 'files_count', 'total_size', 'files_truncated'
+    )}
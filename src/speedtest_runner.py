@@ -8,6 +8,9 @@ import traceback
 import sys
 from logging_config import get_logger
 from csv_handler import save_failure_to_csv
+from records import SpeedRecord
+from server_cache import CachedSpeedtest, refresh_in_background, invalidate_cache
+from server_selection import select_server, clear_sticky
 
 logger = get_logger(__name__)
 
@@ -17,37 +20,29 @@ def run_speed_test():
     Run internet speed test and return results
     
     Returns:
-        dict or None: Speed test results dictionary if successful, None if failed
+        SpeedRecord or None: Speed test result if successful, None if failed
     """
     try:
         logger.info("Starting speed test...")
         
-        # Initialize speedtest client
-        logger.info("Initializing Speedtest client...")
-        st = speedtest.Speedtest()
-        
-        # Get configuration and server list
-        logger.info("Retrieving speedtest configuration...")
-        try:
-            config = st.get_config()
-            logger.info("Speedtest config retrieved successfully")
-            logger.debug(f"Client config: {config.get('client', {})}")
-        except Exception as e:
-            error_msg = str(e)
-            error_type = type(e).__name__
-            full_traceback = traceback.format_exc()
-            logger.error(f"Failed to get config: {error_msg}")
-            logger.error(f"Error type: {error_type}")
-            logger.error(f"Full traceback: {full_traceback}")
-            print(f"SPEEDTEST ERROR - Config retrieval failed ({error_type}): {error_msg}", file=sys.stderr)
-            save_failure_to_csv("ConfigError", error_msg, "get_config")
-            raise
+        # Initialize speedtest client; constructing it retrieves the config
+        # (config and server list come from the on-disk cache when available).
+        # Calling get_config() again would repeat the retrieval, and count a
+        # cache hit for the config that was just fetched.
+        logger.info("Initializing Speedtest client and retrieving configuration...")
+        st = CachedSpeedtest()
+        config = st.config
+        logger.info("Speedtest config retrieved successfully")
+        logger.debug(f"Client config: {config.get('client', {})}")
         
         # Get server list and find best server
         logger.info("Getting server list and finding best server...")
         try:
             servers = st.get_servers()
             logger.info(f"Found {len(servers)} total servers")
+            if st.cache_hits:
+                logger.info(f"Speedtest {' and '.join(st.cache_hits)} from cache "
+                            f"(saved {st.saved_seconds:.2f}s)")
         except Exception as e:
             error_msg = str(e)
             error_type = type(e).__name__
@@ -60,7 +55,8 @@ def run_speed_test():
             raise
         
         try:
-            best_server = st.get_best_server()
+            # Reuses the last selected server while its latency holds up
+            best_server = select_server(st)
             logger.info(f"Best server selected: {best_server['sponsor']} in {best_server['name']}, {best_server['country']}")
             logger.info(f"Server ID: {best_server['id']}, Distance: {best_server.get('d', 'unknown')} km")
             logger.info(f"Server URL: {best_server['url']}")
@@ -73,6 +69,10 @@ def run_speed_test():
             logger.error(f"Full traceback: {full_traceback}")
             print(f"SPEEDTEST ERROR - Best server selection failed ({error_type}): {error_msg}", file=sys.stderr)
             save_failure_to_csv("BestServerError", error_msg, "get_best_server")
+            # The cached server list may be outdated
+            clear_sticky()
+            if st.cache_hits:
+                invalidate_cache()
             raise
         
         # Run download test
@@ -114,21 +114,26 @@ def run_speed_test():
         server = st.results.server
         
         # Compile results
-        result = {
-            'timestamp': datetime.datetime.now().isoformat(),
-            'download_mbps': round(download_speed, 2),
-            'upload_mbps': round(upload_speed, 2),
-            'ping_ms': round(ping, 2),
-            'server_name': server['name'],
-            'server_country': server['country'],
-            'server_sponsor': server['sponsor'],
-            'status': 'SUCCESS',
-            'error_type': None,
-            'error_details': None
-        }
+        now = datetime.datetime.now()
+        result = SpeedRecord(
+            timestamp=now.isoformat(),
+            epoch=now.timestamp(),
+            download_mbps=round(download_speed, 2),
+            upload_mbps=round(upload_speed, 2),
+            ping_ms=round(ping, 2),
+            server_name=server['name'],
+            server_country=server['country'],
+            server_sponsor=server['sponsor'],
+            status='SUCCESS',
+            error_type=None,
+            error_details=None
+        )
+        
+        logger.info(f"Speed test completed successfully: {result.download_mbps} Mbps down, "
+                   f"{result.upload_mbps} Mbps up, {result.ping_ms} ms ping")
         
-        logger.info(f"Speed test completed successfully: {result['download_mbps']} Mbps down, "
-                   f"{result['upload_mbps']} Mbps up, {result['ping_ms']} ms ping")
+        # Measurement is done - refresh a stale server cache for the next run
+        refresh_in_background()
         
         return result
         
@@ -154,6 +159,7 @@ def run_speed_test():
         print(f"SPEEDTEST ERROR - NoMatchedServers: {error_msg}", file=sys.stderr)
         print(f"Full traceback: {full_traceback}", file=sys.stderr)
         save_failure_to_csv("NoMatchedServers", error_msg, "server_selection")
+        invalidate_cache()
         return None
         
     except speedtest.SpeedtestHTTPError as e:
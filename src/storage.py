@@ -0,0 +1,1400 @@
+"""
+Pluggable storage backends for the Speedtest Monitor history
+
+Two backends implement the same small interface:
+
+- ``CSVStorage``: time-partitioned CSV files with a manifest of per-partition
+  counters, plus per-partition sidecars (the timestamp index from
+  ``csv_index`` and hourly/daily rollups from ``rollups``)
+- ``SQLiteStorage``: a WAL-mode SQLite database with typed columns and indexes
+  on timestamp, status and error_type, so range queries, counts and group-bys
+  run in the database, with rollup tables upserted on insert. The CSV is kept
+  as an incrementally maintained export so the SMB backup format is unchanged.
+
+The backend is selected with ``STORAGE_BACKEND`` in config (environment
+variable ``SPEEDTEST_STORAGE``), and ``get_storage()`` returns the shared
+instance used by csv_handler, smb_sync and the web UI.
+"""
+
+import io
+import csv
+import gzip
+import json
+import lzma
+import sqlite3
+import datetime
+import threading
+from contextlib import closing
+from config import (
+    CSV_FILE, CSV_FIELDNAMES, DB_FILE, HISTORY_DIR, HISTORY_PARTITION,
+    ARCHIVE_COMPRESSION, STORAGE_BACKEND
+)
+from logging_config import get_logger
+from csv_index import (
+    ensure_index, find_end, find_offset, index_path_for, index_is_sorted,
+    iter_records, iter_records_reverse, unsorted_marker_for
+)
+from records import SpeedRecord, as_record, column_positions
+from rollups import (
+    METRICS, add_row, add_to_rollups, bucket_keys, bucket_series, bucket_statistics,
+    empty_bucket, merge_bucket, merge_window, window_boundaries
+)
+
+logger = get_logger(__name__)
+
+# Bytes before a remembered offset that must still match for an append-only
+# read to be trusted (catches files rewritten in place)
+SIGNATURE_BYTES = 256
+
+# Shorter signature stored per partition in the manifest
+COUNTERS_SIGNATURE_BYTES = 32
+
+
+def _metric_summary(values):
+    """Summarise a list of numbers as rounded avg/min/max"""
+    return {
+        'avg': round(sum(values) / len(values), 2),
+        'min': round(min(values), 2),
+        'max': round(max(values), 2)
+    }
+
+
+def calculate_statistics(data):
+    """Calculate summary statistics from SpeedRecords"""
+    if not data:
+        return {}
+
+    successful_tests = [record for record in data if not record.failed]
+    failed_count = len(data) - len(successful_tests)
+
+    stats = {
+        'total_tests': len(data),
+        'successful_tests': len(successful_tests),
+        'failed_tests': failed_count,
+        'success_rate': round((len(successful_tests) / len(data)) * 100, 1)
+    }
+
+    for key, column in METRICS:
+        values = [value for value in (getattr(record, column) for record in successful_tests)
+                  if value is not None]
+        if values:
+            stats[key] = _metric_summary(values)
+
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# Compressed archives
+# ---------------------------------------------------------------------------
+
+# Stdlib codecs for archived partitions, keyed by ARCHIVE_COMPRESSION value
+ARCHIVE_CODECS = {
+    'gzip': ('.gz', gzip),
+    'xz': ('.xz', lzma)
+}
+
+
+def is_archive(path):
+    """Check whether a history file is a compressed archive"""
+    return any(path.name.endswith(suffix) for suffix, _ in ARCHIVE_CODECS.values())
+
+
+def open_history_file(path):
+    """Open a history file for binary reading, decompressing archives"""
+    for suffix, codec in ARCHIVE_CODECS.values():
+        if path.name.endswith(suffix):
+            return codec.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def compress_file(path, compression=ARCHIVE_COMPRESSION):
+    """
+    Compress a file next to itself and remove the original
+
+    The archive is written to a temporary name, read back and compared with
+    the original before it replaces anything.
+
+    Args:
+        path (Path): File to compress
+        compression (str): 'gzip' or 'xz'
+
+    Returns:
+        Path: The archive path
+    """
+    suffix, codec = ARCHIVE_CODECS[compression]
+    archive_path = path.with_name(path.name + suffix)
+    tmp_path = archive_path.with_name(archive_path.name + '.tmp')
+
+    raw = path.read_bytes()
+    with codec.open(tmp_path, 'wb') as archive:
+        archive.write(raw)
+    with codec.open(tmp_path, 'rb') as archive:
+        if archive.read() != raw:
+            tmp_path.unlink()
+            raise IOError(f"Archive verification failed for {path}")
+
+    tmp_path.replace(archive_path)
+    path.unlink()
+    return archive_path
+
+
+def decompress_file(archive_path):
+    """
+    Restore an archive to the uncompressed file and remove the archive
+
+    Returns:
+        Path: The uncompressed path
+    """
+    path = archive_path.with_name(archive_path.name.rsplit('.', 1)[0])
+    with open_history_file(archive_path) as archive:
+        path.write_bytes(archive.read())
+    archive_path.unlink()
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Parsed CSV cache
+# ---------------------------------------------------------------------------
+
+# Process-wide cache of parsed CSV histories, keyed by path and shared by all
+# threads. Each entry remembers how far into the file it has parsed (byte
+# offset plus inode), so when a test appends a row only the appended bytes are
+# parsed. A full reload happens only when the file is truncated or replaced,
+# e.g. by update_csv_zeros.py or the SMB copy rewriting it in place.
+_cache_lock = threading.Lock()
+_cache_entries = {}
+_cache_counters = {'hits': 0, 'misses': 0, 'tail_reads': 0}
+
+
+def _parse_csv_bytes(raw, fieldnames=None):
+    """
+    Parse complete CSV records from raw bytes into SpeedRecords
+
+    The first record is taken as the header unless fieldnames are given.
+
+    Returns:
+        tuple: (fieldnames: list, records: list)
+    """
+    reader = csv.reader(io.StringIO(raw.decode('utf-8'), newline=''))
+    if fieldnames is None:
+        fieldnames = next(reader, [])
+    positions = column_positions(fieldnames)
+    return fieldnames, [SpeedRecord.from_csv_row(values, positions) for values in reader if values]
+
+
+def _full_reload(csv_path, file_stat):
+    """Parse the whole file (decompressing archives) into a fresh cache entry"""
+    with open_history_file(csv_path) as file:
+        raw = file.read()
+
+    # Only consume complete lines; a partially written row is picked up later
+    offset = raw.rfind(b'\n') + 1
+    fieldnames, rows = _parse_csv_bytes(raw[:offset])
+
+    _cache_counters['misses'] += 1
+    return {
+        'inode': file_stat.st_ino,
+        'offset': offset,
+        'mtime_ns': file_stat.st_mtime_ns,
+        'size': file_stat.st_size,
+        'signature': raw[max(0, offset - SIGNATURE_BYTES):offset],
+        'fieldnames': fieldnames,
+        'rows': rows
+    }
+
+
+def _ingest_tail(csv_path, entry, file_stat):
+    """
+    Parse only the bytes appended since the entry was last updated
+
+    Returns:
+        bool: True if the tail was ingested, False if a full reload is needed
+    """
+    offset = entry['offset']
+    signature = entry['signature']
+
+    with open(csv_path, 'rb') as file:
+        file.seek(offset - len(signature))
+        if file.read(len(signature)) != signature:
+            return False
+        appended = file.read()
+
+    end = appended.rfind(b'\n') + 1
+    if end:
+        fieldnames, new_rows = _parse_csv_bytes(appended[:end], entry['fieldnames'])
+        entry['fieldnames'] = fieldnames
+        # Build a new list so callers holding the previous one are unaffected
+        entry['rows'] = entry['rows'] + new_rows
+        entry['offset'] = offset + end
+        entry['signature'] = (signature + appended[:end])[-SIGNATURE_BYTES:]
+
+    entry['mtime_ns'] = file_stat.st_mtime_ns
+    entry['size'] = file_stat.st_size
+    _cache_counters['tail_reads'] += 1
+    return True
+
+
+def read_csv_cached(csv_path):
+    """
+    Return the parsed rows of a CSV file, parsing only what changed
+
+    Compressed archives are immutable, so they are only ever parsed whole.
+    The returned list of SpeedRecords is shared between callers and must not
+    be modified.
+    """
+    with _cache_lock:
+        file_stat = csv_path.stat()
+        entry = _cache_entries.get(str(csv_path))
+        same_file = entry is not None and entry['inode'] == file_stat.st_ino
+
+        if (same_file and
+                entry['mtime_ns'] == file_stat.st_mtime_ns and
+                entry['size'] == file_stat.st_size):
+            _cache_counters['hits'] += 1
+        elif not (same_file and
+                  not is_archive(csv_path) and
+                  file_stat.st_size >= entry['offset'] and
+                  _ingest_tail(csv_path, entry, file_stat)):
+            entry = _full_reload(csv_path, file_stat)
+            _cache_entries[str(csv_path)] = entry
+
+        return entry['rows']
+
+
+def read_csv_window(csv_path, cutoff_time, until=None):
+    """
+    Read only the rows at or after cutoff_time using the timestamp index
+
+    Args:
+        csv_path (Path): Indexed CSV file
+        cutoff_time (datetime): Window start
+        until (datetime): Optional window end (exclusive)
+
+    Returns:
+        list or None: Parsed rows, or None if the index is unavailable
+    """
+    offset = find_offset(csv_path, cutoff_time.timestamp())
+    end = find_offset(csv_path, until.timestamp()) if until and offset is not None else -1
+    if offset is None or end is None:
+        return None
+
+    with open(csv_path, 'rb') as file:
+        header = next(iter_records(file), (0, b''))[1]
+        start = max(offset, len(header))
+        file.seek(start)
+        raw = file.read(max(0, end - start)) if until else file.read()
+
+    fieldnames, _ = _parse_csv_bytes(header)
+    _, rows = _parse_csv_bytes(raw[:raw.rfind(b'\n') + 1], fieldnames)
+    return rows
+
+
+def get_cache_stats():
+    """Get hit/miss counters for the parsed-data cache"""
+    with _cache_lock:
+        stats = dict(_cache_counters)
+        stats['cached_files'] = len(_cache_entries)
+        stats['cached_rows'] = sum(len(entry['rows']) for entry in _cache_entries.values())
+        return stats
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+def _empty_counters():
+    """Counters for an empty partition"""
+    return {
+        'size': 0,
+        'signature': '',
+        'record_count': 0,
+        'success_count': 0,
+        'failure_count': 0,
+        'error_types': {},
+        'first_timestamp': None,
+        'last_timestamp': None
+    }
+
+
+def _parse_record(raw):
+    """Parse one raw CSV record into a list of field values"""
+    return next(csv.reader(io.StringIO(raw.decode('utf-8'), newline='')), [])
+
+
+def _parse_datetime(timestamp):
+    """Parse an ISO timestamp, returning None if it can't be parsed"""
+    try:
+        return datetime.datetime.fromisoformat(str(timestamp).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+# strftime formats naming each partition scheme's periods
+PARTITION_FORMATS = {
+    'daily': '%Y-%m-%d',
+    'monthly': '%Y-%m',
+    'yearly': '%Y'
+}
+
+
+def partition_key(timestamp, scheme=HISTORY_PARTITION):
+    """
+    Get the partition key (e.g. '2026-10' for monthly) for a timestamp
+
+    Args:
+        timestamp (str): ISO timestamp of the row
+        scheme (str): Partition scheme ('daily', 'monthly' or 'yearly')
+
+    Returns:
+        str: Partition key
+    """
+    dt = _parse_datetime(timestamp) or datetime.datetime.now()
+    return dt.strftime(PARTITION_FORMATS.get(scheme, PARTITION_FORMATS['monthly']))
+
+
+def partition_bounds(key, scheme=HISTORY_PARTITION):
+    """
+    Get the period covered by a partition key
+
+    Returns:
+        tuple: (start: datetime, end: datetime), end exclusive
+    """
+    start = datetime.datetime.strptime(key, PARTITION_FORMATS.get(scheme, PARTITION_FORMATS['monthly']))
+    if scheme == 'daily':
+        end = start + datetime.timedelta(days=1)
+    elif scheme == 'yearly':
+        end = start.replace(year=start.year + 1)
+    else:
+        end = (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return start, end
+
+
+class CSVStorage:
+    """
+    History stored as time-partitioned CSV files with a manifest
+
+    Rows are appended to one CSV per period (monthly by default) under the
+    history directory, e.g. ``speed_history_2026-10.csv``. ``manifest.json``
+    lists each partition's period, first/last timestamps, row counts and the
+    byte size those counters cover, so stats come from the manifest and
+    time-range reads open only the partitions overlapping the window. Each
+    partition also has a timestamp index sidecar (see csv_index).
+
+    Partitions whose period has closed are compressed (ARCHIVE_COMPRESSION,
+    gzip by default) on the next append and stay readable through the same
+    API; their counters are frozen in the manifest. A late row for an archived
+    period decompresses it again until the next append re-archives it.
+
+    A pre-partitioning single-file history is split automatically on the
+    first append (see split_history); until then it is read as one
+    unbounded partition.
+
+    A history opened read_only (e.g. the copy on the SMB share) is never
+    written to: counters and rollups that are behind the files are brought up
+    to date in memory only, and time-range reads scan rather than build an
+    index.
+    """
+
+    name = 'csv'
+
+    def __init__(self, history_dir=HISTORY_DIR, legacy_csv=None, scheme=HISTORY_PARTITION,
+                 compression=ARCHIVE_COMPRESSION, read_only=False):
+        self.history_dir = history_dir
+        self.manifest_path = history_dir / "manifest.json"
+        self.legacy_csv = legacy_csv or history_dir.parent / CSV_FILE.name
+        self.scheme = scheme if scheme in PARTITION_FORMATS else 'monthly'
+        self.compression = compression if compression in ARCHIVE_CODECS else None
+        self.read_only = read_only
+
+    @property
+    def path(self):
+        """Directory holding the history"""
+        return self.history_dir
+
+    def _load_manifest(self):
+        """Load the manifest, or an empty one if there is none yet"""
+        try:
+            manifest = json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError):
+            manifest = {'partition': self.scheme, 'partitions': []}
+        # An existing history keeps the scheme it was written with
+        self.scheme = manifest.get('partition', self.scheme)
+        return manifest
+
+    def _save_manifest(self, manifest):
+        """Atomically replace the manifest"""
+        manifest['partitions'].sort(key=lambda entry: entry['key'])
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + '.tmp')
+        tmp_path.write_text(json.dumps(manifest, indent=1))
+        tmp_path.replace(self.manifest_path)
+
+    def _partitions(self, manifest=None):
+        """Get manifest entries oldest first, or the legacy file as one entry"""
+        manifest = manifest or self._load_manifest()
+        if not manifest['partitions'] and self.legacy_csv.exists():
+            return [{'key': None, 'file': None, 'start': None, 'end': None}]
+        return manifest['partitions']
+
+    def partition_path(self, entry):
+        """Get the file path of a manifest entry"""
+        return self.history_dir / entry['file'] if entry['file'] else self.legacy_csv
+
+    def _new_entry(self, key):
+        """Create a manifest entry for a new partition"""
+        start, end = partition_bounds(key, self.scheme)
+        entry = {
+            'key': key,
+            'file': f"speed_history_{key}.csv",
+            'start': start.isoformat(),
+            'end': end.isoformat()
+        }
+        entry.update(_empty_counters())
+        return entry
+
+    def append(self, data):
+        """
+        Append one result row to the partition for its timestamp
+
+        Args:
+            data (SpeedRecord or dict): Speed test result
+        """
+        if self.read_only:
+            raise IOError(f"History {self.history_dir} is open read-only")
+
+        record = as_record(data)
+        if not self.manifest_path.exists() and self.legacy_csv.exists():
+            split_history(self.legacy_csv, self.history_dir, self.scheme)
+
+        self.history_dir.mkdir(parents=True, exist_ok=True)
+        manifest = self._load_manifest()
+        key = partition_key(record.timestamp, self.scheme)
+        entry = next((e for e in manifest['partitions'] if e['key'] == key), None)
+        if entry is None:
+            entry = self._new_entry(key)
+            manifest['partitions'].append(entry)
+        elif entry.get('compressed'):
+            self._unarchive(entry)
+
+        partition_path = self.partition_path(entry)
+        file_exists = partition_path.exists()
+
+        with open(partition_path, 'a', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+
+            # Write header if file is new
+            if not file_exists:
+                writer.writerow(CSV_FIELDNAMES)
+
+            writer.writerow(record.to_csv_row())
+
+        # Keep the timestamp index, counters and rollups in step with the appended row
+        ensure_index(partition_path)
+        self._refresh_counters(entry)
+        self._refresh_rollups(entry)
+        self._archive_cold_partitions(manifest)
+        self._save_manifest(manifest)
+
+    def _archive_cold_partitions(self, manifest):
+        """Compress partitions whose period has ended (updates the manifest)"""
+        if not self.compression:
+            return
+
+        now = datetime.datetime.now()
+        for entry in manifest['partitions']:
+            if entry.get('compressed') or datetime.datetime.fromisoformat(entry['end']) > now:
+                continue
+
+            partition_path = self.partition_path(entry)
+            try:
+                archive_path = compress_file(partition_path, self.compression)
+            except Exception as e:
+                logger.warning(f"Failed to archive {partition_path.name}: {str(e)}")
+                continue
+
+            for sidecar in (index_path_for(partition_path), unsorted_marker_for(partition_path)):
+                if sidecar.exists():
+                    sidecar.unlink()
+
+            entry['file'] = archive_path.name
+            entry['compressed'] = self.compression
+            entry['archive_size'] = archive_path.stat().st_size
+            logger.info(f"Archived {partition_path.name} -> {archive_path.name} "
+                        f"({entry['size']} -> {entry['archive_size']} bytes)")
+
+    def _unarchive(self, entry):
+        """Decompress an archived partition so rows can be appended to it"""
+        path = decompress_file(self.partition_path(entry))
+        entry['file'] = path.name
+        entry.pop('compressed', None)
+        entry.pop('archive_size', None)
+        logger.info(f"Restored archived partition {path.name} for a late row")
+
+    def _scan_counters(self, counters, csv_file):
+        """Add every complete record from counters['size'] onwards to the counters"""
+        header_raw = next(iter_records(csv_file), (0, b''))[1]
+        header = _parse_record(header_raw)
+        status_col = header.index('status') if 'status' in header else None
+        error_col = header.index('error_type') if 'error_type' in header else None
+        end = counters['size'] or len(header_raw)
+
+        for offset, raw in iter_records(csv_file, end):
+            values = _parse_record(raw)
+            end = offset + len(raw)
+            if not values:
+                continue
+
+            counters['record_count'] += 1
+            if status_col is not None and len(values) > status_col and values[status_col] == 'SUCCESS':
+                counters['success_count'] += 1
+            else:
+                counters['failure_count'] += 1
+
+            error_type = values[error_col] if error_col is not None and len(values) > error_col else ''
+            if error_type:
+                counters['error_types'][error_type] = counters['error_types'].get(error_type, 0) + 1
+
+            if counters['first_timestamp'] is None:
+                counters['first_timestamp'] = values[0]
+            counters['last_timestamp'] = values[0]
+
+        csv_file.seek(max(0, end - COUNTERS_SIGNATURE_BYTES))
+        counters['signature'] = csv_file.read(end - csv_file.tell()).hex()
+        counters['size'] = end
+
+    def _refresh_counters(self, entry):
+        """
+        Bring a partition's counters up to date with its file
+
+        Only the rows appended since the counters were last updated are
+        scanned; a full rescan happens when the file has been truncated or
+        rewritten.
+
+        Returns:
+            bool: True if the counters changed
+        """
+        if entry.get('compressed'):
+            # Archives are immutable; their counters were frozen when archived
+            return False
+
+        partition_path = self.partition_path(entry)
+        file_size = partition_path.stat().st_size if partition_path.exists() else 0
+        if entry.get('size') == file_size:
+            return False
+
+        with open(partition_path, 'rb') as csv_file:
+            signature = bytes.fromhex(entry.get('signature', ''))
+            reset = True
+            if entry.get('size', 0) < file_size and signature:
+                csv_file.seek(entry['size'] - len(signature))
+                reset = csv_file.read(len(signature)) != signature
+            if reset:
+                entry.update(_empty_counters())
+
+            self._scan_counters(entry, csv_file)
+
+        return True
+
+    def stats(self):
+        """
+        Get record counters for the history, summed over the manifest
+
+        Returns:
+            dict: record_count, success_count, failure_count, error_types,
+            first_timestamp, last_timestamp, file_size and partitions
+        """
+        manifest = self._load_manifest()
+        entries = self._partitions(manifest)
+
+        changed = False
+        for entry in entries:
+            changed = self._refresh_counters(entry) or changed
+        if changed and manifest['partitions'] and not self.read_only:
+            try:
+                self._save_manifest(manifest)
+            except OSError as e:
+                logger.warning(f"Failed to save history manifest: {str(e)}")
+
+        stats = {
+            'record_count': 0,
+            'success_count': 0,
+            'failure_count': 0,
+            'error_types': {},
+            'first_timestamp': None,
+            'last_timestamp': None,
+            'file_size': 0,
+            'partitions': len(manifest['partitions'])
+        }
+        for entry in entries:
+            for key in ('record_count', 'success_count', 'failure_count'):
+                stats[key] += entry[key]
+            for error_type, count in entry['error_types'].items():
+                stats['error_types'][error_type] = stats['error_types'].get(error_type, 0) + count
+            if entry['first_timestamp'] and not stats['first_timestamp']:
+                stats['first_timestamp'] = entry['first_timestamp']
+            if entry['last_timestamp']:
+                stats['last_timestamp'] = entry['last_timestamp']
+            stats['file_size'] += entry['size']
+        return stats
+
+    def rollup_path(self, entry):
+        """Get the rollups sidecar path of a manifest entry"""
+        if entry['key'] is None:
+            return self.legacy_csv.with_name(self.legacy_csv.name + '.rollup.json')
+        return self.history_dir / f"speed_history_{entry['key']}.rollup.json"
+
+    def _scan_rollups(self, rollups, csv_file):
+        """Add every complete record from rollups['size'] onwards to the rollups"""
+        header_raw = next(iter_records(csv_file), (0, b''))[1]
+        positions = column_positions(_parse_record(header_raw))
+        end = rollups['size'] or len(header_raw)
+
+        for offset, raw in iter_records(csv_file, end):
+            end = offset + len(raw)
+            values = _parse_record(raw)
+            if values:
+                add_to_rollups(rollups, SpeedRecord.from_csv_row(values, positions))
+
+        csv_file.seek(max(0, end - COUNTERS_SIGNATURE_BYTES))
+        rollups['signature'] = csv_file.read(end - csv_file.tell()).hex()
+        rollups['size'] = end
+
+    def _refresh_rollups(self, entry):
+        """
+        Bring a partition's hourly/daily rollups up to date with its file
+
+        Like the counters, only rows appended since the last update are added;
+        the rollups are rebuilt from the raw rows when the sidecar is missing
+        or the file was rewritten. Archived partitions keep the rollups they
+        had when they were archived.
+
+        Returns:
+            dict: {'size', 'signature', 'hourly': {...}, 'daily': {...}}
+        """
+        rollup_path = self.rollup_path(entry)
+        partition_path = self.partition_path(entry)
+        try:
+            rollups = json.loads(rollup_path.read_text())
+        except (OSError, ValueError):
+            rollups = None
+
+        compressed = entry.get('compressed')
+        if rollups and compressed:
+            return rollups
+        if not partition_path.exists():
+            return {'size': 0, 'signature': '', 'hourly': {}, 'daily': {}}
+
+        file_size = None if compressed else partition_path.stat().st_size
+        if rollups and rollups['size'] == file_size:
+            return rollups
+
+        with open_history_file(partition_path) as csv_file:
+            reset = True
+            if rollups and rollups['size'] < file_size and rollups['signature']:
+                signature = bytes.fromhex(rollups['signature'])
+                csv_file.seek(rollups['size'] - len(signature))
+                reset = csv_file.read(len(signature)) != signature
+            if reset:
+                rollups = {'size': 0, 'signature': '', 'hourly': {}, 'daily': {}}
+
+            self._scan_rollups(rollups, csv_file)
+
+        if self.read_only:
+            return rollups
+        try:
+            tmp_path = rollup_path.with_name(rollup_path.name + '.tmp')
+            tmp_path.write_text(json.dumps(rollups, separators=(',', ':')))
+            tmp_path.replace(rollup_path)
+        except OSError as e:
+            logger.warning(f"Failed to save rollups for {partition_path.name}: {str(e)}")
+        return rollups
+
+    def rebuild_rollups(self):
+        """
+        Rebuild every partition's rollups from the raw rows
+
+        Returns:
+            int: Number of partitions rebuilt
+        """
+        if self.read_only:
+            raise IOError(f"History {self.history_dir} is open read-only")
+
+        entries = self._partitions()
+        for entry in entries:
+            rollup_path = self.rollup_path(entry)
+            if rollup_path.exists():
+                rollup_path.unlink()
+            self._refresh_rollups(entry)
+        logger.info(f"Rebuilt rollups for {len(entries)} partitions in {self.history_dir}")
+        return len(entries)
+
+    def _read_partition(self, entry, since=None, until=None):
+        """Read one partition's rows, only those in [since, until) if given"""
+        partition_path = self.partition_path(entry)
+        if not partition_path.exists():
+            return []
+
+        # Partitions starting inside an open-ended window are read whole (and cached)
+        starts_inside = not since or (entry['start'] and datetime.datetime.fromisoformat(entry['start']) >= since)
+        if starts_inside and not until:
+            return read_csv_cached(partition_path)
+
+        window = None
+        if since and not entry.get('compressed') and not self.read_only:
+            window = read_csv_window(partition_path, since, until)
+        if window is None:
+            # Archive or no usable index; filter the cached full parse instead
+            start = since.timestamp() if since else float('-inf')
+            end = until.timestamp() if until else float('inf')
+            window = [record for record in read_csv_cached(partition_path)
+                      if record.epoch is not None and start <= record.epoch < end]
+        return window
+
+    def read(self, since=None, limit=None):
+        """
+        Read history rows in time order
+
+        Only partitions whose period overlaps the window are opened.
+
+        Args:
+            since (datetime): Only return rows at or after this time
+            limit (int): Only return the last N matching rows (read
+                backwards from the end, see tail)
+
+        Returns:
+            list: SpeedRecords (shared, must not be modified)
+        """
+        if limit:
+            return self.tail(limit, since=since)
+
+        return list(self.iter_rows(since))
+
+    def iter_rows(self, since=None):
+        """
+        Yield history rows in time order, one partition at a time
+
+        Used to merge several histories without loading any of them whole.
+
+        Args:
+            since (datetime): Only yield rows at or after this time
+        """
+        for entry in self._window_entries(since):
+            yield from self._read_partition(entry, since)
+
+    def iter_rows_reverse(self, since=None):
+        """
+        Yield history rows newest first, reading partitions backwards from the end
+
+        Args:
+            since (datetime): Stop at rows before this time
+        """
+        cutoff = since.timestamp() if since else None
+        for entry in reversed(self._window_entries(since)):
+            # Stopping at the first older row is only safe if rows are in time order
+            partition_path = self.partition_path(entry)
+            ordered = (not entry.get('compressed') and not self.read_only and partition_path.exists()
+                       and ensure_index(partition_path) and index_is_sorted(partition_path))
+            for record in self._iter_partition_reverse(entry):
+                if cutoff is not None:
+                    if record.epoch is None:
+                        continue
+                    if record.epoch < cutoff:
+                        if ordered:
+                            return
+                        continue
+                yield record
+
+    def _iter_partition_reverse(self, entry):
+        """Yield a partition's records newest first, reading backwards from the end"""
+        partition_path = self.partition_path(entry)
+        if not partition_path.exists():
+            return
+        if entry.get('compressed'):
+            # Archives can't be read backwards cheaply; use the cached parse
+            yield from reversed(read_csv_cached(partition_path))
+            return
+
+        # Without the index, a trailing partial record is skipped by iter_records_reverse
+        end = None if self.read_only else find_end(partition_path)
+        with open(partition_path, 'rb') as csv_file:
+            header_raw = next(iter_records(csv_file), (0, b''))[1]
+            positions = column_positions(_parse_record(header_raw))
+            for _, raw in iter_records_reverse(csv_file, start=len(header_raw), end=end):
+                values = _parse_record(raw)
+                if values:
+                    yield SpeedRecord.from_csv_row(values, positions)
+
+    def tail(self, limit, since=None, where=None):
+        """
+        Get the latest records, reading partitions backwards from the end
+
+        The cost depends on how many records are returned (and skipped by
+        where), not on the size of the history.
+
+        Args:
+            limit (int): Maximum number of records to return
+            since (datetime): Stop at records before this time
+            where (callable): Only return records for which this returns True
+
+        Returns:
+            list: Up to limit SpeedRecords in time order
+        """
+        records = []
+        for record in self.iter_rows_reverse(since):
+            if where is None or where(record):
+                records.append(record)
+                if len(records) >= limit:
+                    break
+        return records[::-1]
+
+    def _window_entries(self, since):
+        """Get the entries whose period overlaps a window starting at since"""
+        entries = self._partitions()
+        if since:
+            entries = [entry for entry in entries
+                       if not entry['end'] or datetime.datetime.fromisoformat(entry['end']) > since]
+        return entries
+
+    def summary(self, since=None):
+        """
+        Calculate summary statistics for rows at or after since
+
+        Whole days and hours of the window come from the partitions' rollups;
+        only the rows before the window's first whole hour are read raw.
+        """
+        entries = self._window_entries(since)
+        total = empty_bucket()
+        for entry in entries:
+            merge_window(total, self._refresh_rollups(entry), since)
+
+        if since:
+            hour_start, _ = window_boundaries(since)
+            for entry in entries:
+                if hour_start > since and (not entry['start'] or
+                                           datetime.datetime.fromisoformat(entry['start']) < hour_start):
+                    for record in self._read_partition(entry, since, hour_start):
+                        add_row(total, record)
+
+        return bucket_statistics(total)
+
+    def rollup_series(self, since=None, resolution='hourly'):
+        """
+        Get per-hour or per-day chart points from the rollups
+
+        Args:
+            since (datetime): Only include buckets starting at or after this time
+            resolution (str): 'hourly' or 'daily'
+
+        Returns:
+            list: Points with a timestamp, counts and avg/min/max per metric
+        """
+        buckets = {}
+        for entry in self._window_entries(since):
+            for key, bucket in self._refresh_rollups(entry)[resolution].items():
+                merge_bucket(buckets.setdefault(key, empty_bucket()), bucket)
+        return bucket_series({resolution: buckets}, resolution, since)
+
+    def backup_files(self):
+        """
+        Get the files making up the history for backups
+
+        Returns:
+            list: (local_path, relative_remote_path) tuples, manifest last
+        """
+        files = []
+        for entry in self._partitions():
+            if entry['file']:
+                files.append((self.partition_path(entry), f"{self.history_dir.name}/{entry['file']}"))
+                rollup_path = self.rollup_path(entry)
+                if rollup_path.exists():
+                    files.append((rollup_path, f"{self.history_dir.name}/{rollup_path.name}"))
+        if self.manifest_path.exists():
+            files.append((self.manifest_path, f"{self.history_dir.name}/{self.manifest_path.name}"))
+        return files
+
+
+def split_history(csv_path, history_dir=HISTORY_DIR, scheme=HISTORY_PARTITION):
+    """
+    Split a single-file CSV history into time partitions with a manifest
+
+    Rows are streamed into one file per period, the manifest is built from
+    the new partitions, and the original file is renamed with a
+    '.pre-split' suffix so it is kept as a backup but no longer read.
+
+    Args:
+        csv_path (Path): Single-file history to split
+        history_dir (Path): Directory to write partitions and manifest to
+        scheme (str): Partition scheme ('daily', 'monthly' or 'yearly')
+
+    Returns:
+        int: Number of rows split
+    """
+    history_dir.mkdir(parents=True, exist_ok=True)
+    storage = CSVStorage(history_dir, legacy_csv=csv_path, scheme=scheme)
+    manifest = storage._load_manifest()
+    entries = {entry['key']: entry for entry in manifest['partitions']}
+    outputs = {}
+    count = 0
+
+    try:
+        with open(csv_path, 'r', newline='') as csvfile:
+            reader = csv.reader(csvfile)
+            positions = column_positions(next(reader, []))
+            for values in reader:
+                if not values:
+                    continue
+                record = SpeedRecord.from_csv_row(values, positions)
+                key = partition_key(record.timestamp, storage.scheme)
+                if key not in outputs:
+                    if key not in entries:
+                        entries[key] = storage._new_entry(key)
+                    partition_path = storage.partition_path(entries[key])
+                    file_exists = partition_path.exists()
+                    handle = open(partition_path, 'a', newline='')
+                    writer = csv.writer(handle)
+                    if not file_exists:
+                        writer.writerow(CSV_FIELDNAMES)
+                    outputs[key] = (handle, writer)
+                outputs[key][1].writerow(record.to_csv_row())
+                count += 1
+    finally:
+        for handle, _ in outputs.values():
+            handle.close()
+
+    for key in outputs:
+        ensure_index(storage.partition_path(entries[key]))
+        storage._refresh_counters(entries[key])
+
+    manifest['partitions'] = list(entries.values())
+    storage._save_manifest(manifest)
+    csv_path.replace(csv_path.with_name(csv_path.name + '.pre-split'))
+
+    # Sidecars of the single-file history no longer describe anything
+    for suffix in ('.idx', '.stats.json', '.rollup.json'):
+        sidecar = csv_path.with_name(csv_path.name + suffix)
+        if sidecar.exists():
+            sidecar.unlink()
+    logger.info(f"Split {count} rows from {csv_path} into {len(outputs)} partitions in {history_dir}")
+    return count
+
+
+class SQLiteStorage:
+    """History stored in a WAL-mode SQLite database with a CSV export"""
+
+    name = 'sqlite'
+
+    # SQL predicate matching SpeedRecord.failed
+    FAILED_SQL = (
+        "(status = 'FAILED' OR COALESCE(error_type, '') != '' "
+        "OR (download_mbps IS NULL AND upload_mbps IS NULL))"
+    )
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            epoch REAL NOT NULL,
+            download_mbps REAL,
+            upload_mbps REAL,
+            ping_ms REAL,
+            server_name TEXT,
+            server_country TEXT,
+            server_sponsor TEXT,
+            status TEXT,
+            error_type TEXT,
+            error_details TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_results_epoch ON results (epoch);
+        CREATE INDEX IF NOT EXISTS idx_results_status ON results (status);
+        CREATE INDEX IF NOT EXISTS idx_results_error_type ON results (error_type);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """ + "".join(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            bucket TEXT PRIMARY KEY,
+            count INTEGER NOT NULL,
+            success_count INTEGER NOT NULL,
+            {", ".join(f"{metric}_n INTEGER NOT NULL, {metric}_sum REAL NOT NULL, "
+                       f"{metric}_min REAL, {metric}_max REAL" for metric, _ in METRICS)}
+        );""" for table in ('rollup_hourly', 'rollup_daily'))
+
+    # Rollup table -> length of the timestamp prefix naming its buckets
+    ROLLUP_TABLES = {
+        'hourly': ('rollup_hourly', 13),
+        'daily': ('rollup_daily', 10)
+    }
+
+    ROLLUP_COLUMNS = ["count", "success_count"] + [
+        f"{metric}_{part}" for metric, _ in METRICS for part in ('n', 'sum', 'min', 'max')
+    ]
+
+    # Adds one row's bucket to a rollup table; min/max keep the non-NULL side
+    ROLLUP_UPSERT = (
+        "INSERT INTO {table} (bucket, " + ", ".join(ROLLUP_COLUMNS) + ") "
+        "VALUES (?, " + ", ".join("?" for _ in ROLLUP_COLUMNS) + ") "
+        "ON CONFLICT(bucket) DO UPDATE SET " + ", ".join(
+            f"{column} = COALESCE({'MIN' if column.endswith('_min') else 'MAX'}({column}, excluded.{column}), "
+            f"{column}, excluded.{column})"
+            if column.endswith(('_min', '_max')) else f"{column} = {column} + excluded.{column}"
+            for column in ROLLUP_COLUMNS
+        )
+    )
+
+    def __init__(self, db_path=DB_FILE, export_path=CSV_FILE):
+        self.db_path = db_path
+        self.export_path = export_path
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    @property
+    def path(self):
+        """Primary file holding the history"""
+        return self.db_path
+
+    def _connect(self):
+        """Open a connection, creating the schema on first use"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        with self._init_lock:
+            if not self._initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(self.SCHEMA)
+                self._import_existing_csv(conn)
+                if not conn.execute("SELECT 1 FROM rollup_daily LIMIT 1").fetchone():
+                    self._rebuild_rollups(conn)
+                self._initialized = True
+
+        return conn
+
+    # results columns in SpeedRecord field order
+    RECORD_COLUMNS = ", ".join(SpeedRecord._fields)
+
+    @staticmethod
+    def _row_values(record):
+        """Convert a SpeedRecord to results column values"""
+        if record.epoch is None:
+            return record._replace(epoch=datetime.datetime.now().timestamp())
+        return record
+
+    def _insert(self, conn, records):
+        """Insert SpeedRecords"""
+        conn.executemany(
+            f"INSERT INTO results ({self.RECORD_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (self._row_values(record) for record in records)
+        )
+
+    def _import_existing_csv(self, conn):
+        """Seed an empty database from the existing CSV history"""
+        if conn.execute("SELECT 1 FROM results LIMIT 1").fetchone():
+            return
+
+        # Partitioned history if there is one, otherwise the single-file CSV
+        rows = CSVStorage(self.db_path.parent / HISTORY_DIR.name, legacy_csv=self.export_path).read()
+        if not rows:
+            return
+
+        with conn:
+            self._insert(conn, rows)
+            if self.export_path.exists():
+                # The existing CSV already holds these rows, so export resumes after them
+                last_id = conn.execute("SELECT MAX(id) FROM results").fetchone()[0] or 0
+                self._set_meta(conn, 'export_rowid', last_id)
+                self._set_meta(conn, 'export_size', self.export_path.stat().st_size)
+        logger.info(f"Imported {len(rows)} rows of CSV history into {self.db_path}")
+
+    @staticmethod
+    def _get_meta(conn, key, default=None):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    @staticmethod
+    def _set_meta(conn, key, value):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def append(self, data):
+        """
+        Insert one result row and add it to the hourly/daily rollups
+
+        Args:
+            data (SpeedRecord or dict): Speed test result
+        """
+        record = as_record(data)
+        with closing(self._connect()) as conn, conn:
+            self._insert(conn, [record])
+            self._upsert_rollups(conn, record)
+
+    def _upsert_rollups(self, conn, record):
+        """Add one SpeedRecord to the rollup tables"""
+        keys = bucket_keys(record.timestamp)
+        if keys is None:
+            return
+
+        bucket = empty_bucket()
+        add_row(bucket, record)
+        values = [bucket['count'], bucket['success_count']]
+        for metric, _ in METRICS:
+            values.extend(bucket.get(metric) or [0, 0.0, None, None])
+
+        for (table, _), key in zip(self.ROLLUP_TABLES.values(), keys):
+            conn.execute(self.ROLLUP_UPSERT.format(table=table), [key] + values)
+
+    def _rebuild_rollups(self, conn):
+        """Recompute the rollup tables from the results table"""
+        ok = f"NOT {self.FAILED_SQL}"
+        aggregates = []
+        for _, column in METRICS:
+            value = f"CASE WHEN {ok} THEN {column} END"
+            aggregates.append(f"COUNT({value}), COALESCE(SUM({value}), 0), MIN({value}), MAX({value})")
+
+        with conn:
+            for table, length in self.ROLLUP_TABLES.values():
+                conn.execute(f"DELETE FROM {table}")
+                conn.execute(
+                    f"INSERT INTO {table} (bucket, " + ", ".join(self.ROLLUP_COLUMNS) + ") "
+                    f"SELECT REPLACE(SUBSTR(timestamp, 1, {length}), ' ', 'T'), COUNT(*), "
+                    f"SUM({ok}), " + ", ".join(aggregates) + " "
+                    f"FROM results WHERE LENGTH(timestamp) >= 13 GROUP BY 1"
+                )
+
+    def rebuild_rollups(self):
+        """Rebuild the rollup tables from the raw results"""
+        with closing(self._connect()) as conn:
+            self._rebuild_rollups(conn)
+        logger.info(f"Rebuilt rollups in {self.db_path}")
+
+    def _load_buckets(self, conn, resolution, first_key=None, end_key=None):
+        """Load rollup buckets keyed by bucket name, optionally in [first_key, end_key)"""
+        table, _ = self.ROLLUP_TABLES[resolution]
+        query = f"SELECT * FROM {table} WHERE bucket >= ?"
+        params = [first_key or '']
+        if end_key:
+            query += " AND bucket < ?"
+            params.append(end_key)
+
+        buckets = {}
+        for row in conn.execute(query, params):
+            bucket = {'count': row['count'], 'success_count': row['success_count']}
+            for metric, _ in METRICS:
+                if row[f'{metric}_n']:
+                    bucket[metric] = [row[f'{metric}_{part}'] for part in ('n', 'sum', 'min', 'max')]
+            buckets[row['bucket']] = bucket
+        return buckets
+
+    def stats(self):
+        """
+        Get record counters for the history
+
+        Returns:
+            dict: record_count, success_count, failure_count, error_types,
+            first_timestamp, last_timestamp and file_size
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(status = 'SUCCESS'), 0), MIN(timestamp), MAX(timestamp) "
+                "FROM results"
+            ).fetchone()
+            error_types = dict(conn.execute(
+                "SELECT error_type, COUNT(*) FROM results "
+                "WHERE error_type IS NOT NULL GROUP BY error_type"
+            ).fetchall())
+
+        return {
+            'record_count': row[0],
+            'success_count': row[1],
+            'failure_count': row[0] - row[1],
+            'error_types': error_types,
+            'first_timestamp': row[2],
+            'last_timestamp': row[3],
+            'file_size': self.db_path.stat().st_size
+        }
+
+    def read(self, since=None, limit=None):
+        """
+        Read history rows in time order
+
+        Args:
+            since (datetime): Only return rows at or after this time
+            limit (int): Only return the last N matching rows
+
+        Returns:
+            list: SpeedRecords
+        """
+        query = f"SELECT {self.RECORD_COLUMNS} FROM results"
+        params = []
+        if since:
+            query += " WHERE epoch >= ?"
+            params.append(since.timestamp())
+        query += " ORDER BY epoch DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        return [SpeedRecord._make(row) for row in reversed(rows)]
+
+    def tail(self, limit, since=None, where=None):
+        """
+        Get the latest records, newest first from the epoch index
+
+        Args:
+            limit (int): Maximum number of records to return
+            since (datetime): Stop at records before this time
+            where (callable): Only return records for which this returns True
+
+        Returns:
+            list: Up to limit SpeedRecords in time order
+        """
+        if where is None:
+            return self.read(since=since, limit=limit)
+
+        query = f"SELECT {self.RECORD_COLUMNS} FROM results"
+        params = []
+        if since:
+            query += " WHERE epoch >= ?"
+            params.append(since.timestamp())
+        query += " ORDER BY epoch DESC"
+
+        records = []
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(query, params)
+            while len(records) < limit:
+                rows = cursor.fetchmany(limit)
+                if not rows:
+                    break
+                records.extend(record for record in map(SpeedRecord._make, rows) if where(record))
+
+        return records[:limit][::-1]
+
+    def summary(self, since=None):
+        """
+        Calculate summary statistics for rows at or after since
+
+        Whole days and hours of the window come from the rollup tables; only
+        the rows before the window's first whole hour are read from results.
+        """
+        total = empty_bucket()
+        with closing(self._connect()) as conn:
+            if since is None:
+                for bucket in self._load_buckets(conn, 'daily').values():
+                    merge_bucket(total, bucket)
+            else:
+                hour_start, day_start = window_boundaries(since)
+                rollups = {
+                    'hourly': self._load_buckets(conn, 'hourly', hour_start.strftime('%Y-%m-%dT%H'),
+                                                 day_start.strftime('%Y-%m-%dT%H')),
+                    'daily': self._load_buckets(conn, 'daily', day_start.strftime('%Y-%m-%d'))
+                }
+                merge_window(total, rollups, since)
+
+                rows = conn.execute(
+                    f"SELECT {self.RECORD_COLUMNS} FROM results WHERE epoch >= ? AND epoch < ?",
+                    (since.timestamp(), hour_start.timestamp())
+                ).fetchall()
+                for row in rows:
+                    add_row(total, SpeedRecord._make(row))
+
+        return bucket_statistics(total)
+
+    def rollup_series(self, since=None, resolution='hourly'):
+        """
+        Get per-hour or per-day chart points from the rollup tables
+
+        Args:
+            since (datetime): Only include buckets starting at or after this time
+            resolution (str): 'hourly' or 'daily'
+
+        Returns:
+            list: Points with a timestamp, counts and avg/min/max per metric
+        """
+        key_format = '%Y-%m-%dT%H' if resolution == 'hourly' else '%Y-%m-%d'
+        with closing(self._connect()) as conn:
+            buckets = self._load_buckets(conn, resolution, since.strftime(key_format) if since else None)
+        return bucket_series({resolution: buckets}, resolution, since)
+
+    def export_csv(self):
+        """
+        Bring the CSV export up to date for backups
+
+        Rows inserted since the last export are appended; the export is
+        rewritten in full only if the CSV was changed by something else.
+
+        Returns:
+            Path: The CSV export
+        """
+        with closing(self._connect()) as conn:
+            last_id = int(self._get_meta(conn, 'export_rowid', 0))
+            export_size = int(self._get_meta(conn, 'export_size', -1))
+            current_size = self.export_path.stat().st_size if self.export_path.exists() else -1
+
+            mode = 'a'
+            if current_size != export_size or current_size <= 0:
+                last_id = 0
+                mode = 'w'
+
+            rows = conn.execute(
+                f"SELECT id, {self.RECORD_COLUMNS} FROM results WHERE id > ? ORDER BY id",
+                (last_id,)
+            ).fetchall()
+
+            if rows or mode == 'w':
+                with open(self.export_path, mode, newline='') as csvfile:
+                    writer = csv.writer(csvfile)
+                    if mode == 'w':
+                        writer.writerow(CSV_FIELDNAMES)
+                    writer.writerows(SpeedRecord._make(tuple(row)[1:]).to_csv_row() for row in rows)
+
+                with conn:
+                    if rows:
+                        self._set_meta(conn, 'export_rowid', rows[-1]['id'])
+                    self._set_meta(conn, 'export_size', self.export_path.stat().st_size)
+                logger.debug(f"Exported {len(rows)} rows to {self.export_path}")
+
+        return self.export_path
+
+    def backup_files(self):
+        """
+        Get the files making up the history for backups
+
+        The database itself is not copied; backups use the CSV export.
+
+        Returns:
+            list: (local_path, relative_remote_path) tuples
+        """
+        export_path = self.export_csv()
+        return [(export_path, export_path.name)]
+
+
+STORAGE_BACKENDS = {
+    'csv': CSVStorage,
+    'sqlite': SQLiteStorage
+}
+
+_storage = None
+
+
+def get_storage():
+    """
+    Get the shared storage backend selected in config
+
+    Returns:
+        CSVStorage or SQLiteStorage: Storage backend instance
+    """
+    global _storage
+    if _storage is None:
+        backend = STORAGE_BACKENDS.get(STORAGE_BACKEND)
+        if backend is None:
+            logger.warning(f"Unknown storage backend '{STORAGE_BACKEND}', using csv")
+            backend = CSVStorage
+        _storage = backend()
+    return _storage
+
+
+def set_storage(storage):
+    """Replace the shared storage backend (e.g. to point at another location)"""
+    global _storage
+    _storage = storage
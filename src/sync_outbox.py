@@ -0,0 +1,184 @@
+"""
+Background SMB sync outbox for the Speedtest Monitor application
+
+A test run only records that a sync is wanted: enqueue_sync() writes a small
+job file to SYNC_OUTBOX_DIR and starts a detached worker, so a slow or hung
+CIFS mount never delays the run. The worker holds an flock on
+SYNC_WORKER_LOCK (so at most one runs), performs a single sync_to_smb() for
+every job pending at that moment and deletes them only once it succeeds.
+Failed syncs are retried with exponential backoff; jobs survive reboots and
+crashes, and however many piled up during an outage are covered by one sync.
+"""
+
+import fcntl
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+from config import (
+    SYNC_OUTBOX_DIR, SYNC_WORKER_LOCK, SYNC_RETRY_BASE_SECONDS,
+    SYNC_RETRY_MAX_SECONDS, SYNC_MAX_ATTEMPTS
+)
+from logging_config import get_logger
+from csv_handler import save_failure_to_csv
+from smb_sync import sync_to_smb
+
+logger = get_logger(__name__)
+
+
+def enqueue_sync(reason="speedtest"):
+    """
+    Queue an SMB sync and make sure a background worker will perform it
+
+    Args:
+        reason (str): What the sync is for, recorded in the job file
+
+    Returns:
+        bool: True if the job was queued, False otherwise
+    """
+    try:
+        SYNC_OUTBOX_DIR.mkdir(parents=True, exist_ok=True)
+        job_name = f"{time.time_ns()}-{os.getpid()}.json"
+        tmp_file = SYNC_OUTBOX_DIR / f".{job_name}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({'created': time.time(), 'reason': reason}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, SYNC_OUTBOX_DIR / job_name)
+        logger.info(f"Queued SMB sync ({len(pending_jobs())} pending)")
+    except Exception as e:
+        logger.error(f"Failed to queue SMB sync: {str(e)}")
+        return False
+
+    start_worker()
+    return True
+
+
+def pending_jobs():
+    """
+    Get the queued sync jobs, oldest first
+
+    Returns:
+        list: Job file paths
+    """
+    try:
+        return sorted(SYNC_OUTBOX_DIR.glob('*.json'))
+    except Exception:
+        return []
+
+
+def start_worker():
+    """
+    Start a detached sync worker process
+
+    The new process exits straight away if another worker holds the lock;
+    that worker picks up the new job before it exits.
+
+    Returns:
+        bool: True if the process was started, False otherwise
+    """
+    try:
+        subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve())],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            close_fds=True,
+            start_new_session=True
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Failed to start SMB sync worker: {str(e)}")
+        return False
+
+
+def retry_delay(attempt):
+    """
+    Get the backoff delay before retrying a failed sync
+
+    Args:
+        attempt (int): Number of failed attempts so far (1 for the first)
+
+    Returns:
+        float: Seconds to wait, doubling per attempt up to the maximum, with
+        up to 10% random jitter
+    """
+    delay = min(SYNC_RETRY_MAX_SECONDS, SYNC_RETRY_BASE_SECONDS * (2 ** (attempt - 1)))
+    return delay * (1 + random.uniform(0, 0.1))
+
+
+def drain_outbox():
+    """
+    Sync once for all pending jobs, retrying with backoff until it succeeds
+
+    Jobs queued while a sync is running stay in the outbox for the next pass.
+
+    Returns:
+        bool: True if the outbox was drained, False if retries ran out
+    """
+    attempt = 0
+    while True:
+        jobs = pending_jobs()
+        if not jobs:
+            return True
+
+        logger.info(f"Syncing to SMB for {len(jobs)} queued request(s)")
+        try:
+            synced = sync_to_smb()
+        except Exception as e:
+            logger.warning(f"SMB sync exception: {str(e)}")
+            synced = False
+
+        if synced:
+            for job in jobs:
+                try:
+                    job.unlink()
+                except FileNotFoundError:
+                    pass
+            attempt = 0
+            continue
+
+        attempt += 1
+        if attempt >= SYNC_MAX_ATTEMPTS:
+            logger.error(f"SMB sync failed {attempt} times - leaving {len(jobs)} request(s) queued")
+            save_failure_to_csv("SMBSyncFailed", f"SMB synchronization failed after {attempt} attempts", "smb_sync")
+            return False
+
+        delay = retry_delay(attempt)
+        logger.warning(f"SMB sync failed (attempt {attempt}) - retrying in {delay:.0f}s")
+        time.sleep(delay)
+
+
+def run_worker():
+    """
+    Drain the outbox unless another worker is already doing so
+
+    After releasing the lock the outbox is checked again, so a job queued
+    just as the previous holder was finishing is not left behind.
+
+    Returns:
+        int: 0 if the outbox is empty or another worker owns it, 1 otherwise
+    """
+    SYNC_WORKER_LOCK.parent.mkdir(parents=True, exist_ok=True)
+    while True:
+        with open(SYNC_WORKER_LOCK, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.debug("SMB sync worker already running")
+                return 0
+
+            if not drain_outbox():
+                return 1
+
+        if not pending_jobs():
+            return 0
+
+
+if __name__ == "__main__":
+    from logging_config import setup_logging
+    setup_logging()
+    sys.exit(run_worker())
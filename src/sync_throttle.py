@@ -0,0 +1,186 @@
+"""
+Bandwidth limiting and measurement-aware pacing for the Speedtest Monitor sync
+
+A speed test holds MEASUREMENT_LOCK_FILE (see measurement_lock) while it
+runs. Sync I/O goes through pace(), which waits while the lock is held and
+then takes tokens from a shared token bucket limiting sync traffic to
+SYNC_RATE_LIMIT_KBPS, so backup copies neither overlap a measurement nor
+saturate the link. Time spent waiting is counted and reported with each sync.
+"""
+
+import fcntl
+import threading
+import time
+from contextlib import contextmanager
+from config import MEASUREMENT_LOCK_FILE, SYNC_RATE_LIMIT_KBPS, SYNC_MAX_DEFER_SECONDS
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# How often pace() checks the measurement lock during a transfer
+MEASUREMENT_CHECK_INTERVAL = 0.5
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter shared by all sync threads
+
+    Tokens are bytes, refilled at rate per second up to burst. Taking more
+    than are available puts the bucket in debt and the caller sleeps until it
+    is repaid, so a chunk larger than the burst is still paced correctly.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        """
+        Take tokens for a transfer, sleeping until the rate allows it
+
+        Args:
+            amount (int): Bytes about to be transferred
+
+        Returns:
+            float: Seconds slept
+        """
+        if not self.rate or self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+_bucket = TokenBucket(SYNC_RATE_LIMIT_KBPS * 1024)
+_stats_lock = threading.Lock()
+_stats = {'deferred_seconds': 0.0, 'throttled_seconds': 0.0}
+_last_check = {'time': 0.0, 'busy': False}
+
+
+def set_rate_limit(kbps):
+    """
+    Change the sync rate limit
+
+    Args:
+        kbps (float): KiB per second, 0 for no limit
+    """
+    global _bucket
+    _bucket = TokenBucket(kbps * 1024)
+
+
+def reset_stats():
+    """Reset the deferred/throttled time counters at the start of a sync"""
+    with _stats_lock:
+        _stats['deferred_seconds'] = 0.0
+        _stats['throttled_seconds'] = 0.0
+
+
+def get_stats():
+    """
+    Get the time sync work has waited since reset_stats
+
+    Returns:
+        dict: 'deferred_seconds' (waiting for a speed test to finish) and
+        'throttled_seconds' (waiting for the rate limit), rounded
+    """
+    with _stats_lock:
+        return {key: round(value, 3) for key, value in _stats.items()}
+
+
+def _add_stat(key, seconds):
+    with _stats_lock:
+        _stats[key] += seconds
+
+
+@contextmanager
+def measurement_lock():
+    """
+    Hold the measurement lock for the duration of a speed test
+
+    Sync work checking measurement_in_progress() waits until it is released.
+    """
+    MEASUREMENT_LOCK_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(MEASUREMENT_LOCK_FILE, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def measurement_in_progress():
+    """
+    Check whether a speed test currently holds the measurement lock
+
+    Returns:
+        bool: True if a measurement is running
+    """
+    try:
+        with open(MEASUREMENT_LOCK_FILE, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return False
+    except OSError:
+        return False
+
+
+def wait_for_measurement(max_wait=SYNC_MAX_DEFER_SECONDS):
+    """
+    Wait until no speed test is running
+
+    Args:
+        max_wait (float): Give up waiting after this many seconds
+
+    Returns:
+        float: Seconds waited
+    """
+    started = time.monotonic()
+    logged = False
+    while measurement_in_progress():
+        waited = time.monotonic() - started
+        if waited >= max_wait:
+            logger.warning(f"Speed test still running after {waited:.0f}s - syncing anyway")
+            break
+        if not logged:
+            logger.info("Speed test in progress - deferring sync")
+            logged = True
+        time.sleep(min(MEASUREMENT_CHECK_INTERVAL, max_wait - waited))
+
+    waited = time.monotonic() - started
+    _add_stat('deferred_seconds', waited if logged else 0.0)
+    return waited if logged else 0.0
+
+
+def pace(amount):
+    """
+    Wait before transferring bytes: for a running speed test, then for the rate limit
+
+    The measurement lock is checked at most every MEASUREMENT_CHECK_INTERVAL
+    seconds, so pacing small chunks stays cheap.
+
+    Args:
+        amount (int): Bytes about to be transferred
+    """
+    now = time.monotonic()
+    if now - _last_check['time'] >= MEASUREMENT_CHECK_INTERVAL:
+        _last_check['time'] = now
+        _last_check['busy'] = measurement_in_progress()
+    if _last_check['busy']:
+        wait_for_measurement()
+        _last_check['busy'] = False
+
+    _add_stat('throttled_seconds', _bucket.consume(amount))
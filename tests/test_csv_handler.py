@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Tests for CSV persistence and the persistent counters behind get_csv_stats
+"""
+
+import sys
+import csv
+import datetime
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path to import the monitor modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from config import CSV_FIELDNAMES
+import csv_handler
+import storage
+
+
+@pytest.fixture(autouse=True)
+def shared_storage(monkeypatch):
+    """Restore the process-wide backend after each test's set_storage()"""
+    monkeypatch.setattr(storage, '_storage', None)
+
+
+def _success_row(timestamp):
+    return {
+        'timestamp': timestamp.isoformat(),
+        'download_mbps': 50.0,
+        'upload_mbps': 10.0,
+        'ping_ms': 15.0,
+        'server_name': 'Test',
+        'server_country': 'Test',
+        'server_sponsor': 'Test ISP',
+        'status': 'SUCCESS',
+        'error_type': None,
+        'error_details': None
+    }
+
+
+def test_counters_track_appends(tmp_path):
+    storage.set_storage(storage.CSVStorage(tmp_path / "history"))
+    start = datetime.datetime(2026, 1, 1, 12, 0)
+    for i in range(5):
+        csv_handler.save_to_csv(_success_row(start + datetime.timedelta(minutes=15 * i)))
+    csv_handler.save_failure_to_csv("ConfigError", "multi\nline \"details\"", "get_config")
+
+    stats = csv_handler.get_csv_stats()
+    assert stats['record_count'] == 6
+    assert stats['success_count'] == 5
+    assert stats['failure_count'] == 1
+    assert stats['error_types'] == {'ConfigError': 1}
+    assert stats['first_timestamp'] == start.isoformat()
+
+
+def test_counters_recover_from_rewrite(tmp_path):
+    storage.set_storage(storage.CSVStorage(tmp_path / "history", compression='none'))
+    start = datetime.datetime(2026, 1, 1, 12, 0)
+    for i in range(3):
+        csv_handler.save_to_csv(_success_row(start + datetime.timedelta(hours=i)))
+    csv_handler.get_csv_stats()
+
+    # Rewrite the history behind the monitor's back, growing the file
+    csv_file = tmp_path / "history" / "speed_history_2026-01.csv"
+    data = csv_file.read_text().replace(',SUCCESS,', ',FAILED,', 1)
+    csv_file.write_text(data + data.split('\n', 1)[1])
+
+    stats = csv_handler.get_csv_stats()
+    assert stats['record_count'] == 6
+    assert stats['failure_count'] == 2
+
+
+def test_sqlite_backend_matches_csv(tmp_path):
+    csv_file = tmp_path / "speed_history.csv"
+    storage.set_storage(storage.CSVStorage(tmp_path / "history"))
+    start = datetime.datetime.now() - datetime.timedelta(hours=30)
+    for i in range(30):
+        csv_handler.save_to_csv(_success_row(start + datetime.timedelta(hours=i)))
+    csv_handler.save_failure_to_csv("ConfigError", "timed out", "get_config")
+    since = datetime.datetime.now() - datetime.timedelta(hours=12)
+    csv_summary = storage.get_storage().summary(since=since)
+
+    # The SQLite backend imports the existing CSV on first use
+    sqlite_storage = storage.SQLiteStorage(tmp_path / "speed_history.db", csv_file)
+    storage.set_storage(sqlite_storage)
+    assert sqlite_storage.summary(since=since) == csv_summary
+
+    csv_handler.save_to_csv(_success_row(datetime.datetime.now()))
+    stats = csv_handler.get_csv_stats()
+    assert stats['record_count'] == 32
+    assert stats['error_types'] == {'ConfigError': 1}
+    assert len(sqlite_storage.read(limit=5)) == 5
+
+    # The export is written in full once, then only new rows are appended
+    sqlite_storage.export_csv()
+    assert len(csv_file.read_text().splitlines()) == 33
+    csv_handler.save_to_csv(_success_row(datetime.datetime.now()))
+    sqlite_storage.export_csv()
+    assert len(csv_file.read_text().splitlines()) == 34
+
+
+def test_partitions_and_manifest(tmp_path):
+    history = storage.CSVStorage(tmp_path / "history", compression='none')
+    storage.set_storage(history)
+    for month in (1, 2, 3):
+        for day in (1, 15):
+            csv_handler.save_to_csv(_success_row(datetime.datetime(2026, month, day, 12, 0)))
+
+    assert sorted(p.name for p in (tmp_path / "history").glob("*.csv")) == [
+        "speed_history_2026-01.csv", "speed_history_2026-02.csv", "speed_history_2026-03.csv"
+    ]
+    assert csv_handler.get_csv_stats()['record_count'] == 6
+
+    # A window inside March only opens the March partition
+    rows = history.read(since=datetime.datetime(2026, 3, 10))
+    assert [row.timestamp for row in rows] == ['2026-03-15T12:00:00']
+    assert storage.get_cache_stats()['cached_files'] >= 1
+
+
+def test_split_legacy_history(tmp_path):
+    legacy = tmp_path / "speed_history.csv"
+    with open(legacy, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDNAMES)
+        writer.writeheader()
+        for month in (5, 6):
+            writer.writerow(_success_row(datetime.datetime(2025, month, 2, 8, 0)))
+
+    history = storage.CSVStorage(tmp_path / "history")
+    assert len(history.read()) == 2  # Read as a single unbounded partition
+
+    storage.set_storage(history)
+    csv_handler.save_to_csv(_success_row(datetime.datetime(2025, 7, 1, 8, 0)))
+    assert not legacy.exists()
+    assert history.stats()['partitions'] == 3
+    assert len(history.read()) == 3
+
+
+def test_cold_partitions_archived(tmp_path):
+    history = storage.CSVStorage(tmp_path / "history", compression='gzip')
+    storage.set_storage(history)
+    old = datetime.datetime(2025, 3, 1, 12, 0)
+    for i in range(20):
+        csv_handler.save_to_csv(_success_row(old + datetime.timedelta(hours=i)))
+    csv_handler.save_to_csv(_success_row(datetime.datetime.now()))
+
+    names = sorted(p.name for p in (tmp_path / "history").iterdir())
+    assert 'speed_history_2025-03.csv.gz' in names
+    assert 'speed_history_2025-03.csv' not in names
+    assert csv_handler.get_csv_stats()['record_count'] == 21
+
+    # Archives read through the same API, including windowed reads
+    assert len(history.read()) == 21
+    assert len(history.read(since=old + datetime.timedelta(hours=15))) == 6
+
+    # A late row for an archived month restores it, the next append re-archives it
+    csv_handler.save_to_csv(_success_row(old + datetime.timedelta(days=2)))
+    assert len(history.read()) == 22
+    assert (tmp_path / "history" / "speed_history_2025-03.csv.gz").exists()
+
+
+def test_rollups_match_raw_rows(tmp_path):
+    history = storage.CSVStorage(tmp_path / "history")
+    (tmp_path / "db").mkdir()
+    sqlite_storage = storage.SQLiteStorage(tmp_path / "db" / "speed_history.db", tmp_path / "db" / "speed_history.csv")
+    now = datetime.datetime.now()
+    for i in reversed(range(100)):
+        timestamp = now - datetime.timedelta(minutes=50 * i)
+        row = _success_row(timestamp)
+        row['download_mbps'] = 20.0 + i
+        if i % 7 == 0:
+            row.update(status='FAILED', download_mbps=None, upload_mbps=None, error_type='Timeout')
+        history.append(row)
+        sqlite_storage.append(row)
+
+    for hours in (None, 1, 5, 24, 49.5, 100):
+        since = now - datetime.timedelta(hours=hours, minutes=3) if hours else None
+        expected = storage.calculate_statistics(history.read(since=since))
+        assert history.summary(since=since) == expected
+        assert sqlite_storage.summary(since=since) == expected
+
+    hourly = history.rollup_series(resolution='hourly')
+    assert sum(point['total_tests'] for point in hourly) == 100
+    assert hourly == sqlite_storage.rollup_series(resolution='hourly')
+
+    # Rollups are rebuilt from raw rows when the partition is rewritten
+    partition = next((tmp_path / "history").glob("*.csv"))
+    lines = partition.read_text().splitlines(keepends=True)
+    partition.write_text(lines[0] + "".join(lines[2:]))
+    assert history.summary() == storage.calculate_statistics(history.read())
+
+
+def test_tail_reads_latest_records(tmp_path):
+    history = storage.CSVStorage(tmp_path / "history", compression='none')
+    now = datetime.datetime.now()
+    for i in reversed(range(60)):
+        row = _success_row(now - datetime.timedelta(days=i))
+        if i % 4 == 0:
+            row.update(status='FAILED', error_type='Timeout', error_details='multi\nline')
+        history.append(row)
+
+    everything = history.read()
+    assert history.read(limit=10) == everything[-10:]
+
+    # Spans partitions and filters while reading backwards
+    failures = [row for row in everything if row.failed]
+    assert history.tail(8, where=lambda row: row.failed) == failures[-8:]
+    since = now - datetime.timedelta(days=5, hours=1)
+    assert history.tail(50, since=since) == [row for row in everything if row.epoch >= since.timestamp()]
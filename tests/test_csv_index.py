@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Tests for the byte-offset timestamp index of the CSV history
+"""
+
+import sys
+import csv
+import datetime
+from pathlib import Path
+
+# Add the src directory to the path to import the monitor modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from config import CSV_FIELDNAMES
+import csv_index
+
+
+def _write_history(csv_file, hours):
+    """Append one row per hour ending now, the oldest first, indexing as we go"""
+    now = datetime.datetime.now()
+    with open(csv_file, 'w', newline='') as f:
+        csv.DictWriter(f, fieldnames=CSV_FIELDNAMES).writeheader()
+    for i in range(hours, -1, -1):
+        with open(csv_file, 'a', newline='') as f:
+            csv.DictWriter(f, fieldnames=CSV_FIELDNAMES).writerow({
+                'timestamp': (now - datetime.timedelta(hours=i)).isoformat(),
+                'download_mbps': i,
+                'upload_mbps': 10,
+                'ping_ms': 20,
+                'status': 'SUCCESS',
+                # Quoted newlines must not break record boundaries
+                'error_details': 'line one\nline "two"' if i % 5 == 0 else None
+            })
+        csv_index.ensure_index(csv_file)
+    return now
+
+
+def test_index_maintained_on_append(tmp_path):
+    csv_file = tmp_path / "speed_history.csv"
+    _write_history(csv_file, 48)
+
+    idx_file = csv_index.index_path_for(csv_file)
+    assert idx_file.stat().st_size == 49 * csv_index.INDEX_ENTRY.size
+
+
+def test_find_offset_seeks_to_cutoff(tmp_path):
+    csv_file = tmp_path / "speed_history.csv"
+    now = _write_history(csv_file, 48)
+
+    cutoff = (now - datetime.timedelta(hours=10, minutes=30)).timestamp()
+    offset = csv_index.find_offset(csv_file, cutoff)
+
+    with open(csv_file, 'rb') as f:
+        records = list(csv_index.iter_records(f, offset))
+    assert len(records) == 11
+    assert csv_index.record_epoch(records[0][1]) >= cutoff
+
+
+def test_index_rebuilt_after_rewrite(tmp_path):
+    csv_file = tmp_path / "speed_history.csv"
+    now = _write_history(csv_file, 24)
+
+    # Rewriting the file in place shifts every offset after the first change
+    csv_file.write_bytes(csv_file.read_bytes().replace(b',10,20,', b',10.0,20.0,'))
+
+    cutoff = (now - datetime.timedelta(hours=2, minutes=30)).timestamp()
+    offset = csv_index.find_offset(csv_file, cutoff)
+    with open(csv_file, 'rb') as f:
+        first = next(csv_index.iter_records(f, offset))[1]
+    assert first.startswith((now - datetime.timedelta(hours=2)).isoformat().encode())
+
+
+def test_reverse_reader_matches_forward(tmp_path):
+    csv_file = tmp_path / "speed_history.csv"
+    _write_history(csv_file, 30)
+    # A partly written row with a quoted newline must not be mistaken for records
+    with open(csv_file, 'ab') as f:
+        f.write(b'2099-01-01T00:00:00,,,,,,,FAILED,Err,"half\nwritten')
+
+    with open(csv_file, 'rb') as f:
+        header = next(csv_index.iter_records(f))[1]
+        forward = list(csv_index.iter_records(f, len(header)))
+        end = csv_index.find_end(csv_file)
+        for chunk_size in (1, 7, 8192):
+            backward = list(csv_index.iter_records_reverse(f, len(header), end, chunk_size))
+            assert backward[::-1] == forward
+
+
+def test_late_row_disables_bisection(tmp_path):
+    csv_file = tmp_path / "speed_history.csv"
+    now = _write_history(csv_file, 24)
+    cutoff = (now - datetime.timedelta(hours=5, minutes=30)).timestamp()
+    assert csv_index.find_offset(csv_file, cutoff) is not None
+    assert csv_index.index_is_sorted(csv_file)
+
+    # A row timestamped inside the window but appended after newer rows
+    with open(csv_file, 'a', newline='') as f:
+        csv.DictWriter(f, fieldnames=CSV_FIELDNAMES).writerow({
+            'timestamp': (now - datetime.timedelta(hours=3, minutes=10)).isoformat(),
+            'download_mbps': 99, 'status': 'SUCCESS'
+        })
+    csv_index.ensure_index(csv_file)
+    assert not csv_index.index_is_sorted(csv_file)
+    assert csv_index.find_offset(csv_file, cutoff) is None
+
+    # A rebuild of a file back in order clears the marker
+    lines = csv_file.read_bytes().splitlines(keepends=True)
+    csv_file.write_bytes(b''.join(lines[:-1]))
+    csv_index.rebuild_index(csv_file)
+    assert csv_index.index_is_sorted(csv_file)
+    assert csv_index.find_offset(csv_file, cutoff) is not None
+
+
+def test_storage_reads_late_rows_in_window(tmp_path):
+    import storage
+
+    history = storage.CSVStorage(tmp_path / "history", compression='none')
+    start = datetime.datetime(2026, 10, 17, 0, 0)
+    for hour in range(12):
+        history.append({'timestamp': (start + datetime.timedelta(hours=hour)).isoformat(),
+                        'download_mbps': hour, 'status': 'SUCCESS'})
+    # Late rows: one inside the window, one well before it
+    for late, download in ((9.5, 95), (2.5, 25)):
+        history.append({'timestamp': (start + datetime.timedelta(hours=late)).isoformat(),
+                        'download_mbps': download, 'status': 'SUCCESS'})
+
+    since = start + datetime.timedelta(hours=9)
+    # The window starts inside the partition, so the index would have been used
+    window = [record.download_mbps for record in history.read(since=since)]
+    assert sorted(window) == [9.0, 10.0, 11.0, 95.0]
+    newest_first = [record.download_mbps for record in history.iter_rows_reverse(since=since)]
+    assert sorted(newest_first) == [9.0, 10.0, 11.0, 95.0]
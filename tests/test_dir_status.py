@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests for the bounded scandir-based directory status collector
+"""
+
+import sys
+from pathlib import Path
+
+# Add the src directory to the path to import the monitor modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from dir_status import scan_directory
+
+
+def _make_tree(root):
+    (root / "a.csv").write_bytes(b"x" * 10)
+    (root / "b.log").write_bytes(b"x" * 5)
+    (root / "hosts" / "pi-a").mkdir(parents=True)
+    (root / "hosts" / "pi-a" / "c.csv").write_bytes(b"x" * 100)
+
+
+def test_scan_aggregates_counts_and_sizes(tmp_path):
+    _make_tree(tmp_path)
+
+    top = scan_directory(tmp_path)
+    assert (top['files'], top['dirs'], top['total_bytes']) == (2, 1, 15)
+    assert not top['truncated']
+
+    deep = scan_directory(tmp_path, max_depth=2, sample_size=10)
+    assert (deep['files'], deep['dirs'], deep['total_bytes']) == (3, 2, 115)
+    assert deep['examined'] == 5
+    names = {entry['name'] for entry in deep['sample']}
+    assert str(Path("hosts") / "pi-a" / "c.csv") in names
+    assert deep['newest_mtime'] is not None
+
+    missing = scan_directory(tmp_path / "missing")
+    assert not missing['exists'] and missing['examined'] == 0
+
+
+def test_scan_stops_at_entry_cap(tmp_path):
+    for i in range(50):
+        (tmp_path / f"{i}.csv").write_bytes(b"x")
+
+    status = scan_directory(tmp_path, max_entries=20, sample_size=5)
+    assert status['truncated']
+    assert status['examined'] == status['files'] == 20
+    assert len(status['sample']) == 5
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Tests for haversine ranking of speedtest servers (NumPy and pure Python)
+"""
+
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path to import the monitor modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+import geodistance
+
+CITIES = [
+    {'id': "london", 'lat': "51.5074", 'lon': "-0.1278"},
+    {'id': "sydney", 'lat': "-33.8688", 'lon': "151.2093"},
+    {'id': "paris", 'lat': "48.8566", 'lon': "2.3522"},
+    {'id': "berlin", 'lat': "52.5200", 'lon': "13.4050"},
+    {'id': "new-york", 'lat': "40.7128", 'lon': "-74.0060"},
+]
+AMSTERDAM = (52.3676, 4.9041)
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(geodistance, 'np', None)
+    return request.param
+
+
+def test_nearest_ranks_by_great_circle_distance(backend):
+    coordinates = geodistance.as_arrays(geodistance.build_coordinates(CITIES))
+
+    ranked = geodistance.nearest(coordinates, *AMSTERDAM, 3)
+    assert [CITIES[index]['id'] for index, _ in ranked] == ["london", "paris", "berlin"]
+    assert ranked[0][1] == pytest.approx(357.5, abs=2)
+
+    everything = geodistance.nearest(coordinates, *AMSTERDAM, 50)
+    assert [CITIES[index]['id'] for index, _ in everything][-1] == "sydney"
+    assert geodistance.nearest(coordinates, *AMSTERDAM, 0) == []
+
+
+def test_backends_agree_on_large_lists(monkeypatch):
+    pytest.importorskip("numpy")
+    rng = random.Random(7)
+    servers = [{'lat': str(rng.uniform(-90, 90)), 'lon': str(rng.uniform(-180, 180))}
+               for _ in range(5000)]
+    coordinates = geodistance.build_coordinates(servers)
+
+    vectorized = geodistance.nearest(geodistance.as_arrays(coordinates), *AMSTERDAM, 10)
+    monkeypatch.setattr(geodistance, 'np', None)
+    assert [index for index, _ in geodistance.nearest(coordinates, *AMSTERDAM, 10)] == \
+        [index for index, _ in vectorized]
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Tests for concurrent server latency probing against local stand-in servers
+"""
+
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path to import the monitor modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+import latency_probe
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers latency.txt like a speedtest server, after the server's delay"""
+
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        body = b'test=test' if self.path.startswith('/speedtest/latency.txt') else b'nope'
+        try:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stand_ins():
+    servers = []
+
+    def start(server_id, delay):
+        httpd = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        httpd.daemon_threads = True
+        httpd.delay = delay
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+        return {'id': server_id, 'url': f"http://127.0.0.1:{httpd.server_port}/speedtest/upload.php"}
+
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_probes_run_in_parallel_and_rank_by_median(stand_ins):
+    fast = stand_ins('fast', 0.0)
+    slow = stand_ins('slow', 0.15)
+    hung = stand_ins('hung', 2.0)
+    slower = stand_ins('slower', 0.3)
+
+    started = time.monotonic()
+    results = latency_probe.probe_servers([slower, hung, slow, fast], samples=2, timeout=0.5)
+    elapsed = time.monotonic() - started
+
+    assert [server['id'] for _, server in results] == ['fast', 'slow', 'slower']
+    assert results[0][0] < results[1][0] < results[2][0]
+    # Bounded by the slowest server (the hung one: 2 samples x 0.5s), not the sum
+    assert elapsed < 1.5
+
+
+def test_unreachable_or_wrong_response_is_dropped(stand_ins):
+    server = stand_ins('ok', 0.0)
+    wrong = dict(server, id='wrong', url=server['url'].replace('/speedtest/', '/other/'))
+    closed = {'id': 'closed', 'url': "http://127.0.0.1:9/speedtest/upload.php"}
+
+    assert latency_probe.probe_latency(latency_probe.latency_url(wrong), samples=1) is None
+    results = latency_probe.probe_servers([closed, wrong, server], samples=3, timeout=0.5)
+    assert [s['id'] for _, s in results] == ['ok']
+    assert latency_probe.probe_servers([]) == []
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests for the SpeedRecord result type
+"""
+
+import sys
+import csv
+import io
+from pathlib import Path
+
+# Add the src directory to the path to import the monitor modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from config import CSV_FIELDNAMES
+from records import SpeedRecord, column_positions
+
+
+def test_csv_round_trip():
+    values = ['2026-10-17T12:00:00', '52.5', '10.25', '14.0', 'London', 'UK', 'ISP',
+              'SUCCESS', '', '']
+    record = SpeedRecord.from_csv_row(values)
+
+    assert record.download_mbps == 52.5
+    assert record.epoch is not None
+    assert record.error_type is None
+    assert not record.failed
+
+    # Written the same way csv.DictWriter wrote the original row
+    out = io.StringIO()
+    csv.writer(out).writerow(record.to_csv_row())
+    assert out.getvalue().strip() == ','.join(values)
+
+
+def test_older_header_layout():
+    header = ['timestamp', 'download_mbps', 'upload_mbps', 'ping_ms', 'server_name']
+    positions = column_positions(header)
+    record = SpeedRecord.from_csv_row(['2024-01-01T00:00:00', '', '', '', ''], positions)
+
+    assert column_positions(CSV_FIELDNAMES) is None
+    assert record.status is None
+    assert record.failed
+
+
+def test_from_dict_and_json():
+    record = SpeedRecord.from_dict({'timestamp': '2026-10-17T12:00:00', 'status': 'FAILED',
+                                    'error_type': 'ConfigError', 'download_mbps': 0})
+    data = record.to_dict()
+
+    assert record.failed
+    assert data['download_mbps'] == 0.0
+    assert list(data) == list(SpeedRecord._fields)
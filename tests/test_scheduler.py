@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Tests for the daemon mode scheduler
+"""
+
+import sys
+import threading
+from pathlib import Path
+
+# Add the src directory to the path to import the monitor modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+import scheduler
+
+
+class FixedRandom:
+    def uniform(self, low, high):
+        return high
+
+
+def test_plan_next_applies_jitter_and_catches_up():
+    # Never run: start immediately
+    assert scheduler.plan_next(None, 1000.0, 900, 60) == (1000.0, 1000.0, 0)
+
+    # Next slot in the future: run it with jitter
+    assert scheduler.plan_next(1000.0, 1500.0, 900, 60, rng=FixedRandom()) == (1900.0, 1960.0, 0)
+
+    # Down for a while: one immediate run for the latest overdue slot
+    slot, run_at, missed = scheduler.plan_next(1000.0, 1000.0 + 900 * 4 + 10, 900, 60)
+    assert (slot, run_at, missed) == (1000.0 + 900 * 4, 1000.0 + 900 * 4 + 10, 3)
+
+
+def test_run_daemon_runs_on_schedule_until_stopped(tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler, 'SCHEDULER_STATE_FILE', tmp_path / "scheduler.json")
+    stop = threading.Event()
+    calls = []
+
+    def run_once():
+        calls.append(1)
+        if len(calls) == 3:
+            stop.set()
+        return 0
+
+    cycles = scheduler.run_daemon(run_once, interval=0.05, jitter=0.01,
+                                  stop_event=stop, install_signals=False)
+    assert cycles == len(calls) == 3
+    assert scheduler.load_last_slot() is not None
+
+    # A stop requested while idle ends the loop without another run
+    stop = threading.Event()
+    timer = threading.Timer(0.1, stop.set)
+    timer.start()
+    assert scheduler.run_daemon(run_once, interval=3600, jitter=0,
+                                stop_event=stop, install_signals=False) == 0
+    timer.join()
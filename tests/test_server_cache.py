@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for the on-disk speedtest config and server list cache
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path to import the monitor modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+speedtest = pytest.importorskip("speedtest")
+import server_cache
+
+
+@pytest.fixture
+def network(tmp_path, monkeypatch):
+    """Replace the speedtest.net downloads with counted, canned responses"""
+    monkeypatch.setattr(server_cache, 'SERVER_CACHE_FILE', tmp_path / "server_cache.json")
+    state = {'ip': "192.0.2.1", 'calls': []}
+
+    def get_config(self):
+        state['calls'].append('config')
+        self.config.update({
+            'client': {'ip': state['ip'], 'isp': "Example ISP", 'lat': "52.37", 'lon': "4.89"},
+            'ignore_servers': [], 'sizes': {'upload': [32768], 'download': [350]},
+            'counts': {'upload': 1, 'download': 1}, 'threads': {'upload': 1, 'download': 1},
+            'length': {'upload': 1, 'download': 1}, 'upload_max': 1
+        })
+        self.lat_lon = (52.37, 4.89)
+        return self.config
+
+    def get_servers(self, servers=None, exclude=None):
+        state['calls'].append('servers')
+        self.servers = {
+            12.5: [{'id': "1", 'd': 12.5, 'lat': "52.1", 'lon': "4.7", 'url': "http://a/upload.php"}],
+            80.0: [{'id': "2", 'd': 80.0, 'lat': "51.9", 'lon': "5.9", 'url': "http://b/upload.php"}]
+        }
+        return self.servers
+
+    monkeypatch.setattr(speedtest.Speedtest, 'get_config', get_config)
+    monkeypatch.setattr(speedtest.Speedtest, 'get_servers', get_servers)
+    return state
+
+
+def test_second_client_is_served_from_cache(network):
+    first = server_cache.CachedSpeedtest()
+    servers = first.get_servers()
+    assert network['calls'] == ['config', 'servers']
+    assert first.cache_hits == []
+
+    second = server_cache.CachedSpeedtest()
+    assert second.get_servers() == servers
+    assert second.config['client']['ip'] == "192.0.2.1"
+    assert second.cache_hits == ['config', 'servers']
+    assert network['calls'] == ['config', 'servers']
+
+    # Closest servers are ranked from the cached coordinates
+    assert [server['id'] for server in second.get_closest_servers(limit=1)] == ["1"]
+    assert second.closest[0]['d'] == pytest.approx(32.7, abs=0.5)
+
+
+def test_refresh_drops_server_list_when_client_changes(network):
+    server_cache.CachedSpeedtest().get_servers()
+    network['calls'].clear()
+
+    # Same client and a fresh server list: only the config is fetched
+    assert server_cache.refresh_cache()
+    assert network['calls'] == ['config']
+
+    network['calls'].clear()
+    network['ip'] = "198.51.100.7"
+    assert server_cache.refresh_cache()
+    assert network['calls'] == ['config', 'servers']
+    assert server_cache.client_key(server_cache.load_cache()['config'])[0] == "198.51.100.7"
+
+    cache = server_cache.load_cache()
+    assert not server_cache.is_stale(cache)
+    assert server_cache.is_stale(cache, now=time.time() + server_cache.SERVER_CACHE_CONFIG_TTL_SECONDS)
+
+
+def test_run_speed_test_counts_only_real_cache_hits(network, monkeypatch, caplog):
+    import speedtest_runner
+
+    def select_server(st):
+        server = {'id': "1", 'name': "Amsterdam", 'country': "NL", 'sponsor': "Example",
+                  'url': "http://a/upload.php", 'd': 12.5}
+        st.results.ping = 10.0
+        st.results.server = server
+        return server
+
+    monkeypatch.setattr(speedtest_runner, 'select_server', select_server)
+    monkeypatch.setattr(speedtest_runner, 'refresh_in_background', lambda: None)
+    monkeypatch.setattr(speedtest.Speedtest, 'download', lambda self, **kwargs: 50_000_000)
+    monkeypatch.setattr(speedtest.Speedtest, 'upload', lambda self, **kwargs: 10_000_000)
+    clients = []
+    real_init = server_cache.CachedSpeedtest.__init__
+
+    def init(self, *args, **kwargs):
+        real_init(self, *args, **kwargs)
+        clients.append(self)
+
+    monkeypatch.setattr(server_cache.CachedSpeedtest, '__init__', init)
+    caplog.set_level("INFO", logger="speedtest_runner")
+
+    # Cold cache: everything is fetched once and nothing is reported as cached
+    assert speedtest_runner.run_speed_test().download_mbps == 50.0
+    assert network['calls'] == ['config', 'servers']
+    assert clients[-1].cache_hits == []
+    assert "from cache" not in caplog.text
+
+    # Warm cache: both come from the cache, each counted once
+    caplog.clear()
+    assert speedtest_runner.run_speed_test().download_mbps == 50.0
+    assert network['calls'] == ['config', 'servers']
+    assert clients[-1].cache_hits == ['config', 'servers']
+    assert "Speedtest config and servers from cache" in caplog.text
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for sticky best-server selection
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Add the src directory to the path to import the monitor modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+import server_selection
+
+
+class FakeClient:
+    """Stands in for speedtest.Speedtest: fixed latencies, records probes"""
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+        self.servers = {float(i): [{'id': server_id, 'url': f"http://{server_id}/speedtest/upload.php"}]
+                        for i, server_id in enumerate(latencies)}
+        self.results = SimpleNamespace(ping=None, server=None)
+        self._best = {}
+        self.probes = []
+
+    def probe(self, url, *args):
+        server_id = url.split('/')[2]
+        self.probes[-1].append(server_id)
+        return self.latencies.get(server_id)
+
+    def select_best(self):
+        self.probes.append([])
+        candidates = [s for group in self.servers.values() for s in group]
+        probed = [(self.probe(server_selection.latency_url(s)), s) for s in candidates]
+        latency, best = min((result for result in probed if result[0] is not None),
+                            key=lambda result: result[0])
+        return server_selection.apply_best(self, best, latency)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    client = FakeClient({'a': 20.0, 'b': 12.0, 'c': 30.0})
+    monkeypatch.setattr(server_selection, 'BEST_SERVER_FILE', tmp_path / "best_server.json")
+    monkeypatch.setattr(server_selection, 'STICKY_SERVER_RUNS', 3)
+    monkeypatch.setattr(server_selection, 'select_best', FakeClient.select_best)
+
+    def probe_latency(url):
+        client.probes.append([])
+        return client.probe(url)
+
+    monkeypatch.setattr(server_selection, 'probe_latency', probe_latency)
+    return client
+
+
+def test_sticky_server_reused_until_runs_used_up(client):
+    assert server_selection.select_server(client)['id'] == 'b'
+    assert client.probes == [['a', 'b', 'c']]
+
+    # Only the remembered server is probed while it is reused
+    assert server_selection.select_server(client)['id'] == 'b'
+    assert server_selection.select_server(client)['id'] == 'b'
+    assert client.probes[1:] == [['b'], ['b']]
+    assert client.results.server['id'] == 'b' and client.results.ping == 12.0
+
+    # Runs used up: full selection again
+    client.latencies['a'] = 5.0
+    assert server_selection.select_server(client)['id'] == 'a'
+    assert client.probes[-1] == ['a', 'b', 'c']
+    assert server_selection.load_sticky()['runs'] == 1
+
+
+def test_degraded_or_missing_server_triggers_reselection(client):
+    server_selection.select_server(client)
+
+    # Within the threshold (1.5x and +10 ms)
+    client.latencies['b'] = 21.0
+    assert server_selection.select_server(client)['id'] == 'b'
+
+    client.latencies['b'] = 40.0
+    assert server_selection.select_server(client)['id'] == 'a'
+    assert client.probes[-2:] == [['b'], ['a', 'b', 'c']]
+
+    # Sticky server gone from the server list (e.g. new client location)
+    del client.servers[0.0]
+    assert server_selection.select_server(client)['id'] == 'c'
+    assert client.probes[-1] == ['b', 'c']
+
+    # Sticky server not responding
+    client.latencies['c'] = None
+    client.latencies['b'] = 15.0
+    assert server_selection.select_server(client)['id'] == 'b'
+    assert client.probes[-2:] == [['c'], ['b', 'c']]
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for merging the per-host history shards on the share
+"""
+
+import sys
+import datetime
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path to import the monitor modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+import shards
+import storage
+
+
+def _write_shard(hosts_dir, host, minutes):
+    history = storage.CSVStorage(hosts_dir / host / "history", compression='none')
+    start = datetime.datetime(2026, 10, 17, 10, 0)
+    for minute in minutes:
+        history.append({'timestamp': (start + datetime.timedelta(minutes=minute)).isoformat(),
+                        'download_mbps': minute, 'upload_mbps': 1, 'ping_ms': 1, 'status': 'SUCCESS'})
+
+
+def test_merge_interleaves_hosts_in_time_order(tmp_path):
+    _write_shard(tmp_path, "pi-a", [0, 15, 30, 45])
+    _write_shard(tmp_path, "pi-b", [7, 22, 37])
+    (tmp_path / "empty").mkdir()
+
+    assert shards.list_hosts(tmp_path) == ["pi-a", "pi-b"]
+
+    merged = [(host, int(record.download_mbps)) for host, record in shards.merge_records(hosts_dir=tmp_path)]
+    assert merged == [("pi-a", 0), ("pi-b", 7), ("pi-a", 15), ("pi-b", 22),
+                      ("pi-a", 30), ("pi-b", 37), ("pi-a", 45)]
+
+    only_b = shards.merge_records(hosts=["pi-b"], hosts_dir=tmp_path)
+    assert [host for host, _ in only_b] == ["pi-b"] * 3
+
+    latest = shards.latest_records(3, hosts_dir=tmp_path)
+    assert [(host, int(record.download_mbps)) for host, record in latest] == [
+        ("pi-a", 30), ("pi-b", 37), ("pi-a", 45)]
+
+    since = datetime.datetime(2026, 10, 17, 10, 20)
+    assert len(list(shards.merge_records(since=since, hosts_dir=tmp_path))) == 4
+
+
+def test_reading_the_share_writes_nothing(tmp_path):
+    _write_shard(tmp_path, "pi-a", [0, 15, 30])
+    history_dir = tmp_path / "pi-a" / "history"
+    # Index sidecars are not replicated; add a row the counters and rollups haven't seen
+    for idx_file in history_dir.glob("*.idx"):
+        idx_file.unlink()
+    partition = next(history_dir.glob("*.csv"))
+    with open(partition, 'a') as f:
+        f.write("2026-10-17T10:45:00,45,1,1,,,,SUCCESS,,\n")
+    before = {path.name: path.stat().st_mtime_ns for path in history_dir.iterdir()}
+
+    history = shards.shard_storage("pi-a", hosts_dir=tmp_path)
+    since = datetime.datetime(2026, 10, 17, 10, 20)
+    assert [int(record.download_mbps) for record in history.read()] == [0, 15, 30, 45]
+    assert [int(record.download_mbps) for record in history.tail(2, since=since)] == [30, 45]
+    assert history.stats()['record_count'] == 4
+    assert history.summary()['total_tests'] == 4
+    assert len(list(shards.merge_records(since=since, hosts_dir=tmp_path))) == 2
+
+    assert {path.name: path.stat().st_mtime_ns for path in history_dir.iterdir()} == before
+    with pytest.raises(IOError):
+        history.append({'timestamp': '2026-10-17T11:00:00', 'status': 'SUCCESS'})
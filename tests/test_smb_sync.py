@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental (append-only) SMB file sync
+"""
+
+import sys
+from pathlib import Path
+
+# Add the src directory to the path to import the monitor modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+import smb_sync
+
+
+def test_sync_file_appends_new_bytes(tmp_path):
+    local_file = tmp_path / "speedtest.log"
+    remote_file = tmp_path / "share" / "speedtest.log"
+    remote_file.parent.mkdir()
+    state = {}
+
+    local_file.write_bytes(b"first line\n")
+    assert smb_sync.sync_file(local_file, remote_file, state) == 11
+    assert smb_sync.sync_file(local_file, remote_file, state) == 0
+
+    with open(local_file, 'ab') as f:
+        f.write(b"second\n")
+    assert smb_sync.sync_file(local_file, remote_file, state) == 7
+    assert remote_file.read_bytes() == b"first line\nsecond\n"
+    assert state[str(remote_file)]['offset'] == 18
+
+
+
+def test_sync_state_drops_entries_for_removed_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(smb_sync, 'SMB_SYNC_STATE_FILE', tmp_path / "sync_state.json")
+    share = tmp_path / "share"
+    share.mkdir()
+    state = {}
+    for name in ("speed_history_2026-09.csv", "speed_history_2026-10.csv"):
+        (tmp_path / name).write_bytes(b"header\nrow\n")
+        smb_sync.sync_file(tmp_path / name, share / name, state)
+
+    # The closed partition was archived, so its local file is gone
+    (tmp_path / "speed_history_2026-09.csv").unlink()
+    smb_sync.save_sync_state(state)
+    assert list(smb_sync.load_sync_state()) == [str(share / "speed_history_2026-10.csv")]
+
+
+def test_sync_file_recopies_rewritten_file(tmp_path):
+    local_file = tmp_path / "manifest.json"
+    remote_file = tmp_path / "share" / "manifest.json"
+    remote_file.parent.mkdir()
+    state = {}
+
+    local_file.write_bytes(b"version one\n")
+    smb_sync.sync_file(local_file, remote_file, state)
+
+    # Same length prefix but different content: must not be appended to
+    local_file.write_bytes(b"version two\nmore\n")
+    assert smb_sync.sync_file(local_file, remote_file, state) == 17
+    assert remote_file.read_bytes() == b"version two\nmore\n"
+
+    # A remote copy changed behind our back is also copied in full
+    remote_file.write_bytes(b"x")
+    assert smb_sync.sync_file(local_file, remote_file, state) == 17
+    assert remote_file.read_bytes() == local_file.read_bytes()
+
+
+def test_outbox_coalesces_pending_syncs(tmp_path, monkeypatch):
+    import sync_outbox
+
+    monkeypatch.setattr(sync_outbox, 'SYNC_OUTBOX_DIR', tmp_path / "outbox")
+    monkeypatch.setattr(sync_outbox, 'SYNC_WORKER_LOCK', tmp_path / "worker.lock")
+    monkeypatch.setattr(sync_outbox, 'start_worker', lambda: True)
+    monkeypatch.setattr(sync_outbox.time, 'sleep', lambda seconds: None)
+
+    results = [False, False, True]
+    calls = []
+
+    def fake_sync():
+        calls.append(len(sync_outbox.pending_jobs()))
+        return results.pop(0)
+
+    monkeypatch.setattr(sync_outbox, 'sync_to_smb', fake_sync)
+
+    for _ in range(3):
+        assert sync_outbox.enqueue_sync()
+    assert len(sync_outbox.pending_jobs()) == 3
+
+    # Two failed attempts with backoff, then one sync covers all three jobs
+    assert sync_outbox.run_worker() == 0
+    assert calls == [3, 3, 3]
+    assert sync_outbox.pending_jobs() == []
+
+
+def test_smb_health_cached_until_stale(tmp_path, monkeypatch):
+    import smb_health
+
+    monkeypatch.setattr(smb_health, 'SMB_HEALTH_CACHE_FILE', tmp_path / "smb_health.json")
+    probes = []
+
+    def fake_probe():
+        probes.append(1)
+        return {'ok': len(probes) > 1, 'access_type': 'direct_access', 'checked_at': smb_health.time.time()}
+
+    monkeypatch.setattr(smb_health, 'probe_smb', fake_probe)
+
+    # A failure is cached, but only for the shorter failure TTL
+    assert not smb_health.get_smb_health()['ok']
+    assert not smb_health.get_smb_health()['ok']
+    assert len(probes) == 1
+
+    now = smb_health.time.time()
+    monkeypatch.setattr(smb_health.time, 'time', lambda: now + smb_health.SMB_HEALTH_FAILURE_TTL_SECONDS)
+    assert smb_health.get_smb_health()['ok']
+    assert smb_health.get_smb_health()['ok']
+    assert len(probes) == 2
+
+    smb_health.record_smb_failure("copy failed")
+    assert not smb_health.get_smb_health()['ok']
+    assert len(probes) == 2
+
+
+def test_sync_file_skips_identical_remote_copy(tmp_path):
+    local_file = tmp_path / "speed_history_2026-01.csv.gz"
+    remote_file = tmp_path / "share" / "speed_history_2026-01.csv.gz"
+    remote_file.parent.mkdir()
+    local_file.write_bytes(b"archived partition")
+    remote_file.write_bytes(b"archived partition")
+    state = {}
+
+    # No state yet: the remote copy is hashed once instead of recopied
+    assert smb_sync.sync_file(local_file, remote_file, state) == 0
+    assert state[str(remote_file)]['sha256'] == smb_sync.prefix_digest(local_file, 18)
+
+    # Full copies go through a temporary name that doesn't survive
+    local_file.write_bytes(b"recompressed partition")
+    assert smb_sync.sync_file(local_file, remote_file, state) == 22
+    assert remote_file.read_bytes() == b"recompressed partition"
+    assert sorted(p.name for p in remote_file.parent.iterdir()) == [remote_file.name]
+
+
+def test_replicate_reports_each_target(tmp_path, monkeypatch):
+    import threading
+    import storage
+
+    monkeypatch.setattr(storage, '_storage', storage.CSVStorage(tmp_path / "history", compression='none'))
+    storage.get_storage().append({'timestamp': '2026-10-17T12:00:00', 'download_mbps': 50,
+                                  'upload_mbps': 10, 'ping_ms': 15, 'status': 'SUCCESS'})
+    monkeypatch.setattr(smb_sync, 'LOG_FILE', tmp_path / "speedtest.log")
+    monkeypatch.setattr(smb_sync, 'SMB_SYNC_STATE_FILE', tmp_path / "sync_state.json")
+    monkeypatch.setattr(smb_sync, 'REPLICATION_STATUS_FILE', tmp_path / "replication_status.json")
+
+    usb = tmp_path / "usb" / "speedtest"
+    usb.parent.mkdir()
+    hung = tmp_path / "hung" / "speedtest"
+    hung.parent.mkdir()
+    missing = tmp_path / "unmounted" / "speedtest"
+
+    release = threading.Event()
+    real_sync_target = smb_sync.sync_target
+
+    def sync_target(target_dir, history_files, state):
+        if target_dir == hung:
+            release.wait(5)
+        return real_sync_target(target_dir, history_files, state)
+
+    monkeypatch.setattr(smb_sync, 'sync_target', sync_target)
+    try:
+        results = smb_sync.replicate([usb, hung, missing], timeout=1)
+        # The hung sync is abandoned, not waited for at exit, and not started twice
+        abandoned = smb_sync._in_flight[hung]
+        assert abandoned.daemon
+        assert smb_sync.replicate([hung], timeout=1)[str(hung)]['error'] == "previous sync still running"
+    finally:
+        release.set()
+    abandoned.join(5)
+    assert hung not in smb_sync._in_flight
+
+    assert results[str(usb)]['ok'] and results[str(usb)]['bytes'] > 0
+    assert (usb / smb_sync.HOST_SHARD_DIR / "history" / "manifest.json").exists()
+    assert results[str(hung)]['error'].startswith("timed out")
+    assert results[str(missing)]['error'] == "not accessible: path_not_exists"
+    assert not missing.exists()
+    assert set(smb_sync.get_replication_status()) == {str(usb), str(hung), str(missing)}
+
+    # Only the target that finished recorded sync state
+    assert smb_sync.replicate([usb])[str(usb)]['bytes'] == 0
+
+
+def test_refused_writes_batched_into_one_privileged_call(tmp_path, monkeypatch):
+    import subprocess
+
+    target = tmp_path / "share"
+    target.mkdir()
+    history = tmp_path / "history"
+    history.mkdir()
+    grown, rewritten = history / "speed_history_2026-10.csv", history / "manifest.json"
+    grown.write_bytes(b"header\nrow 1\n")
+    rewritten.write_bytes(b"{}")
+    files = [(grown, "history/" + grown.name), (rewritten, "history/manifest.json")]
+    monkeypatch.setattr(smb_sync, 'LOG_FILE', tmp_path / "speedtest.log")
+
+    state = {}
+    assert smb_sync.sync_target(target, files, state)['ok']
+    with open(grown, 'ab') as f:
+        f.write(b"row 2\n")
+    rewritten.write_bytes(b'{"partitions": {}}')
+
+    def refuse(*args, **kwargs):
+        raise PermissionError("read-only share")
+
+    calls = []
+    real_run = subprocess.run
+
+    def run_without_sudo(cmd, **kwargs):
+        # Run the batch script as this user instead of through sudo -n
+        calls.append(cmd)
+        return real_run(cmd[2:], **kwargs)
+
+    monkeypatch.setattr(smb_sync, 'append_remote_file', refuse)
+    monkeypatch.setattr(smb_sync, 'write_remote_atomic', refuse)
+    monkeypatch.setattr(smb_sync.subprocess, 'run', run_without_sudo)
+
+    result = smb_sync.sync_target(target, files, state)
+    assert result['ok'] and result['ownership_fixed']
+    assert len(calls) == 1 and calls[0][:2] == ['sudo', '-n']
+    shard = target / smb_sync.HOST_SHARD_DIR
+    assert (shard / "history" / grown.name).read_bytes() == b"header\nrow 1\nrow 2\n"
+    assert (shard / "history" / "manifest.json").read_bytes() == b'{"partitions": {}}'
+    assert result['bytes'] == 6 + 18
+
+    # Recorded like direct writes, so the next run has nothing to send
+    calls.clear()
+    assert smb_sync.sync_target(target, files, state)['bytes'] == 0
+    assert calls == []
+
+
+def test_sealed_log_segments_synced_once(tmp_path, monkeypatch):
+    import gzip
+    import logging
+    import logging_config
+
+    log_file, segment_dir = tmp_path / "speedtest.log", tmp_path / "logs"
+    monkeypatch.setattr(smb_sync, 'LOG_FILE', log_file)
+    monkeypatch.setattr(smb_sync, 'LOG_SEGMENT_DIR', segment_dir)
+    handler = logging_config.SegmentedLogHandler(log_file, max_bytes=200, segment_dir=segment_dir, keep=2)
+    test_logger = logging.getLogger("test_segments")
+    test_logger.propagate = False
+    test_logger.addHandler(handler)
+    try:
+        for i in range(20):
+            test_logger.warning(f"line {i:02d} " + "x" * 40)
+    finally:
+        test_logger.removeHandler(handler)
+        handler.close()
+
+    segments = logging_config.log_segments(log_file, segment_dir)
+    assert len(segments) == 2
+    assert log_file.stat().st_size <= 200
+    assert b"line 19" in log_file.read_bytes()
+    assert gzip.decompress(segments[-1].read_bytes()).endswith(b"\n")
+
+    target = tmp_path / "share"
+    target.mkdir()
+    state = {}
+    result = smb_sync.sync_target(target, [], state)
+    assert result['ok'] and result['files'] == 3
+    assert sorted(p.name for p in (target / smb_sync.HOST_SHARD_DIR / "logs").iterdir()) == [s.name for s in segments]
+
+    # Segments already on the share are not sent again
+    assert smb_sync.sync_target(target, [], state)['bytes'] == 0
+
+
+def test_log_segments_ordered_by_seal_time_and_sequence(tmp_path):
+    import logging_config
+
+    log_file, segment_dir = tmp_path / "speedtest.log", tmp_path / "logs"
+    segment_dir.mkdir()
+    names = ["speedtest.log.20261017-120000.gz", "speedtest.log.20261017-120000-1.gz",
+             "speedtest.log.20261017-120000-2.gz", "speedtest.log.20261017-120000-10.gz",
+             "speedtest.log.20261017-120001.gz"]
+    for name in reversed(names):
+        (segment_dir / name).write_bytes(b"")
+
+    assert [segment.name for segment in logging_config.log_segments(log_file, segment_dir)] == names
+
+    # Pruning after a seal keeps the newest segments
+    log_file.write_text("latest\n")
+    newest = logging_config.seal_log_segment(log_file, segment_dir, keep=2)
+    assert logging_config.log_segments(log_file, segment_dir) == [segment_dir / names[-1], newest]
+
+
+def test_smb_probe_leaves_history_untouched(tmp_path, monkeypatch):
+    import smb_health
+    import storage
+
+    speedtest_dir = tmp_path / "share" / "speedtest"
+    history_dir = speedtest_dir / "site" / "history"
+    monkeypatch.setattr(smb_health, 'SMB_MOUNT_PATH', tmp_path / "share")
+    monkeypatch.setattr(smb_health, 'SMB_SPEEDTEST_DIR', speedtest_dir)
+    monkeypatch.setattr(smb_health, 'SMB_HISTORY_DIR', history_dir)
+    monkeypatch.setattr(smb_health, 'SMB_BACKUP_CSV', speedtest_dir / "site" / "speed_history.csv")
+
+    history = storage.CSVStorage(history_dir, compression='none')
+    history.append({'timestamp': '2026-10-17T10:00:00', 'download_mbps': 1, 'status': 'SUCCESS'})
+    # A row the manifest's counters haven't seen, and no index (as replicated)
+    partition = next(history_dir.glob("*.csv"))
+    with open(partition, 'a') as f:
+        f.write("2026-10-17T10:15:00,2,,,,,,SUCCESS,,\n")
+    for idx_file in history_dir.glob("*.idx"):
+        idx_file.unlink()
+    before = {path.name: path.stat().st_mtime_ns for path in history_dir.iterdir()}
+
+    health = smb_health.probe_smb()
+    assert health['ok']
+    assert health['history_size'] == partition.stat().st_size
+    assert {path.name: path.stat().st_mtime_ns for path in history_dir.iterdir()} == before
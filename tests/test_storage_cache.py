@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Tests for the process-wide parsed-CSV cache
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path to import the monitor modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from config import CSV_FIELDNAMES
+import storage
+
+HEADER = ','.join(CSV_FIELDNAMES) + '\n'
+
+
+def _row(minute, download):
+    return f"2026-10-17T10:{minute:02d}:00,{download},10,20,,,,SUCCESS,,\n"
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(storage, '_cache_entries', {})
+    monkeypatch.setattr(storage, '_cache_counters', {'hits': 0, 'misses': 0, 'tail_reads': 0})
+
+
+def _downloads(rows):
+    return [row.download_mbps for row in rows]
+
+
+def test_unchanged_file_is_a_hit(tmp_path):
+    csv_file = tmp_path / "speed_history.csv"
+    csv_file.write_text(HEADER + _row(0, 50) + _row(15, 60))
+
+    first = storage.read_csv_cached(csv_file)
+    assert _downloads(first) == [50.0, 60.0]
+    assert storage.read_csv_cached(csv_file) is first
+
+    stats = storage.get_cache_stats()
+    assert (stats['misses'], stats['hits'], stats['tail_reads']) == (1, 1, 0)
+    assert stats['cached_rows'] == 2
+
+
+def test_truncated_file_is_reparsed(tmp_path):
+    csv_file = tmp_path / "speed_history.csv"
+    csv_file.write_text(HEADER + _row(0, 50) + _row(15, 60) + _row(30, 70))
+    storage.read_csv_cached(csv_file)
+
+    # Truncated in place (same inode, shorter than the parsed offset)
+    with open(csv_file, 'r+') as f:
+        f.truncate(len(HEADER + _row(0, 50)))
+    assert _downloads(storage.read_csv_cached(csv_file)) == [50.0]
+    assert storage.get_cache_stats()['misses'] == 2
+
+
+def test_rewritten_file_is_reparsed(tmp_path):
+    csv_file = tmp_path / "speed_history.csv"
+    csv_file.write_text(HEADER + _row(0, 50) + _row(15, 60))
+    storage.read_csv_cached(csv_file)
+
+    # Replaced by a new file (new inode), as update_csv_zeros.py does
+    replacement = tmp_path / "speed_history.csv.tmp"
+    replacement.write_text(HEADER + _row(0, 55) + _row(15, 65) + _row(30, 75))
+    os.replace(replacement, csv_file)
+    assert _downloads(storage.read_csv_cached(csv_file)) == [55.0, 65.0, 75.0]
+
+    # Edited in place before the parsed offset: the signature no longer matches
+    csv_file.write_text(HEADER + _row(0, 99) + _row(15, 65) + _row(30, 75) + _row(45, 85))
+    assert _downloads(storage.read_csv_cached(csv_file)) == [99.0, 65.0, 75.0, 85.0]
+
+    stats = storage.get_cache_stats()
+    assert (stats['misses'], stats['tail_reads']) == (3, 0)
+
+
+def test_append_parses_only_the_new_tail(tmp_path, monkeypatch):
+    csv_file = tmp_path / "speed_history.csv"
+    csv_file.write_text(HEADER + _row(0, 50) + _row(15, 60))
+    first = storage.read_csv_cached(csv_file)
+
+    parsed = []
+    real_parse = storage._parse_csv_bytes
+
+    def recording_parse(raw, fieldnames=None):
+        parsed.append(raw)
+        return real_parse(raw, fieldnames)
+
+    monkeypatch.setattr(storage, '_parse_csv_bytes', recording_parse)
+    with open(csv_file, 'a') as f:
+        f.write(_row(30, 70) + _row(45, 80))
+
+    rows = storage.read_csv_cached(csv_file)
+    assert _downloads(rows) == [50.0, 60.0, 70.0, 80.0]
+    assert parsed == [(_row(30, 70) + _row(45, 80)).encode()]
+    # Callers holding the previous list are unaffected
+    assert _downloads(first) == [50.0, 60.0]
+
+    stats = storage.get_cache_stats()
+    assert (stats['misses'], stats['tail_reads']) == (1, 1)
+
+
+def test_partial_last_line_waits_until_complete(tmp_path):
+    csv_file = tmp_path / "speed_history.csv"
+    csv_file.write_text(HEADER + _row(0, 50))
+    storage.read_csv_cached(csv_file)
+
+    complete = _row(15, 60)
+    with open(csv_file, 'a') as f:
+        f.write(complete[:20])
+    assert _downloads(storage.read_csv_cached(csv_file)) == [50.0]
+
+    with open(csv_file, 'a') as f:
+        f.write(complete[20:] + _row(30, 70)[:10])
+    assert _downloads(storage.read_csv_cached(csv_file)) == [50.0, 60.0]
+
+    with open(csv_file, 'a') as f:
+        f.write(_row(30, 70)[10:])
+    assert _downloads(storage.read_csv_cached(csv_file)) == [50.0, 60.0, 70.0]
+
+    stats = storage.get_cache_stats()
+    assert (stats['misses'], stats['tail_reads']) == (1, 3)
+
+    # A file that starts mid-row (no complete line yet) parses to nothing
+    fresh = tmp_path / "partial.csv"
+    fresh.write_text(HEADER[:15])
+    assert storage.read_csv_cached(fresh) == []
+
+
+def test_shorter_replacement_falls_back_to_full_reparse(tmp_path):
+    csv_file = tmp_path / "speed_history.csv"
+    csv_file.write_text(HEADER + _row(0, 50) + _row(15, 60) + _row(30, 70))
+    storage.read_csv_cached(csv_file)
+
+    replacement = tmp_path / "speed_history.csv.tmp"
+    replacement.write_text(HEADER + _row(0, 51))
+    os.replace(replacement, csv_file)
+    assert _downloads(storage.read_csv_cached(csv_file)) == [51.0]
+
+    # Appending after the reparse goes back to tail reads
+    with open(csv_file, 'a') as f:
+        f.write(_row(15, 61))
+    assert _downloads(storage.read_csv_cached(csv_file)) == [51.0, 61.0]
+
+    stats = storage.get_cache_stats()
+    assert (stats['misses'], stats['tail_reads']) == (2, 1)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for sync rate limiting and deferral during speed tests
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add the src directory to the path to import the monitor modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+import sync_throttle
+
+
+def test_token_bucket_paces_to_rate(monkeypatch):
+    clock = [100.0]
+    sleeps = []
+
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(sync_throttle.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(sync_throttle.time, 'sleep', fake_sleep)
+
+    bucket = sync_throttle.TokenBucket(1000)
+    assert bucket.consume(1000) == 0
+    # Larger than the burst: the debt is slept off
+    assert bucket.consume(2500) == 2.5
+    clock[0] += 1.0
+    assert bucket.consume(500) == 0
+    assert sleeps == [2.5]
+
+    assert sync_throttle.TokenBucket(0).consume(10 ** 9) == 0
+
+
+def test_sync_deferred_while_measurement_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(sync_throttle, 'MEASUREMENT_LOCK_FILE', tmp_path / "measurement.lock")
+    sync_throttle.reset_stats()
+    assert not sync_throttle.measurement_in_progress()
+    assert sync_throttle.wait_for_measurement() == 0
+
+    started = threading.Event()
+
+    def measure():
+        with sync_throttle.measurement_lock():
+            started.set()
+            time.sleep(0.3)
+
+    thread = threading.Thread(target=measure)
+    thread.start()
+    started.wait()
+    assert sync_throttle.measurement_in_progress()
+    assert sync_throttle.wait_for_measurement() >= 0.2
+    thread.join()
+
+    assert not sync_throttle.measurement_in_progress()
+    assert sync_throttle.get_stats()['deferred_seconds'] >= 0.2
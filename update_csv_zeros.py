@@ -6,8 +6,15 @@ for failed speed tests to maintain consistency.
 
 import csv
 import shutil
+import sys
 from pathlib import Path
 
+# Add src directory to Python path for the shared configuration
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+from config import CSV_FILE, HISTORY_DIR, SMB_BACKUP_CSV, SMB_HISTORY_DIR
+from storage import ARCHIVE_CODECS, compress_file, decompress_file, is_archive
+
 def update_csv_empty_to_zero(csv_file_path):
     """
     Update CSV file to convert empty speed values to 0 for failed tests
@@ -95,32 +102,74 @@ def update_csv_empty_to_zero(csv_file_path):
     
     return True
 
+def update_archive_empty_to_zero(archive_path):
+    """
+    Update an archived (compressed) partition the same way
+    
+    The archive is decompressed next to itself, updated and compressed again
+    with the same codec, so the manifest entry still points at it. Failed
+    rows don't count towards the rollups, so its frozen counters and rollups
+    stay valid.
+    
+    Args:
+        archive_path (Path): Path to the .csv.gz/.csv.xz partition
+    """
+    if not archive_path.exists():
+        print(f"❌ Archive not found: {archive_path}")
+        return False
+    
+    compression = next(name for name, (suffix, _) in ARCHIVE_CODECS.items()
+                       if archive_path.name.endswith(suffix))
+    csv_file_path = decompress_file(archive_path)
+    try:
+        return update_csv_empty_to_zero(csv_file_path)
+    finally:
+        compress_file(csv_file_path, compression)
+
+def update_history_file(path):
+    """Update a live CSV or an archived partition"""
+    if is_archive(path):
+        return update_archive_empty_to_zero(path)
+    return update_csv_empty_to_zero(path)
+
+def find_history_files(history_dir, legacy_csv):
+    """
+    Find the CSV history files of a history location
+    
+    Returns the monthly (or other period) partitions in history_dir, live
+    and archived, when the history has been partitioned, otherwise the
+    single legacy_csv. The manifest's counters notice the rewritten files
+    and rescan them.
+    """
+    partitions = sorted(
+        path for path in history_dir.glob("speed_history_*.csv*")
+        if path.name.endswith('.csv') or (is_archive(path) and path.name.rsplit('.', 1)[0].endswith('.csv'))
+    )
+    return partitions or [legacy_csv]
+
 def main():
     """Main function to update the CSV file"""
     print("🔄 Updating speed_history.csv to set failed test values to 0")
     print("")
     
-    # Get paths
-    project_root = Path(__file__).parent
-    data_dir = project_root / "speedtest_data"
-    csv_file = data_dir / "speed_history.csv"
-    
     # Update local CSV
     print("📁 Updating local CSV file...")
-    if update_csv_empty_to_zero(csv_file):
-        print("✅ Local CSV updated successfully")
-    else:
-        print("❌ Failed to update local CSV")
-        return
+    for csv_file in find_history_files(HISTORY_DIR, CSV_FILE):
+        if update_history_file(csv_file):
+            print(f"✅ Local CSV updated successfully: {csv_file.name}")
+        else:
+            print("❌ Failed to update local CSV")
+            return
     
-    # Check for SMB CSV and update if exists
-    smb_csv = Path("/media/test/speedtest/speed_history.csv")
-    if smb_csv.exists():
+    # Check for this host's SMB CSV (its shard on the share) and update if exists
+    smb_files = [f for f in find_history_files(SMB_HISTORY_DIR, SMB_BACKUP_CSV) if f.exists()]
+    if smb_files:
         print("\n📁 Updating SMB CSV file...")
-        if update_csv_empty_to_zero(smb_csv):
-            print("✅ SMB CSV updated successfully")
-        else:
-            print("❌ Failed to update SMB CSV")
+        for smb_csv in smb_files:
+            if update_history_file(smb_csv):
+                print(f"✅ SMB CSV updated successfully: {smb_csv.name}")
+            else:
+                print("❌ Failed to update SMB CSV")
     else:
         print("\n📁 SMB CSV file not found, skipping...")
     
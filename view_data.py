@@ -4,125 +4,115 @@ View Speed Test Data from SMB Share
 Displays recent speed test results from both local and SMB locations
 """
 
-import csv
 import sys
+import argparse
 from pathlib import Path
 import datetime
 
-# Configuration
-LOCAL_DATA_DIR = Path(__file__).parent / "speedtest_data"
-LOCAL_CSV = LOCAL_DATA_DIR / "speed_history.csv"
-SMB_MOUNT_PATH = Path("/media/test")
-SMB_SPEEDTEST_DIR = SMB_MOUNT_PATH / "speedtest"
-SMB_CSV = SMB_SPEEDTEST_DIR / "speed_history.csv"
+# Add src directory to Python path for the shared storage code
+sys.path.insert(0, str(Path(__file__).parent / "src"))
 
-def format_timestamp(iso_string):
-    """Format ISO timestamp for display"""
-    try:
-        dt = datetime.datetime.fromisoformat(iso_string.replace('Z', '+00:00'))
-        return dt.strftime('%Y-%m-%d %H:%M:%S')
-    except:
-        return iso_string
+from config import SMB_MOUNT_PATH, SMB_SPEEDTEST_DIR, SMB_HISTORY_DIR
+from storage import CSVStorage, get_storage
+from dir_status import scan_directory
+from smb_health import SHARE_SCAN_DEPTH
+
+# Number of speedtest directory entries listed by name
+STATUS_SAMPLE_SIZE = 20
+
+def format_timestamp(record):
+    """Format a record's timestamp for display"""
+    if record.epoch is None:
+        return record.timestamp
+    return datetime.datetime.fromtimestamp(record.epoch).strftime('%Y-%m-%d %H:%M:%S')
 
-def view_csv_data(csv_file, location_name):
-    """View data from a CSV file"""
-    if not csv_file.exists():
-        print(f"❌ {location_name} CSV not found: {csv_file}")
+def history_file(history):
+    """File whose modification time tracks a history's last write"""
+    if history.name != 'csv':
+        return history.path
+    if history.manifest_path.exists():
+        return history.manifest_path
+    return history.legacy_csv
+
+def history_exists(history):
+    """Check whether a history location holds any data (partitioned, single-file or database)"""
+    return history_file(history).exists()
+
+def view_csv_data(history, location_name, hours=None):
+    """View data from a history (any storage backend), optionally only the last N hours"""
+    if not history_exists(history):
+        print(f"❌ {location_name} history not found: {history.path}")
         return False
     
     try:
-        with open(csv_file, 'r') as file:
-            reader = csv.DictReader(file)
-            rows = list(reader)
+        # Counts and averages come from the rollups, and only the records
+        # listed below are read (backwards from the end of the history)
+        since = datetime.datetime.now() - datetime.timedelta(hours=hours) if hours else None
+        stats = history.summary(since=since)
         
-        if not rows:
-            print(f"📄 {location_name} CSV is empty")
+        if not stats:
+            print(f"📄 {location_name} history is empty" + (f" for the last {hours} hours" if hours else ""))
             return True
         
-        print(f"\n📊 {location_name} Data ({len(rows)} records)")
+        total = stats['total_tests']
+        window = f", last {hours} hours" if hours else ""
+        print(f"\n📊 {location_name} Data ({total} records{window})")
         print("=" * 80)
         
-        # Count successes vs failures - check multiple possible failure indicators
-        failed_rows = []
-        successful_rows = []
-        
-        for row in rows:
-            # Check for various failure indicators
-            is_failed = (
-                row.get('status') == 'FAILED' or
-                row.get('error_type') or
-                row.get('error_details') or
-                (not row.get('download_mbps') or row.get('download_mbps') == '')
-            )
-            
-            if is_failed:
-                failed_rows.append(row)
-            else:
-                successful_rows.append(row)
-        
-        if failed_rows:
-            print(f"⚠️  {len(failed_rows)} failures out of {len(rows)} total tests")
+        if stats['failed_tests']:
+            print(f"⚠️  {stats['failed_tests']} failures out of {total} total tests")
             print("\n❌ Recent Failures:")
-            for failure in failed_rows[-5:]:  # Show last 5 failures
-                timestamp = format_timestamp(failure['timestamp'])
-                error_type = failure.get('error_type', 'Unknown')
-                error_details = failure.get('error_details', 'No details')
+            for failure in history.tail(5, since=since, where=lambda row: row.failed):  # Show last 5 failures
+                timestamp = format_timestamp(failure)
+                error_type = failure.error_type or 'Unknown'
+                error_details = failure.error_details or 'No details'
                 
                 # Truncate long error messages but show meaningful info
                 if error_details and len(error_details) > 50:
                     error_details = error_details[:47] + "..."
                 
                 if not error_type or error_type == 'Unknown':
-                    error_type = 'NetworkError' if not failure.get('download_mbps') else 'DataError'
+                    error_type = 'NetworkError' if not failure.download_mbps else 'DataError'
                 
                 print(f"   {timestamp} - {error_type}: {error_details}")
         
-        if successful_rows:
+        successful = stats['successful_tests']
+        if successful:
             # Show header for successful tests
-            print(f"\n✅ Successful Tests ({len(successful_rows)} records):")
+            print(f"\n✅ Successful Tests ({successful} records):")
             print(f"{'Time':<19} {'Down (Mbps)':<12} {'Up (Mbps)':<10} {'Ping (ms)':<10} {'Server':<25}")
             print("-" * 80)
             
             # Show last 10 successful records
-            recent_successful = successful_rows[-10:]
+            recent_successful = history.tail(10, since=since, where=lambda row: not row.failed)
             for row in recent_successful:
-                try:
-                    timestamp = format_timestamp(row['timestamp'])
-                    download = f"{float(row['download_mbps']):.1f}" if row['download_mbps'] else "N/A"
-                    upload = f"{float(row['upload_mbps']):.1f}" if row['upload_mbps'] else "N/A"
-                    ping = f"{float(row['ping_ms']):.1f}" if row['ping_ms'] else "N/A"
-                    server = f"{row['server_sponsor']} ({row['server_name']})" if row['server_sponsor'] and row['server_name'] else "N/A"
-                    
-                    print(f"{timestamp:<19} {download:<12} {upload:<10} {ping:<10} {server:<25}")
-                except (ValueError, TypeError) as e:
-                    # Skip malformed records
-                    continue
-            
-            if len(successful_rows) > 10:
-                print(f"\n... and {len(successful_rows) - 10} more successful records")
+                timestamp = format_timestamp(row)
+                download = f"{row.download_mbps:.1f}" if row.download_mbps else "N/A"
+                upload = f"{row.upload_mbps:.1f}" if row.upload_mbps else "N/A"
+                ping = f"{row.ping_ms:.1f}" if row.ping_ms else "N/A"
+                server = f"{row.server_sponsor} ({row.server_name})" if row.server_sponsor and row.server_name else "N/A"
+                
+                print(f"{timestamp:<19} {download:<12} {upload:<10} {ping:<10} {server:<25}")
             
-            # Show summary stats for successful tests only - filter out invalid values
-            try:
-                downloads = [float(row['download_mbps']) for row in successful_rows if row['download_mbps'] and row['download_mbps'] != '']
-                uploads = [float(row['upload_mbps']) for row in successful_rows if row['upload_mbps'] and row['upload_mbps'] != '']
-                pings = [float(row['ping_ms']) for row in successful_rows if row['ping_ms'] and row['ping_ms'] != '']
-            except (ValueError, TypeError):
-                downloads = uploads = pings = []
+            if successful > 10:
+                print(f"\n... and {successful - 10} more successful records")
             
-            if downloads and uploads and pings:
+            # Show summary stats for successful tests only
+            if all(key in stats for key in ('download', 'upload', 'ping')):
+                download, upload, ping = stats['download'], stats['upload'], stats['ping']
                 print(f"\n📈 Summary Statistics (Successful Tests Only):")
-                print(f"Download: Avg {sum(downloads)/len(downloads):.1f} Mbps, Min {min(downloads):.1f}, Max {max(downloads):.1f}")
-                print(f"Upload:   Avg {sum(uploads)/len(uploads):.1f} Mbps, Min {min(uploads):.1f}, Max {max(uploads):.1f}")
-                print(f"Ping:     Avg {sum(pings)/len(pings):.1f} ms, Min {min(pings):.1f}, Max {max(pings):.1f}")
+                print(f"Download: Avg {download['avg']:.1f} Mbps, Min {download['min']:.1f}, Max {download['max']:.1f}")
+                print(f"Upload:   Avg {upload['avg']:.1f} Mbps, Min {upload['min']:.1f}, Max {upload['max']:.1f}")
+                print(f"Ping:     Avg {ping['avg']:.1f} ms, Min {ping['min']:.1f}, Max {ping['max']:.1f}")
             else:
                 print(f"\n⚠️  Unable to calculate statistics - invalid data in successful records")
         else:
-            print(f"\n❌ No successful tests found in {len(rows)} records")
+            print(f"\n❌ No successful tests found in {total} records")
         
         return True
         
     except Exception as e:
-        print(f"❌ Error reading {location_name} CSV: {str(e)}")
+        print(f"❌ Error reading {location_name} history: {str(e)}")
         return False
 
 def check_smb_status():
@@ -147,53 +137,73 @@ def check_smb_status():
     else:
         print(f"⚠️  Speedtest directory missing: {SMB_SPEEDTEST_DIR}")
     
-    try:
-        # Check main mount directory
-        files = list(SMB_MOUNT_PATH.iterdir())
-        print(f"✅ Mount directory accessible ({len(files)} items)")
-        
-        # Check speedtest directory specifically
-        if SMB_SPEEDTEST_DIR.exists():
-            speedtest_files = list(SMB_SPEEDTEST_DIR.iterdir())
-            print(f"✅ Speedtest directory accessible ({len(speedtest_files)} items)")
-            
-            if speedtest_files:
-                print("📁 Speedtest files found:")
-                for file in speedtest_files:
-                    size = file.stat().st_size if file.is_file() else 0
-                    print(f"   - {file.name} ({size} bytes)")
-        else:
-            print("📁 No speedtest directory found")
-        
-    except Exception as e:
-        print(f"❌ Cannot access SMB directory: {str(e)}")
+    # Bounded scans: counts and sizes come from os.scandir, and only the
+    # first few speedtest entries are listed by name
+    mount = scan_directory(SMB_MOUNT_PATH)
+    if mount['errors'] and not mount['examined']:
+        print(f"❌ Cannot access SMB directory: {SMB_MOUNT_PATH}")
         return False
+    more = "+" if mount['truncated'] else ""
+    print(f"✅ Mount directory accessible ({mount['examined']}{more} items)")
+    
+    speedtest = scan_directory(SMB_SPEEDTEST_DIR, max_depth=SHARE_SCAN_DEPTH,
+                             sample_size=STATUS_SAMPLE_SIZE)
+    if not speedtest['exists']:
+        print("📁 No speedtest directory found")
+        return True
+    
+    more = "+" if speedtest['truncated'] else ""
+    print(f"✅ Speedtest directory accessible ({speedtest['files']}{more} files, "
+          f"{speedtest['dirs']}{more} directories, {speedtest['total_bytes']}{more} bytes)")
+    if speedtest['truncated']:
+        print(f"⚠️  Stopped after {speedtest['examined']} entries - totals are lower bounds")
+    
+    if speedtest['sample']:
+        print("📁 Speedtest files found:")
+        for entry in speedtest['sample']:
+            if entry['is_dir']:
+                print(f"   - {entry['name']}/")
+            else:
+                print(f"   - {entry['name']} ({entry['size']} bytes)")
+        remaining = speedtest['examined'] - len(speedtest['sample'])
+        if remaining > 0:
+            print(f"   ... and {remaining}{more} more")
     
     return True
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="View speed test history")
+    parser.add_argument('--hours', type=int, help="Only show tests from the last N hours")
+    args = parser.parse_args()
+    
     print("🚀 Speed Test Data Viewer (SMB Version)")
     print("=" * 50)
     
+    # Local data through the configured backend; the share holds the
+    # partitioned history (CSV backend) or the CSV export (SQLite backend),
+    # both readable as a CSVStorage
+    local_history = get_storage()
+    smb_history = CSVStorage(SMB_HISTORY_DIR, read_only=True)
+    
     # Check SMB status
     smb_ok = check_smb_status()
     
     # View local data
     print("\n" + "=" * 50)
-    local_ok = view_csv_data(LOCAL_CSV, "Local")
+    local_ok = view_csv_data(local_history, "Local", args.hours)
     
     # View SMB data if available
     if smb_ok:
         print("\n" + "=" * 50)
-        smb_data_ok = view_csv_data(SMB_CSV, "SMB Share")
+        smb_data_ok = view_csv_data(smb_history, "SMB Share", args.hours)
         
-        # Compare file sizes/dates if both exist
-        if LOCAL_CSV.exists() and SMB_CSV.exists():
-            local_size = LOCAL_CSV.stat().st_size
-            smb_size = SMB_CSV.stat().st_size
-            local_mtime = LOCAL_CSV.stat().st_mtime
-            smb_mtime = SMB_CSV.stat().st_mtime
+        # Compare history sizes/dates if both exist
+        if history_exists(local_history) and history_exists(smb_history):
+            local_size = local_history.stats()['file_size']
+            smb_size = smb_history.stats()['file_size']
+            local_mtime = history_file(local_history).stat().st_mtime
+            smb_mtime = history_file(smb_history).stat().st_mtime
             
             print(f"\n🔄 Sync Status:")
             print(f"Local:  {local_size} bytes, modified {datetime.datetime.fromtimestamp(local_mtime)}")
@@ -5,20 +5,31 @@ Flask application for viewing speedtest data with interactive charts
 """
 
 import os
-import csv
 import json
 import datetime
+import sys
 from pathlib import Path
 from flask import Flask, render_template, jsonify, request
 from flask_cors import CORS
 
 # Configuration
 PROJECT_ROOT = Path(__file__).parent.parent
-DATA_DIR = PROJECT_ROOT / "speedtest_data"
-CSV_FILE = DATA_DIR / "speed_history.csv"
-SMB_MOUNT_PATH = Path("/media/test")
-SMB_SPEEDTEST_DIR = SMB_MOUNT_PATH / "speedtest"
-SMB_CSV = SMB_SPEEDTEST_DIR / "speed_history.csv"
+
+# Make the monitor's src modules importable for shared storage helpers
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+from config import HISTORY_DIR, SITE_ID, SMB_HISTORY_DIR, SMB_BACKUP_CSV as SMB_CSV
+from csv_handler import get_csv_stats
+from storage import CSVStorage, get_storage, get_cache_stats
+from smb_health import get_smb_health
+from smb_sync import get_replication_status
+from shards import list_hosts, merge_records, latest_records, host_summaries
+
+SMB_MANIFEST = SMB_HISTORY_DIR / "manifest.json"
+
+# Chart ranges longer than this are drawn from hourly rollups, and longer than
+# ROLLUP_DAILY_HOURS from daily rollups, instead of raw rows
+ROLLUP_CHART_HOURS = 168
+ROLLUP_DAILY_HOURS = 24 * 90
 
 app = Flask(__name__)
 CORS(app)
@@ -26,127 +37,165 @@ CORS(app)
 # Configure Flask app
 app.config['SECRET_KEY'] = 'speedtest-monitor-key-change-in-production'
 
-def load_speed_data(limit=None, hours=None):
-    """Load speed test data from CSV file"""
-    # Try to load from SMB first, then local
-    csv_paths = [SMB_CSV, CSV_FILE]
-    data = []
+def get_data_storage():
+    """
+    Get the storage backend the dashboard should read from
     
-    for csv_path in csv_paths:
-        if csv_path.exists():
-            try:
-                with open(csv_path, 'r') as file:
-                    reader = csv.DictReader(file)
-                    data = list(reader)
-                break
-            except Exception as e:
-                print(f"Failed to read {csv_path}: {e}")
-                continue
+    For the CSV backend the SMB copy is preferred (partitioned, or a
+    single-file copy from an older version), then the local history; the
+    SQLite backend is always read locally. The SMB copy is opened read-only,
+    so page loads never write index or rollup files to the share.
+    """
+    storage = get_storage()
+    if storage.name == 'csv' and _smb_history_file().exists():
+        return CSVStorage(SMB_HISTORY_DIR, read_only=True)
+    return storage
+
+def load_speed_data(limit=None, hours=None):
+    """Load speed test data from the history storage as SpeedRecords"""
+    since = datetime.datetime.now() - datetime.timedelta(hours=hours) if hours else None
     
-    if not data:
+    try:
+        return get_data_storage().read(since=since, limit=limit)
+    except Exception as e:
+        print(f"Failed to read speed test data: {e}")
         return []
+
+def load_host_data(host, limit=None, hours=None):
+    """
+    Load records from the share's per-host shards, merged in time order
     
-    # Filter by time if specified
-    if hours:
-        cutoff_time = datetime.datetime.now() - datetime.timedelta(hours=hours)
-        filtered_data = []
-        for row in data:
-            try:
-                row_time = datetime.datetime.fromisoformat(row['timestamp'].replace('Z', '+00:00'))
-                if row_time >= cutoff_time:
-                    filtered_data.append(row)
-            except:
-                continue
-        data = filtered_data
+    Args:
+        host (str): Comma-separated host names, or 'all' for every host
+        limit (int): Only return the latest N records
+        hours (int): Only return records from the last N hours
     
-    # Apply limit
-    if limit:
-        data = data[-limit:]
+    Returns:
+        list: Record dictionaries with an added 'host' field
+    """
+    since = datetime.datetime.now() - datetime.timedelta(hours=hours) if hours else None
     
-    return data
+    try:
+        # Only hosts that exist on the share, never arbitrary paths
+        known = list_hosts()
+        hosts = known if host == 'all' else [name for name in host.split(',') if name in known]
+        if limit:
+            pairs = latest_records(limit, hosts=hosts, since=since)
+        else:
+            pairs = merge_records(hosts=hosts, since=since)
+        return [dict(record.to_dict(), host=name) for name, record in pairs]
+    except Exception as e:
+        print(f"Failed to read host shards: {e}")
+        return []
 
-def calculate_statistics(data):
-    """Calculate summary statistics from speed test data"""
-    if not data:
+def get_statistics(hours=None):
+    """Calculate summary statistics, served from the backend's hourly/daily rollups"""
+    since = datetime.datetime.now() - datetime.timedelta(hours=hours) if hours else None
+    
+    try:
+        return get_data_storage().summary(since=since)
+    except Exception as e:
+        print(f"Error calculating statistics: {e}")
         return {}
+
+def load_rollup_chart_data(hours):
+    """Build chart data from hourly/daily rollups for long time ranges"""
+    since = datetime.datetime.now() - datetime.timedelta(hours=hours)
+    resolution = 'daily' if hours > ROLLUP_DAILY_HOURS else 'hourly'
     
-    # Separate successful and failed tests
-    successful_tests = []
-    failed_tests = []
+    try:
+        points = get_data_storage().rollup_series(since=since, resolution=resolution)
+    except Exception as e:
+        print(f"Failed to read rollups: {e}")
+        points = []
     
-    for row in data:
-        # Check status first, then fallback to data validation for older entries
-        is_failed = (
-            row.get('status') == 'FAILED' or
-            row.get('error_type') or
-            (row.get('download_mbps') in [None, ''] and row.get('upload_mbps') in [None, ''])
-        )
-        
-        if is_failed:
-            failed_tests.append(row)
+    successful_data = []
+    failed_data = []
+    
+    for point in points:
+        failed_count = point['failed_tests']
+        if point['successful_tests']:
+            successful_data.append({
+                'timestamp': point['timestamp'],
+                'download_speed': point.get('download', {}).get('avg', 0),
+                'upload_speed': point.get('upload', {}).get('avg', 0),
+                'ping_time': point.get('ping', {}).get('avg', 0),
+                'is_failed': False,
+                'test_count': point['total_tests']
+            })
         else:
-            successful_tests.append(row)
+            # Every test in the bucket failed
+            successful_data.append({
+                'timestamp': point['timestamp'],
+                'download_speed': 0,
+                'upload_speed': 0,
+                'ping_time': 0,
+                'is_failed': True,
+                'error_type': 'Failed',
+                'error_details': f'{failed_count} failed tests',
+                'test_count': point['total_tests']
+            })
+        
+        if failed_count:
+            failed_data.append({
+                'timestamp': point['timestamp'],
+                'error_type': 'Failed',
+                'error_details': f'{failed_count} of {point["total_tests"]} tests failed',
+                'failed_count': failed_count
+            })
     
-    stats = {
-        'total_tests': len(data),
-        'successful_tests': len(successful_tests),
-        'failed_tests': len(failed_tests),
-        'success_rate': round((len(successful_tests) / len(data)) * 100, 1) if data else 0
+    return {
+        'successful_tests': successful_data,
+        'failed_tests': failed_data,
+        'resolution': resolution
     }
-    
-    if successful_tests:
-        try:
-            downloads = [float(row['download_mbps']) for row in successful_tests if row['download_mbps']]
-            uploads = [float(row['upload_mbps']) for row in successful_tests if row['upload_mbps']]
-            pings = [float(row['ping_ms']) for row in successful_tests if row['ping_ms']]
-            
-            if downloads:
-                stats['download'] = {
-                    'avg': round(sum(downloads) / len(downloads), 2),
-                    'min': round(min(downloads), 2),
-                    'max': round(max(downloads), 2)
-                }
-            
-            if uploads:
-                stats['upload'] = {
-                    'avg': round(sum(uploads) / len(uploads), 2),
-                    'min': round(min(uploads), 2),
-                    'max': round(max(uploads), 2)
-                }
-            
-            if pings:
-                stats['ping'] = {
-                    'avg': round(sum(pings) / len(pings), 2),
-                    'min': round(min(pings), 2),
-                    'max': round(max(pings), 2)
-                }
-                
-        except Exception as e:
-            print(f"Error calculating statistics: {e}")
-    
-    return stats
+
+
+def _smb_history_file():
+    """Get the SMB file whose presence means history has been synced"""
+    return SMB_MANIFEST if SMB_MANIFEST.exists() else SMB_CSV
 
 def get_system_status():
     """Get system and SMB status information"""
+    # Record counts and sizes come from the manifest/counters, not a scan;
+    # SMB details come from the shared health cache, not a probe per request
+    local_stats = get_csv_stats()
+    smb_health = get_smb_health()
+    smb_data = smb_health['history_file'] is not None
+    
     status = {
-        'local_data': CSV_FILE.exists(),
-        'local_data_size': CSV_FILE.stat().st_size if CSV_FILE.exists() else 0,
-        'smb_mounted': SMB_MOUNT_PATH.exists() and SMB_MOUNT_PATH.is_mount(),
-        'smb_data': SMB_CSV.exists(),
-        'smb_data_size': SMB_CSV.stat().st_size if SMB_CSV.exists() else 0,
-        'data_source': 'SMB' if SMB_CSV.exists() else 'Local' if CSV_FILE.exists() else 'None'
+        'local_data': local_stats['file_exists'],
+        'local_data_size': local_stats['file_size'],
+        'smb_mounted': smb_health['is_mounted'],
+        'smb_data': smb_data,
+        'smb_data_size': smb_health['history_size'],
+        'smb_checked': datetime.datetime.fromtimestamp(smb_health['checked_at']).isoformat(),
+        'data_source': 'SMB' if smb_data else 'Local' if local_stats['file_exists'] else 'None',
+        'storage_backend': get_storage().name
     }
     
-    if CSV_FILE.exists():
+    if status['storage_backend'] == 'sqlite':
+        status['data_source'] = 'Local (SQLite)'
+    
+    local_file = get_storage().path
+    if local_file == HISTORY_DIR:
+        local_file = HISTORY_DIR / "manifest.json"
+    if local_file.exists():
         status['local_modified'] = datetime.datetime.fromtimestamp(
-            CSV_FILE.stat().st_mtime
+            local_file.stat().st_mtime
         ).isoformat()
     
-    if SMB_CSV.exists():
+    if smb_data:
         status['smb_modified'] = datetime.datetime.fromtimestamp(
-            SMB_CSV.stat().st_mtime
+            smb_health['history_modified']
         ).isoformat()
     
+    status['data_cache'] = get_cache_stats()
+    status['replication'] = get_replication_status()
+    status['local_records'] = local_stats['record_count']
+    status['local_failures'] = local_stats['failure_count']
+    status['last_test'] = local_stats['last_timestamp']
+    
     return status
 
 @app.route('/')
@@ -160,25 +209,38 @@ def api_data():
     limit = request.args.get('limit', type=int)
     hours = request.args.get('hours', type=int)
     
+    host = request.args.get('host')
+    
+    if host:
+        return jsonify(load_host_data(host, limit=limit, hours=hours))
+    
     data = load_speed_data(limit=limit, hours=hours)
-    return jsonify(data)
+    return jsonify([record.to_dict() for record in data])
 
 @app.route('/api/stats')
 def api_stats():
     """API endpoint to get statistics"""
     hours = request.args.get('hours', type=int, default=24)
     
-    data = load_speed_data(hours=hours)
-    stats = calculate_statistics(data)
+    stats = get_statistics(hours=hours)
     return jsonify(stats)
 
 @app.route('/api/recent')
 def api_recent():
     """API endpoint to get recent test results"""
     limit = request.args.get('limit', type=int, default=10)
+    host = request.args.get('host')
+    
+    if host:
+        return jsonify(load_host_data(host, limit=limit))
     
     data = load_speed_data(limit=limit)
-    return jsonify(data)
+    return jsonify([record.to_dict() for record in data])
+
+@app.route('/api/hosts')
+def api_hosts():
+    """API endpoint listing the hosts with history on the share"""
+    return jsonify({'site_id': SITE_ID, 'hosts': host_summaries()})
 
 @app.route('/api/status')
 def api_status():
@@ -191,73 +253,49 @@ def api_chart_data():
     """API endpoint optimized for chart display"""
     hours = request.args.get('hours', type=int, default=24)
     
+    # Long ranges are served from a few hundred rollup buckets
+    if hours > ROLLUP_CHART_HOURS:
+        return jsonify(load_rollup_chart_data(hours))
+    
     data = load_speed_data(hours=hours)
     
     # Prepare separate arrays for successful and failed tests
     successful_data = []
     failed_data = []
     
-    for row in data:
-        try:
-            # Parse timestamp
-            timestamp = datetime.datetime.fromisoformat(row['timestamp'].replace('Z', '+00:00'))
-            
-            # Check if this is a failed test
-            is_failed = (
-                row.get('status') == 'FAILED' or
-                row.get('error_type') or
-                (row.get('download_mbps') in [None, ''] and row.get('upload_mbps') in [None, ''])
-            )
-            
-            if is_failed:
-                # Set failed tests to 0 values instead of excluding them
-                successful_data.append({
-                    'timestamp': timestamp.isoformat(),
-                    'download_speed': 0,
-                    'upload_speed': 0,
-                    'ping_time': 0,
-                    'is_failed': True,
-                    'error_type': row.get('error_type', 'Unknown'),
-                    'error_details': row.get('error_details', 'No details')
-                })
-                failed_data.append({
-                    'timestamp': timestamp.isoformat(),
-                    'error_type': row.get('error_type', 'Unknown'),
-                    'error_details': row.get('error_details', 'No details')
-                })
-            else:
-                # Include successful tests with actual data
-                try:
-                    download_speed = float(row['download_mbps']) if row['download_mbps'] else 0
-                    upload_speed = float(row['upload_mbps']) if row['upload_mbps'] else 0
-                    ping_time = float(row['ping_ms']) if row['ping_ms'] else 0
-                    
-                    successful_data.append({
-                        'timestamp': timestamp.isoformat(),
-                        'download_speed': download_speed,
-                        'upload_speed': upload_speed,
-                        'ping_time': ping_time,
-                        'is_failed': False
-                    })
-                except (ValueError, TypeError):
-                    # If data is invalid, set to 0
-                    successful_data.append({
-                        'timestamp': timestamp.isoformat(),
-                        'download_speed': 0,
-                        'upload_speed': 0,
-                        'ping_time': 0,
-                        'is_failed': True,
-                        'error_type': 'Invalid Data',
-                        'error_details': 'Could not parse speed test values'
-                    })
-        except Exception as e:
-            print(f"Error processing row: {e}")
-            continue
+    # Records are already parsed, so each row maps straight to chart points
+    for record in data:
+        if record.failed:
+            # Set failed tests to 0 values instead of excluding them
+            successful_data.append({
+                'timestamp': record.timestamp,
+                'download_speed': 0,
+                'upload_speed': 0,
+                'ping_time': 0,
+                'is_failed': True,
+                'error_type': record.error_type or 'Unknown',
+                'error_details': record.error_details or 'No details'
+            })
+            failed_data.append({
+                'timestamp': record.timestamp,
+                'error_type': record.error_type or 'Unknown',
+                'error_details': record.error_details or 'No details'
+            })
+        else:
+            # Include successful tests with actual data
+            successful_data.append({
+                'timestamp': record.timestamp,
+                'download_speed': record.download_mbps or 0,
+                'upload_speed': record.upload_mbps or 0,
+                'ping_time': record.ping_ms or 0,
+                'is_failed': False
+            })
     
     # Prepare data for charts - only include points where data exists
     chart_data = {
         'successful_tests': successful_data,
-        'failed_tests': failed_data
+        'failed_tests': failed_data,
+        'resolution': 'raw'
     }
     
     return jsonify(chart_data)